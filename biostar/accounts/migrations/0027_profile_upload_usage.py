@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0026_userlog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='upload_usage',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
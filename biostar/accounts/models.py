@@ -94,6 +94,9 @@ class Profile(models.Model):
     # Maximum amount of uploaded files a user is allowed to aggregate, in mega-bytes.
     max_upload_size = models.IntegerField(default=0)
 
+    # Cumulative size of the uploaded files, in bytes.
+    upload_usage = models.BigIntegerField(default=0)
+
     # The role of the user.
     role = models.IntegerField(default=READER, choices=ROLE_CHOICES)
 
@@ -1,13 +1,17 @@
 import logging
 
 from django.db.models.signals import post_save, pre_save
-from django.dispatch import receiver
+from django.dispatch import receiver, Signal
 
 from biostar.accounts.models import Profile, User
 from biostar.accounts import util, tasks
 
 logger = logging.getLogger("engine")
 
+# Sent after messages are created in bulk, the post_save signals are not sent.
+messages_created = Signal()
+
+
 @receiver(pre_save, sender=User)
 def create_uuid(sender, instance, *args, **kwargs):
     # Generate a unique username if it does not exist.
@@ -8,6 +8,7 @@ import mistune
 from django.conf import settings
 from django.template import loader
 from biostar.utils.decorators import task
+from biostar.accounts import util
 
 
 #
@@ -90,13 +91,13 @@ def verification_email(user_id):
 
 
 @task
-def create_messages(template, user_ids, sender=None, extra_context={}):
+def create_messages(template, user_ids, sender=None, extra_context={}, batch_size=500):
     """
     Create batch message from sender to a given recipient_list
     """
     from biostar.accounts.models import User, Message, MessageBody
+    from biostar.accounts.signals import messages_created
 
-    rec_list = User.objects.filter(id__in=user_ids)
     # Get the sender
     name, email = settings.ADMINS[0]
     sender = sender or User.objects.filter(email=email).first() or User.objects.filter(is_superuser=True).first()
@@ -111,5 +112,14 @@ def create_messages(template, user_ids, sender=None, extra_context={}):
     html = mistune.markdown(body, escape=False)
     body = MessageBody.objects.create(body=body, html=html)
 
-    for rec in rec_list:
-        Message.objects.create(sender=sender, recipient=rec, body=body)
+    # All recipients share the same body.
+    user_ids, date = list(dict.fromkeys(user_ids)), util.now()
+    for idx in range(0, len(user_ids), batch_size):
+        chunk = User.objects.filter(id__in=user_ids[idx:idx + batch_size]).values_list('id', flat=True)
+        chunk = list(chunk)
+
+        msgs = [Message(sender=sender, recipient_id=uid, body=body, sent_date=date) for uid in chunk]
+        Message.objects.bulk_create(msgs, batch_size=batch_size)
+
+        # Let the unread counts know about the new messages.
+        messages_created.send(sender=Message, user_ids=chunk)
@@ -1,8 +1,10 @@
 import logging, os
 from unittest.mock import patch, MagicMock
+from django.db import connection
 from django.test import TestCase, override_settings
 from django.test import Client
-from biostar.accounts import models, views, auth
+from django.test.utils import CaptureQueriesContext
+from biostar.accounts import models, views, auth, tasks
 from django.core import signing
 
 from django.conf import settings
@@ -229,3 +231,29 @@ class ProfileTest(TestCase):
         print(message, valid)
 
         self.assertTrue(not valid)
+
+
+class MessageTest(TestCase):
+
+    def setUp(self):
+        logger.setLevel(logging.WARNING)
+        start = models.User.objects.order_by('-id').values_list('id', flat=True).first() + 1
+        self.ids = list(range(start, start + 5000))
+
+        # Recipients are inserted without triggering the signals.
+        users = [models.User(id=idx, username=f"rec{idx}", email=f"rec{idx}@tested.com") for idx in self.ids]
+        models.User.objects.bulk_create(users, batch_size=1000)
+
+    def test_message_fanout(self):
+        """
+        Test sending a message to many users runs a bounded number of queries
+        """
+        with CaptureQueriesContext(connection) as queries:
+            tasks.create_messages(template="messages/welcome.md", user_ids=self.ids)
+
+        self.assertLess(len(queries), 100)
+
+        msgs = models.Message.objects.filter(recipient_id__in=self.ids)
+        self.assertEqual(msgs.count(), len(self.ids))
+        self.assertEqual(msgs.values('body').distinct().count(), 1)
+
@@ -1,6 +1,8 @@
 import logging
+import os
 import re
 import textwrap
+import threading
 
 from django.core.mail import EmailMultiAlternatives
 from django.core.mail import send_mail, send_mass_mail, get_connection
@@ -31,6 +33,35 @@ def get_block(text, name):
     return Template(msg)
 
 
+# Compiled email templates keyed by path: (mtime, (subject, text, html))
+COMPILED = {}
+
+# Template paths keyed by template name.
+PATHS = {}
+
+LOCK = threading.Lock()
+
+
+def compile_template(name):
+    """
+    Returns the subject, text and html templates, compiled again only when the file changes.
+    """
+    path = PATHS.get(name)
+    if not path:
+        path = PATHS[name] = get_template(name).origin.name
+
+    mtime = os.path.getmtime(path)
+
+    with LOCK:
+        cached = COMPILED.get(path)
+        if not cached or cached[0] != mtime:
+            content = open(path).read()
+            blocks = tuple(get_block(content, block) for block in ("subject", "text", "html"))
+            cached = COMPILED[path] = (mtime, blocks)
+
+    return cached[1]
+
+
 def safe_render(templ, context):
     try:
         return templ.render(Context(context))
@@ -56,11 +87,7 @@ class EmailTemplate(object):
     """
 
     def __init__(self, name):
-        self.template = get_template(name)
-        self.content = open(self.template.origin.name).read()
-        self.subj = get_block(self.content, "subject")
-        self.text = get_block(self.content, "text")
-        self.html = get_block(self.content, 'html')
+        self.subj, self.text, self.html = compile_template(name)
 
     def render(self, context):
         subj = safe_render(self.subj, context)
@@ -69,6 +96,18 @@ class EmailTemplate(object):
         subj = first_line(subj)
         return subj, text, html
 
+    def render_many(self, contexts):
+        """
+        Renders the subject, text and html for each context.
+        A context repeated in the list is rendered once.
+        """
+        rendered = {}
+        for context in contexts:
+            if id(context) not in rendered:
+                rendered[id(context)] = self.render(context)
+
+        return [rendered[id(context)] for context in contexts]
+
     def send(self, context, from_email, recipient_list):
 
         recipients = ", ".join(recipient_list)
@@ -120,6 +159,35 @@ class EmailTemplate(object):
                                 from_email=from_email,
                                 recipient_list=recipient_list)
 
+    def send_many(self, contexts, from_email, recipient_list):
+        """
+        Send each recipient the email rendered with its own context over a single connection.
+        A recipient may be a list of addresses that share the email.
+        """
+
+        # Skip sending emails during data migration
+        if settings.DATA_MIGRATION:
+            logger.info(f"skip {len(recipient_list)} emails DATA_MIGRATION={settings.DATA_MIGRATION}")
+            return 0
+
+        connection = get_connection(fail_silently=False)
+
+        def make_email(rendered, rec):
+            subject, text, html = rendered
+            # Text may be indented in template.
+            msg = EmailMultiAlternatives(subject=subject,
+                                         body=textwrap.dedent(text),
+                                         from_email=from_email,
+                                         to=[rec] if isinstance(rec, str) else list(rec),
+                                         connection=connection)
+            if len(html) > 10:
+                msg.attach_alternative(html, "text/html")
+            return msg
+
+        messages = list(map(make_email, self.render_many(contexts), recipient_list))
+
+        return connection.send_messages(messages)
+
 
 def send_mass_html_mail(subject, message, message_html, from_email, recipient_list):
     """
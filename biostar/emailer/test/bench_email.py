@@ -0,0 +1,68 @@
+"""
+Benchmarks rendering digest emails into the locmem backend.
+
+    python manage.py test biostar.emailer.test.bench_email --settings biostar.server.test_settings
+
+Set BENCH_EMAILS to change the number of emails (default 10000).
+"""
+import logging
+import os
+import time
+from types import SimpleNamespace
+
+from django.core import mail
+from django.test import TestCase
+
+from biostar.emailer import sender
+
+logger = logging.getLogger('engine')
+
+BENCH_EMAILS = int(os.environ.get("BENCH_EMAILS", 10000))
+
+# Send the emails in batches of this size.
+BATCH_SIZE = 500
+
+TEMPLATE = "messages/digest.html"
+
+FROM_EMAIL = "digest@biostars.org"
+
+
+def make_contexts(total):
+    posts = [SimpleNamespace(title=f"Post {idx}", get_absolute_url=f"/p/{idx}/") for idx in range(20)]
+    return [dict(subject=f"Digest for user {idx}", posts=posts, protocol="https", domain="biostars.org")
+            for idx in range(total)]
+
+
+class EmailBench(TestCase):
+
+    def setUp(self):
+        logger.setLevel(logging.WARNING)
+        self.contexts = make_contexts(BENCH_EMAILS)
+        self.recipients = [f"user{idx}@biostars.org" for idx in range(BENCH_EMAILS)]
+
+    def test_digest_rate(self):
+
+        # The template is read and parsed for every email.
+        start = time.time()
+        for context, rec in zip(self.contexts, self.recipients):
+            sender.COMPILED.clear()
+            subject, text, html = sender.EmailTemplate(TEMPLATE).render(context)
+            sender.send_html_mail(subject=subject, message=text, message_html=html, from_email=FROM_EMAIL,
+                                  recipient_list=[rec])
+        single = BENCH_EMAILS / (time.time() - start)
+        mail.outbox.clear()
+
+        # The compiled template renders batches of contexts.
+        start = time.time()
+        email = sender.EmailTemplate(TEMPLATE)
+        for idx in range(0, BENCH_EMAILS, BATCH_SIZE):
+            email.send_many(contexts=self.contexts[idx:idx + BATCH_SIZE], from_email=FROM_EMAIL,
+                            recipient_list=self.recipients[idx:idx + BATCH_SIZE])
+        batch = BENCH_EMAILS / (time.time() - start)
+
+        self.assertEqual(len(mail.outbox), BENCH_EMAILS)
+
+        print()
+        print(f"emails: {BENCH_EMAILS}")
+        print(f"template parsed per email: {single:.0f} emails/s")
+        print(f"compiled template, batches of {BATCH_SIZE}: {batch:.0f} emails/s")
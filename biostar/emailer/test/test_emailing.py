@@ -1,6 +1,8 @@
 import logging
-from django.core import management
-from biostar.emailer import tasks, auth
+import os
+from unittest.mock import patch
+from django.core import management, mail
+from biostar.emailer import tasks, auth, sender
 from django.test import TestCase, override_settings
 from biostar.emailer import models
 
@@ -38,6 +40,55 @@ class SendMailTest(TestCase):
         "Test sending email using manage commands."
         management.call_command('test_email')
 
+    def test_template_cache(self):
+        "Test email templates are compiled once and again when the file changes."
+        sender.COMPILED.clear()
+
+        with patch.object(sender, "get_block", wraps=sender.get_block) as get_block:
+            for r in range(3):
+                sender.EmailTemplate("test_email.html")
+            self.assertEqual(get_block.call_count, 3)
+
+            # A new modification time compiles the template again.
+            path = sender.PATHS["test_email.html"]
+            mtime = os.path.getmtime(path)
+            os.utime(path, (mtime + 10, mtime + 10))
+            try:
+                sender.EmailTemplate("test_email.html")
+            finally:
+                os.utime(path, (mtime, mtime))
+            self.assertEqual(get_block.call_count, 6)
+
+    def test_send_many(self):
+        "Test sending emails rendered with a context per recipient."
+        email = sender.EmailTemplate("test_email.html")
+        recipients = [f"{r}@lvh.me" for r in range(3)]
+        contexts = [dict(subject=f"Hello {r}") for r in range(3)]
+
+        self.assertEqual(email.render_many(contexts), [email.render(context) for context in contexts])
+
+        email.send_many(contexts=contexts, from_email="mailer@biostars.org", recipient_list=recipients)
+
+        self.assertEqual([msg.subject for msg in mail.outbox], [f"[biostar-engine] Hello {r}" for r in range(3)])
+        self.assertEqual([msg.to for msg in mail.outbox], [[rec] for rec in recipients])
+
+    def test_send_many_shared(self):
+        "Test sending one rendering to batches of recipients."
+        email = sender.EmailTemplate("test_email.html")
+        context = dict(subject="Hello")
+        batches = [["a@lvh.me", "b@lvh.me"], ["c@lvh.me"]]
+
+        with patch.object(email, "render", wraps=email.render) as render:
+            email.send_many(contexts=[context] * 2, from_email="mailer@biostars.org", recipient_list=batches)
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual([msg.to for msg in mail.outbox], batches)
+
+        # No emails go out during data migration.
+        with override_settings(DATA_MIGRATION=True):
+            sent = email.send_many(contexts=[context], from_email="mailer@biostars.org", recipient_list=["d@lvh.me"])
+        self.assertEqual(sent, 0)
+        self.assertEqual(len(mail.outbox), 2)
+
 
 @override_settings(SEND_MAIL=SEND_MAIL)
 class ModelTests(TestCase):
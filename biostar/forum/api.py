@@ -2,16 +2,20 @@
 import json
 import os
 import logging
+from collections import defaultdict, Counter
 from os.path import join, normpath
 from django.core.cache import cache
 from django.conf import settings
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
 from datetime import datetime, timedelta
 
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from biostar.accounts.models import Profile, User
 from . import util
-from .models import Post, Vote, Subscription, PostView
+from .models import Post, Vote, Subscription, PostView, DailyStats
 
 
 logger = logging.getLogger("engine")
@@ -64,6 +68,62 @@ def get_counts(end):
     return data
 
 
+def daily_changes(start=None, end=None):
+    """
+    Counts added on each day from start up to end, with one grouped query per model.
+    """
+
+    def per_day(queryset, field, **counts):
+        if start:
+            queryset = queryset.filter(**{f"{field}__gte": start})
+        if end:
+            queryset = queryset.filter(**{f"{field}__lt": end})
+        return queryset.order_by().annotate(day=TruncDate(field)).values('day').annotate(**counts)
+
+    posts = per_day(Post.objects.all(), 'creation_date',
+                    questions=Count('id', filter=Q(type=Post.QUESTION)),
+                    answers=Count('id', filter=Q(type=Post.ANSWER)),
+                    toplevel=Count('id', filter=Q(type__in=Post.TOP_LEVEL) & ~Q(type=Post.BLOG)),
+                    comments=Count('id', filter=Q(type=Post.COMMENT)))
+    votes = per_day(Vote.objects.all(), 'date', votes=Count('id'))
+    users = per_day(Profile.objects.all(), 'date_joined', users=Count('id'))
+
+    changes = defaultdict(Counter)
+    for rows in (posts, votes, users):
+        for row in rows:
+            day = row.pop('day')
+            changes[day].update(row)
+
+    return changes
+
+
+def rollup_stats(until=None):
+    """
+    Adds the daily statistics from the last computed day up to the day before until.
+    """
+    until = until or timezone.localdate()
+
+    last = DailyStats.objects.order_by('-date').first()
+    start = last.date + timedelta(days=1) if last else None
+    totals = Counter(last.counts() if last else {})
+
+    changes = daily_changes(start=start, end=until)
+    if not changes:
+        return 0
+
+    # Days without changes get a row as well.
+    day = start or min(changes)
+    rows = []
+    while day < until:
+        totals.update(changes.get(day, {}))
+        rows.append(DailyStats(date=day, **{name: totals[name] for name in DailyStats.FIELDS}))
+        day += timedelta(days=1)
+
+    DailyStats.objects.bulk_create(rows, batch_size=1000)
+
+    return len(rows)
+
+
 def compute_stats(date):
     """
     Statistics about this website for the given date.
@@ -96,7 +156,9 @@ def compute_stats(date):
         'new_votes': list(new_votes),
     }
 
-    data.update(get_counts(end=end))
+    # Days not yet added to the daily statistics are counted directly.
+    stats = DailyStats.objects.filter(date=start).first()
+    data.update(stats.counts() if stats else get_counts(end=end))
 
     if not settings.DEBUG:
         stat_file(dump=True, date=start, data=data)
@@ -112,15 +174,22 @@ def json_response(f):
         """
         Creates the actual HttpResponse with json content.
         """
+        status = None
         try:
             data = f(request, *args, **kwargs)
+        except ValueError as exc:
+            # Invalid parameters.
+            data = api_error(msg=f"Error: {exc}")
+            status = 400
         except Exception as exc:
             logger.error(exc)
             data = api_error(msg=f"Error: {exc}")
 
         payload = json.dumps(data, sort_keys=True, indent=4)
         response = HttpResponse(payload, content_type="application/json")
-        if not data:
+        if status:
+            response.status_code = status
+        elif not data:
             response.status_code = 404
             response.reason_phrase = 'Not found'
         return response
@@ -174,6 +243,29 @@ def daily_stats_on_date(request, year, month, day):
     return compute_stats(date)
 
 
+@json_response
+def daily_stats_range(request, start, end):
+    """
+    Statistics about this website for each day from start to end.
+
+    Parameters:
+    start -- first day, YYYY-MM-DD.
+    end -- last day, YYYY-MM-DD.
+    """
+    start = datetime.strptime(start, "%Y-%m-%d").date()
+    end = datetime.strptime(end, "%Y-%m-%d").date()
+
+    if (end - start).days >= settings.STATS_RANGE_DAYS:
+        raise ValueError(f"range longer than {settings.STATS_RANGE_DAYS} days")
+
+    stats = DailyStats.objects.filter(date__gte=start, date__lte=end).order_by('date')
+
+    data = [dict(date=util.datetime_to_iso(row.date), timestamp=util.datetime_to_unix(row.date), **row.counts())
+            for row in stats]
+
+    return data
+
+
 @json_response
 def traffic(request):
     """
@@ -8,7 +8,8 @@ from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.db import transaction
-from django.db.models import F, Q
+from django.db.models import F, Q, Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.template import loader
 from django.utils.safestring import mark_safe
 from django.conf import settings
@@ -21,7 +22,7 @@ from biostar.accounts.models import Profile
 from biostar.utils.helpers import get_ip
 from . import util, awards
 from .const import *
-from .models import Post, Vote, Subscription, Badge, delete_post_cache, Log, SharedLink
+from .models import Post, Vote, Subscription, Badge, Award, delete_post_cache, Log, SharedLink, UserCounters
 
 User = get_user_model()
 
@@ -241,6 +242,9 @@ def merge_profiles(main, alias):
     Message.objects.filter(sender=alias).update(sender=main)
     Message.objects.filter(recipient=alias).update(recipient=main)
 
+    # Counters are rebuilt on the next read.
+    UserCounters.objects.filter(user=main).delete()
+
     # Do not delete older accounts.
     older = (alias.profile.date_joined < main.profile.date_joined)
 
@@ -288,6 +292,51 @@ def create_subscription(post, user, sub_type=None, update=False):
     delete_cache(FOLLOWING, user)
 
 
+def create_subscriptions(post, users, update=False):
+    """
+    Subscribes many users to a post with a fixed number of queries.
+    Matches create_subscription with the default subscription type.
+    """
+    root = post.root
+    users = {user.pk: user for user in users}
+    if not users:
+        return
+
+    # The default subscription type of each user.
+    defaults = {pk: Subscription.TYPE_MAP.get(user.profile.message_prefs, Subscription.LOCAL_MESSAGE)
+                for pk, user in users.items()}
+
+    subs = Subscription.objects.filter(post=root, user_id__in=users)
+    existing = set(subs.values_list('user_id', flat=True))
+
+    if update:
+        # Update existing subscriptions, one query per subscription type.
+        bytype = {}
+        for pk in existing:
+            bytype.setdefault(defaults[pk], []).append(pk)
+        for sub_type, pks in bytype.items():
+            subs.filter(user_id__in=pks).update(type=sub_type)
+        missing = [pk for pk in users if pk not in existing]
+    else:
+        # Drop all existing subscriptions for the users by default.
+        subs.delete()
+        missing = list(users)
+
+    date = util.now()
+    objs = [Subscription(post=root, user_id=pk, type=defaults[pk], date=date) for pk in missing]
+    Subscription.objects.bulk_create(objs, batch_size=500)
+
+    # Recompute subscription count
+    subs_count = Subscription.objects.filter(post=root).exclude(type=Subscription.NO_MESSAGES).count()
+
+    # Update root subscription counts.
+    Post.objects.filter(pk=root.pk).update(subs_count=subs_count)
+
+    # Delete following cache
+    for user in users.values():
+        delete_cache(FOLLOWING, user)
+
+
 def is_suspended(user):
     if user.is_authenticated and user.profile.state in (Profile.BANNED, Profile.SUSPENDED, Profile.SPAMMER):
         return True
@@ -317,6 +366,9 @@ def post_tree(user, root):
     # Gather votes by the current user.
     votes = get_votes(user=user, root=root)
 
+    # The subscription of the current user to the thread.
+    root.user_sub = Subscription.objects.filter(post=root, user=user).first() if user.is_authenticated else None
+
     # Shortcuts to each storage.
     bookmarks, upvotes = votes[Vote.BOOKMARK], votes[Vote.UP]
 
@@ -352,6 +404,29 @@ def post_tree(user, root):
     return root, comment_tree, answers, thread
 
 
+def walk_comments(tree, post):
+    """
+    Returns the comments below a post as a depth ordered list of (depth, comment) tuples.
+    """
+    collect = []
+    seen = set()
+
+    # The stack holds the nodes left to visit, the next node goes last.
+    stack = [(1, node) for node in reversed(tree.get(post.id, []))]
+
+    while stack:
+        depth, node = stack.pop()
+        collect.append((depth, node))
+
+        for child in reversed(tree.get(node.id, [])):
+            if child.id in seen:
+                raise Exception(f"circular tree {child.pk} {child.title}")
+            seen.add(child.id)
+            stack.append((depth + 1, child))
+
+    return collect
+
+
 def valid_awards(user):
     """
     Return list of valid awards for a given user
@@ -374,6 +449,25 @@ def valid_awards(user):
     return valid
 
 
+def batch_awards(users):
+    """
+    Return list of unsaved awards earned by the users in the queryset, one query per award.
+    """
+    badges = Badge.objects.filter(name__in=[award.name for award in awards.ALL_AWARDS])
+    badges = {badge.name: badge for badge in badges}
+
+    valid = []
+    for award in awards.ALL_AWARDS:
+        badge = badges.get(award.name)
+        if not badge:
+            continue
+
+        for user_id, post_id, date in award.get_batch_awards(users):
+            valid.append(Award(user_id=user_id, badge=badge, date=date or util.now(), post_id=post_id))
+
+    return valid
+
+
 def get_counts(user):
     # The number of new messages since last visit.
     message_count = Message.objects.filter(recipient=user, unread=True)[:1000].count()
@@ -398,6 +492,85 @@ def get_counts(user):
     return counts
 
 
+# Cache key for the site wide totals.
+SITE_COUNTS = "site-counts"
+
+
+def site_counts(fresh=False):
+    """
+    Totals shared by all users, the user counters store the totals they have seen.
+    """
+
+    def compute():
+        return dict(spam=Post.objects.filter(spam=Post.SPAM).count(), mod=Log.objects.count(),
+                    planet=BlogPost.objects.count())
+
+    if fresh:
+        cache.delete(SITE_COUNTS)
+
+    return cache.get_or_set(SITE_COUNTS, compute, settings.SESSION_UPDATE_SECONDS)
+
+
+def count_since(queryset, field):
+    """
+    Subquery counting the rows of the queryset, filtered by the outer query.
+    """
+    queryset = queryset.order_by().values(field).annotate(total=Count('id')).values('total')
+    return Coalesce(Subquery(queryset), 0)
+
+
+def reconcile_counters(counters):
+    """
+    Recomputes the counters in the queryset from scratch.
+    """
+    totals = site_counts(fresh=True)
+
+    # Objects belonging to the user or created since the counters were read.
+    unread = Message.objects.filter(recipient=OuterRef('user'), unread=True)
+    votes = Vote.objects.filter(post__author=OuterRef('user'), date__gte=OuterRef('date')).filter(
+        ~Q(author=OuterRef('user')))
+    spam = Post.objects.filter(spam=Post.SPAM, creation_date__gte=OuterRef('date'))
+    mods = Log.objects.filter(date__gte=OuterRef('date'))
+    planet = BlogPost.objects.filter(rank__gte=OuterRef('date'))
+
+    # Grouping on a constant counts all rows in the subquery.
+    spam, mods, planet = [qs.annotate(one=Value(1)) for qs in (spam, mods, planet)]
+
+    counters.update(message_count=count_since(unread, 'recipient'),
+                    vote_count=count_since(votes, 'post__author'),
+                    spam_seen=totals['spam'] - count_since(spam, 'one'),
+                    mod_seen=totals['mod'] - count_since(mods, 'one'),
+                    planet_seen=totals['planet'] - count_since(planet, 'one'))
+
+
+def read_counts(user):
+    """
+    Returns the counts since the last read and resets them.
+    """
+    counters = UserCounters.objects.filter(user=user).first()
+
+    # Counters are created on the first read.
+    if not counters:
+        counters = UserCounters.objects.create(user=user, date=user.profile.last_login)
+        reconcile_counters(UserCounters.objects.filter(id=counters.id))
+        counters.refresh_from_db()
+
+    totals = site_counts()
+
+    counts = dict(mod_count=max(totals['mod'] - counters.mod_seen, 0),
+                  spam_count=max(totals['spam'] - counters.spam_seen, 0),
+                  planet_count=max(totals['planet'] - counters.planet_seen, 0),
+                  message_count=counters.message_count,
+                  vote_count=counters.vote_count)
+
+    # Votes arriving in the meantime are kept.
+    UserCounters.objects.filter(id=counters.id).update(vote_count=F('vote_count') - counters.vote_count,
+                                                       spam_seen=totals['spam'], mod_seen=totals['mod'],
+                                                       planet_seen=totals['planet'], date=util.now())
+
+    return counts
+
+
 @transaction.atomic
 def apply_vote(post, user, vote_type):
     vote = Vote.objects.filter(author=user, post=post, type=vote_type).first()
@@ -406,6 +579,11 @@ def apply_vote(post, user, vote_type):
         msg = f"{vote.get_type_display()} removed"
         change = -1
         vote.delete()
+
+        # Take back the vote if the author has not seen it yet.
+        if not post.author == user:
+            UserCounters.objects.filter(user=post.author, date__lte=vote.date,
+                                        vote_count__gt=0).update(vote_count=F('vote_count') - 1)
     else:
         change = +1
         vote = Vote.objects.create(author=user, post=post, type=vote_type)
@@ -4,6 +4,7 @@ from django.utils.timezone import utc
 from datetime import datetime, timedelta
 from django.db.models import Count
 from django.db.models import Q
+from django.db.models.functions import Length
 from biostar.accounts.models import User
 from biostar.forum.models import Post, Vote, Badge, Award
 
@@ -19,11 +20,26 @@ def wrap_qs(cond, klass, pk):
     return klass.objects.filter(pk=pk) if cond else klass.objects.none()
 
 
+def more_than(users, queryset, field, limit):
+    """
+    Users with more than limit rows in the queryset, the field points to the user.
+    """
+    ids = queryset.order_by().values(field).annotate(total=Count('id')).filter(total__gt=limit).values(field)
+    return users.filter(id__in=ids)
+
+
+def autobio(users):
+    users = users.annotate(text_len=Length('profile__text'))
+    return users.filter(text_len__gt=80, profile__score__gt=1)
+
+
 class AwardDef(object):
-    def __init__(self, name, desc, func, icon, max=None, type=Badge.BRONZE):
+    def __init__(self, name, desc, func, icon, max=None, type=Badge.BRONZE, batch=None):
         self.name = name
         self.desc = desc
         self.fun = func
+        # Same condition as func, applied to a queryset of users.
+        self.batch = batch
         self.icon = icon
         self.template = ""
         self.type = type
@@ -59,6 +75,34 @@ class AwardDef(object):
 
         return value
 
+    def get_batch_awards(self, users):
+        """
+        Returns (user id, post id, date) for every user in the queryset that earned the award.
+        """
+        if not self.batch:
+            return [(user.id, target.id if isinstance(target, Post) else None,
+                     target.lastedit_date if isinstance(target, Post) else user.profile.last_login)
+                    for user in users for target in self.get_awards(user)]
+
+        try:
+            value = self.batch(users)
+        except Exception as exc:
+            logger.error("validator error %s" % exc)
+            return []
+
+        if value.model == Post:
+            # Get posts that have not been awarded yet
+            value = value.annotate(award_count=Count('award')).filter(award_count=0)
+
+            return list(value.values_list('author_id', 'id', 'lastedit_date'))
+
+        # Ensure users does not get over rewarded.
+        if self.max:
+            awarded = Count('award', filter=Q(award__badge__name=self.name))
+            value = value.annotate(award_count=awarded).filter(award_count__lt=self.max)
+
+        return [(uid, None, date) for uid, date in value.values_list('id', 'profile__last_login')]
+
     def __hash__(self):
         return hash(self.name)
 
@@ -72,7 +116,8 @@ AUTOBIO = AwardDef(
     desc="has more than 80 characters in the information field of the user's profile",
     func=lambda user: wrap_qs(len(user.profile.text) > 80 and user.profile.score > 1, User, user.id),
     max=1,
-    icon="bullhorn icon"
+    icon="bullhorn icon",
+    batch=autobio,
 )
 
 
@@ -81,7 +126,8 @@ CURATOR = AwardDef(
     desc="accepted atleast once",
     func=lambda user: wrap_qs(len(user.profile.text) > 80 and user.profile.score > 1, User, user.id),
     max=1,
-    icon="bullhorn icon"
+    icon="bullhorn icon",
+    batch=autobio,
 )
 
 COLLECTOR = AwardDef(
@@ -89,7 +135,8 @@ COLLECTOR = AwardDef(
     desc="submitted five or more herald stories ",
     func=lambda user: wrap_qs(len(user.profile.text) > 80 and user.profile.score > 1, User, user.id),
     max=1,
-    icon="bullhorn icon"
+    icon="bullhorn icon",
+    batch=autobio,
 )
 
 EDITOR = AwardDef(
@@ -97,7 +144,8 @@ EDITOR = AwardDef(
     desc="published links ",
     func=lambda user: wrap_qs(len(user.profile.text) > 80 and user.profile.score > 1, User, user.id),
     max=1,
-    icon="bullhorn icon"
+    icon="bullhorn icon",
+    batch=autobio,
 )
 
 
@@ -106,7 +154,8 @@ GOOD_QUESTION = AwardDef(
     desc="asked a question that was upvoted at least 5 times",
     func=lambda user: Post.objects.filter(vote_count__gte=5, author=user, type=Post.QUESTION),
     max=1,
-    icon="question circle icon"
+    icon="question circle icon",
+    batch=lambda users: Post.objects.filter(vote_count__gte=5, author__in=users, type=Post.QUESTION),
 )
 
 GOOD_ANSWER = AwardDef(
@@ -114,7 +163,8 @@ GOOD_ANSWER = AwardDef(
     desc="created an answer that was upvoted at least 5 times",
     func=lambda user: Post.objects.filter(vote_count__gt=5, author=user, type=Post.ANSWER),
     max=1,
-    icon="book icon"
+    icon="book icon",
+    batch=lambda users: Post.objects.filter(vote_count__gt=5, author__in=users, type=Post.ANSWER),
 )
 
 STUDENT = AwardDef(
@@ -122,7 +172,8 @@ STUDENT = AwardDef(
     desc="asked a question with at least 3 up-votes",
     func=lambda user: Post.objects.filter(vote_count__gt=2, author=user, type=Post.QUESTION),
     max=1,
-    icon="graduation cap icon"
+    icon="graduation cap icon",
+    batch=lambda users: Post.objects.filter(vote_count__gt=2, author__in=users, type=Post.QUESTION),
 )
 
 TEACHER = AwardDef(
@@ -130,7 +181,8 @@ TEACHER = AwardDef(
     desc="created an answer with at least 3 up-votes",
     func=lambda user: Post.objects.filter(vote_count__gt=2, author=user, type=Post.ANSWER),
     max=1,
-    icon="smile icon"
+    icon="smile icon",
+    batch=lambda users: Post.objects.filter(vote_count__gt=2, author__in=users, type=Post.ANSWER),
 )
 
 COMMENTATOR = AwardDef(
@@ -138,7 +190,8 @@ COMMENTATOR = AwardDef(
     desc="created a comment with at least 3 up-votes",
     func=lambda user: Post.objects.filter(vote_count__gt=2, author=user, type=Post.COMMENT),
     max=1,
-    icon="mycomment icon"
+    icon="mycomment icon",
+    batch=lambda users: Post.objects.filter(vote_count__gt=2, author__in=users, type=Post.COMMENT),
 )
 
 CENTURION = AwardDef(
@@ -148,6 +201,7 @@ CENTURION = AwardDef(
     max=1,
     icon="bolt icon",
     type=Badge.SILVER,
+    batch=lambda users: more_than(users, Post.objects.all(), 'author', 100),
 )
 
 EPIC_QUESTION = AwardDef(
@@ -157,6 +211,7 @@ EPIC_QUESTION = AwardDef(
     max=1,
     icon="bullseye icon",
     type=Badge.GOLD,
+    batch=lambda users: Post.objects.filter(author__in=users, view_count__gt=10000),
 )
 
 POPULAR = AwardDef(
@@ -166,6 +221,7 @@ POPULAR = AwardDef(
     max=1,
     icon="eye icon",
     type=Badge.GOLD,
+    batch=lambda users: Post.objects.filter(author__in=users, view_count__gt=1000),
 )
 
 ORACLE = AwardDef(
@@ -175,6 +231,7 @@ ORACLE = AwardDef(
     max=1,
     icon="sun icon",
     type=Badge.GOLD,
+    batch=lambda users: more_than(users, Post.objects.all(), 'author', 1000),
 )
 
 PUNDIT = AwardDef(
@@ -184,6 +241,7 @@ PUNDIT = AwardDef(
     max=1,
     icon="comments icon",
     type=Badge.SILVER,
+    batch=lambda users: Post.objects.filter(author__in=users, type=Post.COMMENT, vote_count__gt=10),
 )
 
 GURU = AwardDef(
@@ -193,6 +251,7 @@ GURU = AwardDef(
     max=1,
     icon="beer icon",
     type=Badge.SILVER,
+    batch=lambda users: more_than(users, Vote.objects.all(), 'post__author', 100),
 )
 
 CYLON = AwardDef(
@@ -202,6 +261,7 @@ CYLON = AwardDef(
     max=1,
     icon="rocket icon",
     type=Badge.GOLD,
+    batch=lambda users: more_than(users, Vote.objects.all(), 'post__author', 1000),
 )
 
 VOTER = AwardDef(
@@ -209,7 +269,8 @@ VOTER = AwardDef(
     desc="voted more than 100 times",
     func=lambda user: wrap_qs(Vote.objects.filter(author=user).count() > 100, User, user.id),
     max=1,
-    icon="thumbs up outline icon"
+    icon="thumbs up outline icon",
+    batch=lambda users: more_than(users, Vote.objects.all(), 'author', 100),
 )
 
 SUPPORTER = AwardDef(
@@ -219,6 +280,7 @@ SUPPORTER = AwardDef(
     max=1,
     icon="thumbs up icon",
     type=Badge.SILVER,
+    batch=lambda users: more_than(users, Vote.objects.all(), 'author', 25),
 )
 
 SCHOLAR = AwardDef(
@@ -226,7 +288,8 @@ SCHOLAR = AwardDef(
     desc="created an answer that has been accepted",
     func=lambda user: Post.objects.filter(author=user, type=Post.ANSWER, accept_count__gt=0),
     max=1,
-    icon="university icon"
+    icon="university icon",
+    batch=lambda users: Post.objects.filter(author__in=users, type=Post.ANSWER, accept_count__gt=0),
 )
 
 PROPHET = AwardDef(
@@ -234,7 +297,8 @@ PROPHET = AwardDef(
     desc="created a post with more than 20 followers",
     func=lambda user: Post.objects.filter(author=user, type__in=Post.TOP_LEVEL, subs_count__gt=20),
     max=1,
-    icon="leaf icon"
+    icon="leaf icon",
+    batch=lambda users: Post.objects.filter(author__in=users, type__in=Post.TOP_LEVEL, subs_count__gt=20),
 )
 
 LIBRARIAN = AwardDef(
@@ -242,7 +306,8 @@ LIBRARIAN = AwardDef(
     desc="created a post with more than 10 bookmarks",
     func=lambda user: Post.objects.filter(author=user, type__in=Post.TOP_LEVEL, book_count__gt=10),
     max=1,
-    icon="bookmark outline icon"
+    icon="bookmark outline icon",
+    batch=lambda users: Post.objects.filter(author__in=users, type__in=Post.TOP_LEVEL, book_count__gt=10),
 )
 
 
@@ -253,6 +318,11 @@ def rising_star(user):
     return wrap_qs(cond, User, user.id)
 
 
+def rising_stars(users):
+    users = users.filter(profile__date_joined__gt=now() - timedelta(weeks=15))
+    return more_than(users, Post.objects.all(), 'author', 50)
+
+
 RISING_STAR = AwardDef(
     name="Rising Star",
     desc="created 50 posts within first three months of joining",
@@ -260,6 +330,7 @@ RISING_STAR = AwardDef(
     icon="star icon",
     max=1,
     type=Badge.GOLD,
+    batch=rising_stars,
 )
 
 
@@ -269,6 +340,7 @@ GREAT_QUESTION = AwardDef(
     func=lambda user: Post.objects.filter(author=user, view_count__gt=5000),
     icon="fire icon",
     type=Badge.SILVER,
+    batch=lambda users: Post.objects.filter(author__in=users, view_count__gt=5000),
 )
 
 GOLD_STANDARD = AwardDef(
@@ -277,6 +349,7 @@ GOLD_STANDARD = AwardDef(
     func=lambda user: Post.objects.filter(author=user, book_count__gt=25),
     icon="bookmark icon",
     type=Badge.GOLD,
+    batch=lambda users: Post.objects.filter(author__in=users, book_count__gt=25),
 )
 
 APPRECIATED = AwardDef(
@@ -285,6 +358,7 @@ APPRECIATED = AwardDef(
     func=lambda user: Post.objects.filter(author=user, vote_count__gt=5),
     icon="heart icon",
     type=Badge.SILVER,
+    batch=lambda users: Post.objects.filter(author__in=users, vote_count__gt=5),
 )
 
 
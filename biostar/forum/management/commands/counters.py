@@ -0,0 +1,34 @@
+import logging
+from django.core.management.base import BaseCommand
+from biostar.forum.models import UserCounters
+from biostar.forum import auth
+
+logger = logging.getLogger('engine')
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the user counters from scratch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=str, default='', help="Recompute the counters of a single user (email).")
+        parser.add_argument('--reset', action='store_true', default=False,
+                            help="Deletes the counters, they are rebuilt when the users return.")
+
+    def handle(self, *args, **options):
+        email = options['user']
+        reset = options['reset']
+
+        counters = UserCounters.objects.all()
+
+        if email:
+            counters = counters.filter(user__email=email)
+
+        if reset:
+            logger.info(f"Deleting {counters.count()} user counters")
+            counters.delete()
+            return
+
+        # Messages deleted in bulk (cleanup, bans) are not subtracted as they happen.
+        auth.reconcile_counters(counters)
+
+        logger.info(f"Recomputed {counters.count()} user counters")
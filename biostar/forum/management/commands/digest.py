@@ -1,20 +1,77 @@
 from datetime import timedelta
+import json
 import logging
-from django.template import loader
+import os
+from itertools import islice
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from taggit.models import Tag
 from biostar.forum.models import Post
-from biostar.emailer.tasks import send_email
+from biostar.emailer import sender
 from biostar.accounts import util, models
 
 logger = logging.getLogger('engine')
 
 
-def send_digests(days=1, subject=""):
+def digest_period(days, date):
+    """
+    Returns the key of the digest period that contains the date.
+    """
+    if days >= 30:
+        key = date.strftime("%Y-%m")
+    elif days >= 7:
+        key = "%d-W%02d" % date.isocalendar()[:2]
+    else:
+        key = date.isoformat()
+
+    return f"{days}:{key}"
+
+
+def load_checkpoint(period):
+    """
+    Returns the id of the last user that received the digest of this period.
+    """
+    if not os.path.isfile(settings.DIGEST_CHECKPOINT):
+        return 0
+
+    with open(settings.DIGEST_CHECKPOINT) as fp:
+        data = json.load(fp)
+
+    return data.get(period, 0)
+
+
+def save_checkpoint(period, last_id):
+    """
+    Records the last user that received the digest, keeps a single period per cadence.
+    """
+    data = {}
+    if os.path.isfile(settings.DIGEST_CHECKPOINT):
+        with open(settings.DIGEST_CHECKPOINT) as fp:
+            data = json.load(fp)
+
+    cadence = period.split(":")[0]
+    data = {key: value for key, value in data.items() if key.split(":")[0] != cadence}
+    data[period] = last_id
+
+    os.makedirs(os.path.dirname(settings.DIGEST_CHECKPOINT), exist_ok=True)
+    tmp = f"{settings.DIGEST_CHECKPOINT}.tmp"
+    with open(tmp, 'w') as fp:
+        json.dump(data, fp)
+    os.replace(tmp, settings.DIGEST_CHECKPOINT)
+
+
+def send_digests(days=1, subject="", chunk_size=1000):
     '''
     Send digest emails to users
     '''
 
+    if not settings.SEND_MAIL:
+        return
+
+    # No digests during data migration, the recipients would be checkpointed as sent.
+    if settings.DATA_MIGRATION:
+        logger.info(f"skip the {days} day digest DATA_MIGRATION={settings.DATA_MIGRATION}")
+        return
+
     mapper = {1: models.Profile.DAILY_DIGEST,
               7: models.Profile.WEEKLY_DIGEST,
               30: models.Profile.MONTHLY_DIGEST}
@@ -24,6 +81,9 @@ def send_digests(days=1, subject=""):
 
     posts = Post.objects.filter(lastedit_date__gt=trange, is_toplevel=True).order_by('-lastedit_date')
 
+    # Evaluate the posts once for all recipients.
+    posts = list(posts)
+
     if not posts:
         logger.info(f'No new posts found in the last {days} days.')
         return
@@ -32,20 +92,39 @@ def send_digests(days=1, subject=""):
     # AWS has limit of 50
     batch_size = 40
 
+    # Every recipient gets the same digest, rendered once for each chunk.
+    port = f":{settings.HTTP_PORT}" if settings.HTTP_PORT else ""
+    context = dict(domain=settings.SITE_DOMAIN, protocol=settings.PROTOCOL, port=port, name=settings.SITE_NAME,
+                   subject=subject, posts=posts)
+    template = sender.EmailTemplate("messages/digest.html")
+    from_email = settings.FROM_EMAIL_PATTERN % ("", settings.DEFAULT_FROM_EMAIL)
+
+    # Resume after the last user that got the digest of this period.
+    period = digest_period(days=days, date=util.now().date())
+    last_id = load_checkpoint(period)
+
     # Get users with the appropriate digest preference.
     pref = mapper.get(days, models.Profile.DAILY_DIGEST)
-    context = dict(subject=subject, posts=posts)
-    users = models.User.objects.filter(profile__digest_prefs=pref)
-    emails = users.values_list('email', flat=True)
-
-    # Iterate through recipients and send emails in batches.
-    for idx in range(0, len(emails), batch_size):
-        # Get the next set of emails
-        end = idx + batch_size
-        rec_list = emails[idx:end]
-        send_email(template_name="messages/digest.html", extra_context=context, recipient_list=rec_list)
-
-    return
+    users = models.User.objects.filter(profile__digest_prefs=pref, id__gt=last_id).order_by('id')
+    stream = users.values_list('id', 'email').iterator(chunk_size=chunk_size)
+
+    total = 0
+    while True:
+        chunk = list(islice(stream, chunk_size))
+        if not chunk:
+            break
+
+        # One connection sends every batch of the chunk.
+        emails = [email for uid, email in chunk]
+        batches = [emails[idx:idx + batch_size] for idx in range(0, len(emails), batch_size)]
+        template.send_many(contexts=[context] * len(batches), from_email=from_email, recipient_list=batches)
+
+        total += len(chunk)
+        save_checkpoint(period, chunk[-1][0])
+
+    logger.info(f"Sent the {days} day digest to {total} users.")
+
+    return total
 
 
 class Command(BaseCommand):
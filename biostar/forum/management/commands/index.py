@@ -19,6 +19,10 @@ def build(size, remove=False):
     Builds search index
     """
 
+    # Posts flagged on save, the queue grows without the indexer daemon.
+    flagged = search.drain_queue(size=size)
+    logger.info(f"Indexed {flagged} flagged posts")
+
     # Get top level posts that have not been indexed.
     posts = Post.objects.valid_posts(indexed=False, is_toplevel=True).exclude(root=None)[:size]
     target_count = len(posts)
@@ -60,6 +64,10 @@ class Command(BaseCommand):
         parser.add_argument('--remove', action='store_true', default=False, help="Removes the existing index.")
         parser.add_argument('--report', action='store_true', default=False, help="Reports on the content of the index.")
         parser.add_argument('--size', type=int, default=0, help="How many posts to index")
+        parser.add_argument('--daemon', action='store_true', default=False,
+                            help="Runs the indexer that consumes the queue of flagged posts.")
+        parser.add_argument('--latency', type=float, default=None,
+                            help="Longest time (seconds) a flagged post waits for the indexer.")
 
     def handle(self, *args, **options):
 
@@ -69,12 +77,18 @@ class Command(BaseCommand):
         remove = options['remove']
         report = options['report']
         size = options['size']
+        daemon = options['daemon']
+        latency = options['latency']
 
         # Sets the un-indexed flags to false on all posts.
         if reset:
             logger.info(f"Setting indexed field to false on all post.")
             Post.objects.valid_posts(indexed=True).exclude(root=None).update(indexed=False)
 
+        # Keep the index in sync with the queue, the size sets the batch size.
+        if daemon:
+            search.run_indexer(size=size, latency=latency)
+
         # Index a limited number yet unindexed posts
         if size:
             build(size=size, remove=remove)
@@ -1,8 +1,12 @@
 """
 Creates a sitemap in the EXPORT directory
 """
+import gzip
+import json
 import os
 from django.conf import settings
+from django.db.models import Count, Max, Sum, F, IntegerField
+from django.db.models.functions import Floor
 from django.contrib.sitemaps import GenericSitemap
 from django.contrib.sites.models import Site
 from biostar.forum.models import Post
@@ -41,6 +45,19 @@ SITEMAP_ROW = """
     </sitemap>
 """
 
+SHARD_ROW = """
+    <sitemap>
+        <loc>https://%s/static/%s</loc>
+        <lastmod>%s</lastmod>
+    </sitemap>
+"""
+
+# Post ids covered by each shard, a shard never has more than 50K urls.
+SHARD_SIZE = 50000
+
+# Records the state of the posts in each shard at the last run.
+MANIFEST = "sitemap.json"
+
 
 def ping_google():
     try:
@@ -81,15 +98,107 @@ def generate_sitemap(index, batch):
         print(URLSET_END, end='')
 
 
+def sitemap_posts():
+    return Post.objects.filter(is_toplevel=True, root__status=Post.OPEN).exclude(type=Post.BLOG)
+
+
+def shard_name(shard):
+    return f"sitemap_{shard + 1}.xml.gz"
+
+
+def shard_key(name):
+    return int(name.split("_")[1].split(".")[0])
+
+
+def write_file(path, rows, compress=False):
+    """
+    Writes the rows into a temporary file then moves it into place.
+    """
+    tmp = f"{path}.tmp"
+    stream = gzip.open(tmp, 'wt', encoding="utf-8") if compress else open(tmp, 'wt', encoding="utf-8")
+    with stream:
+        for row in rows:
+            stream.write(row)
+    os.replace(tmp, path)
+
+
+def write_shard(path, posts, domain):
+    """
+    Streams the posts of a shard into a gzip compressed sitemap.
+    """
+
+    def rows():
+        yield URLSET_START
+        for uid, lastedit in posts.values_list("uid", "lastedit_date").order_by("pk").iterator(chunk_size=5000):
+            yield URLSET_ROW % (domain, uid, lastedit.strftime("%Y-%m-%d"))
+        yield URLSET_END
+
+    write_file(path, rows(), compress=True)
+
+
+def write_sitemap(target, size=SHARD_SIZE):
+    """
+    Writes the compressed sitemap shards and the sitemap index into the target directory.
+    Only shards whose posts changed since the last run are written again.
+    """
+    site = Site.objects.get_current()
+    os.makedirs(target, exist_ok=True)
+
+    # The previous state of the shards.
+    path = os.path.join(target, MANIFEST)
+    previous = json.load(open(path)) if os.path.isfile(path) else {}
+
+    # Shards cover fixed ranges of post ids, new posts do not move older posts across shards.
+    posts = sitemap_posts()
+    shard = Floor(F('pk') / size, output_field=IntegerField())
+    stats = posts.order_by().annotate(shard=shard).values('shard')
+    stats = stats.annotate(count=Count('pk'), total=Sum('pk'), lastmod=Max('lastedit_date'))
+
+    current, lastmods, written = {}, {}, 0
+    for row in stats:
+        name = shard_name(row['shard'])
+        current[name] = [row['count'], row['total'], row['lastmod'].isoformat()]
+        lastmods[name] = row['lastmod'].strftime("%Y-%m-%d")
+
+        # Skip shards that have not changed.
+        if previous.get(name) == current[name] and os.path.isfile(os.path.join(target, name)):
+            continue
+
+        start = row['shard'] * size
+        write_shard(os.path.join(target, name), posts.filter(pk__gte=start, pk__lt=start + size), site.domain)
+        written += 1
+
+    # Remove shards that no longer have posts.
+    for name in set(previous) - set(current):
+        if os.path.isfile(os.path.join(target, name)):
+            os.remove(os.path.join(target, name))
+
+    # The index lists every shard.
+    body = [SHARD_ROW % (site.domain, name, lastmods[name]) for name in sorted(current, key=shard_key)]
+    write_file(os.path.join(target, "sitemap.xml"), [SITEMAP_XML % "".join(body)])
+    write_file(path, [json.dumps(current)])
+
+    logger.info(f"sitemap shards={len(current)} written={written}")
+
+    return written
+
+
 class Command(BaseCommand):
     help = 'Creates a sitemap in the export folder of the site'
 
     def add_arguments(self, parser):
         parser.add_argument('--index', default=0, help="Writes an index")
         parser.add_argument('--batch', default=0, help="50K URL in a batch")
+        parser.add_argument('--target', default='', help="Writes compressed shards and the index into a directory")
 
     def handle(self, *args, **options):
         index = int(options['index'])
         batch = int(options['batch'])
+        target = options['target']
+
+        if target:
+            write_sitemap(target=target)
+            return
+
         generate_sitemap(index=index, batch=batch)
         # ping_google()
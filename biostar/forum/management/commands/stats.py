@@ -0,0 +1,26 @@
+import logging
+from django.core.management.base import BaseCommand
+from biostar.forum.models import DailyStats
+from biostar.forum import api
+
+logger = logging.getLogger('engine')
+
+
+class Command(BaseCommand):
+    help = 'Adds the daily statistics for the days since the last run.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backfill', action='store_true', default=False,
+                            help="Deletes the daily statistics and computes the full history again.")
+
+    def handle(self, *args, **options):
+        backfill = options['backfill']
+
+        # Posts and votes deleted later are only subtracted by a backfill.
+        if backfill:
+            logger.info(f"Deleting {DailyStats.objects.count()} daily statistics")
+            DailyStats.objects.all().delete()
+
+        added = api.rollup_stats()
+
+        logger.info(f"Added {added} daily statistics")
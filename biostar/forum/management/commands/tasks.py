@@ -17,8 +17,8 @@ logger = logging.getLogger('engine')
 
 BACKUP_DIR = os.path.join(settings.BASE_DIR, 'export', 'backup')
 
-BUMP, UNBUMP, AWARD = 'bump', 'unbump', 'award'
-CHOICES = [BUMP, UNBUMP, AWARD]
+BUMP, UNBUMP, AWARD, SPAM, VIEWS = 'bump', 'unbump', 'award', 'spam', 'views'
+CHOICES = [BUMP, UNBUMP, AWARD, SPAM, VIEWS]
 
 
 def bump(uids, **kwargs):
@@ -77,6 +77,41 @@ def awards(limit=50, **kwargs):
     return
 
 
+def spam(uids, limit=100, **kwargs):
+    """
+    Classify posts not yet checked for spam in a single batch.
+    """
+    if uids:
+        tasks.spam_check_batch(uids=uids.split(','))
+        return
+
+    # Posts up to the last checked one stay unclassified when they are not spam.
+    fname = settings.SPAM_CHECKED
+    last = int(open(fname).read()) if os.path.isfile(fname) else 0
+
+    query = Post.objects.filter(spam=Post.DEFAULT, pk__gt=last).order_by("pk")[:limit]
+    checked = list(query.values_list("pk", "uid"))
+
+    if not checked:
+        return
+
+    tasks.spam_check_batch(uids=[uid for pk, uid in checked])
+
+    with open(fname, 'wt') as fp:
+        fp.write(str(checked[-1][0]))
+
+    return
+
+
+def views(**kwargs):
+    """
+    Add the post views buffered in the cache to the view counts.
+    """
+    total = models.flush_post_views()
+    logger.info(f"Counted {total} post views")
+
+    return
+
 
 class Command(BaseCommand):
     help = 'Preform action on list of posts.'
@@ -89,7 +124,7 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         action = options['action']
 
-        opts = {BUMP: bump, UNBUMP: unbump, AWARD: awards}
+        opts = {BUMP: bump, UNBUMP: unbump, AWARD: awards, SPAM: spam, VIEWS: views}
 
         func = opts[action]
         # print()
@@ -2,7 +2,11 @@
 Markdown parser to render the Biostar style markdown.
 """
 import re
+import hashlib
 import inspect, logging
+import threading
+import time
+from collections import OrderedDict
 from functools import partial
 import mistune
 import requests
@@ -200,9 +204,54 @@ class BiostarInlineLexer(MonkeyPatch):
         self.root = root
         self.allow_rewrite = allow_rewrite
 
+        # References resolved ahead of rendering.
+        self.users, self.posts, self.profiles = {}, {}, {}
+
+        # Users mentioned in the text.
+        self.mentioned = []
+
         super(BiostarInlineLexer, self).__init__(*args, **kwargs)
         self.enable_all()
 
+    def resolve(self, text):
+        """
+        Looks up every user and post referenced in the text with one query per kind.
+        """
+        handles = {m.group("handle") for m in MENTINONED_USERS.finditer(text)}
+        post_uids = {m.group("uid") for patt in (POST_TOPLEVEL, POST_ANCHOR) for m in patt.finditer(text)}
+        user_uids = {m.group("uid") for m in USER_PATTERN.finditer(text)}
+
+        self.users, self.posts, self.profiles = {}, {}, {}
+        self.mentioned = []
+
+        if handles:
+            users = User.objects.filter(profile__handle__in=handles).select_related('profile').order_by('pk')
+            for user in users:
+                self.users.setdefault(user.profile.handle, user)
+
+        if post_uids:
+            posts = Post.objects.filter(uid__in=post_uids).select_related('root')
+            self.posts = {post.uid: post for post in posts}
+
+        if user_uids:
+            profiles = Profile.objects.filter(uid__in=user_uids)
+            self.profiles = {profile.uid: profile for profile in profiles}
+
+    def get_user(self, handle):
+        if handle not in self.users:
+            self.users[handle] = User.objects.filter(profile__handle=handle).first()
+        return self.users[handle]
+
+    def get_post(self, uid):
+        if uid not in self.posts:
+            self.posts[uid] = Post.objects.filter(uid=uid).first()
+        return self.posts[uid]
+
+    def get_profile(self, uid):
+        if uid not in self.profiles:
+            self.profiles[uid] = Profile.objects.filter(uid=uid).first()
+        return self.profiles[uid]
+
     def enable_all(self):
         self.enable_post_link()
         self.enable_mention_link()
@@ -241,15 +290,13 @@ class BiostarInlineLexer(MonkeyPatch):
     def output_mention_link(self, m):
 
         handle = m.group("handle")
-        # Query user and get the link
-        user = User.objects.filter(profile__handle=handle).first()
+        # Get the user and the link
+        user = self.get_user(handle)
         if user:
             profile = reverse("user_profile", kwargs=dict(uid=user.profile.uid))
             link = f'<a href="{profile}">{user.profile.name}</a>'
-            # Subscribe mentioned users to post.
-            if self.root:
-                # Create user subscription if it does not already exist.
-                auth.create_subscription(post=self.root, user=user, update=True)
+            # Mentioned users get subscribed to the post once rendering is done.
+            self.mentioned.append(user)
         else:
             link = m.group(0)
 
@@ -258,7 +305,7 @@ class BiostarInlineLexer(MonkeyPatch):
     def output_post_link(self, m):
         uid = m.group("uid")
         link = m.group(0)
-        post = Post.objects.filter(uid=uid).first()
+        post = self.get_post(uid)
         title = post.root.title if post else "Post not found"
         return f'<a href="{link}">{title}</a>'
 
@@ -269,7 +316,7 @@ class BiostarInlineLexer(MonkeyPatch):
     def output_anchor_link(self, m):
         uid = m.group("uid")
         link = m.group(0)
-        post = Post.objects.filter(uid=uid).first()
+        post = self.get_post(uid)
         title = post.root.title if post else "Post not found"
         return f'<a href="{link}">{title}</a>'
 
@@ -280,7 +327,7 @@ class BiostarInlineLexer(MonkeyPatch):
     def output_user_link(self, m):
         uid = m.group("uid")
         link = m.group(0)
-        profile = Profile.objects.filter(uid=uid).first()
+        profile = self.get_profile(uid)
         name = profile.name if profile else f"Invalid user uid: {uid}"
         return f'<a href="{link}">{name}</a>'
 
@@ -374,10 +421,53 @@ def embedder(attrs, new, embed=None):
     return attrs
 
 
+# Parsers, cleaners and linkers are expensive to build and not thread safe.
+LOCAL = threading.local()
+
+
+def get_markdown(escape=True, allow_rewrite=False):
+    """
+    Returns the markdown parser of the current thread for the given options.
+    """
+    parsers = LOCAL.__dict__.setdefault('parsers', {})
+    key = (escape, allow_rewrite)
+
+    if key not in parsers:
+        renderer = BiostarRenderer(escape=escape)
+        inline = BiostarInlineLexer(renderer=renderer, allow_rewrite=allow_rewrite)
+        parsers[key] = mistune.Markdown(hard_wrap=True, renderer=renderer, inline=inline)
+
+    return parsers[key]
+
+
+def get_cleaner():
+    """
+    Returns the bleach cleaner of the current thread.
+    """
+    if not hasattr(LOCAL, 'cleaner'):
+        LOCAL.cleaner = Cleaner(tags=ALLOWED_TAGS,
+                                styles=ALLOWED_STYLES,
+                                attributes=ALLOWED_ATTRIBUTES,
+                                protocols=ALLOWED_PROTOCOLS)
+    return LOCAL.cleaner
+
+
+def get_linker():
+    """
+    Returns the bleach linker of the current thread and the list it collects embeds into.
+    """
+    if not hasattr(LOCAL, 'linker'):
+        LOCAL.embed = []
+        LOCAL.linker = Linker(callbacks=[partial(embedder, embed=LOCAL.embed), nofollow],
+                              skip_tags=['pre', 'code'])
+    return LOCAL.linker, LOCAL.embed
+
+
 def linkify(text):
     # List of links to embed
-    embed = []
-    html = bleach.linkify(text=text, callbacks=[partial(embedder, embed=embed), nofollow], skip_tags=['pre', 'code'])
+    linker, embed = get_linker()
+    embed.clear()
+    html = linker.linkify(text)
 
     # Embed links into html.
     for em in embed:
@@ -388,6 +478,51 @@ def linkify(text):
     return html
 
 
+class HtmlCache(object):
+    """
+    Least recently used cache of rendered html keyed by a hash of the content.
+    The html shows post titles and user names, entries expire after ttl seconds.
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.store = OrderedDict()
+
+    def key(self, text, *params):
+        digest = hashlib.sha1(text.encode("utf-8", "replace")).hexdigest()
+        return (digest,) + params
+
+    def get(self, key):
+        with self.lock:
+            entry = self.store.get(key)
+            if entry is None:
+                return None
+            created, value = entry
+            if time.time() - created > self.ttl:
+                del self.store[key]
+                return None
+            self.store.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.size <= 0:
+            return
+        with self.lock:
+            self.store[key] = (time.time(), value)
+            self.store.move_to_end(key)
+            while len(self.store) > self.size:
+                self.store.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.store.clear()
+
+
+CACHE = HtmlCache(size=settings.MARKDOWN_CACHE_SIZE, ttl=settings.MARKDOWN_CACHE_TTL)
+
+
 def safe(f):
     """
     Safely call an object without causing errors
@@ -419,25 +554,39 @@ def parse(text, post=None, clean=True, escape=True, allow_rewrite=False):
     # Resolve the root if exists.
     root = post.parent.root if (post and post.parent) else None
 
-    # Initialize the renderer
-    renderer = BiostarRenderer(escape=escape)
+    # Unchanged post content renders to the same html.
+    key = CACHE.key(text, root.pk if root else None, clean, escape, allow_rewrite) if post else None
+    cached = CACHE.get(key) if key else None
+    if cached is not None:
+        output, mentioned = cached
+
+        # Mentions subscribe the users each time the text is rendered.
+        if root and mentioned:
+            users = User.objects.filter(pk__in=mentioned).select_related('profile')
+            auth.create_subscriptions(post=root, users=users, update=True)
+        return output
 
-    # Initialize the lexer
-    inline = BiostarInlineLexer(renderer=renderer, root=root, allow_rewrite=allow_rewrite)
+    markdown = get_markdown(escape=escape, allow_rewrite=allow_rewrite)
 
-    markdown = mistune.Markdown(hard_wrap=True, renderer=renderer, inline=inline)
+    # Resolve the referenced users and posts up front.
+    inline = markdown.inline
+    inline.root = root
+    inline.resolve(text)
 
     output = markdown(text=text)
+
+    # Subscribe the mentioned users to the root.
+    if root and inline.mentioned:
+        auth.create_subscriptions(post=root, users=inline.mentioned, update=True)
     # Bleach clean the html.
     if clean:
-        output = bleach.clean(text=output,
-                            tags=ALLOWED_TAGS,
-                            styles=ALLOWED_STYLES,
-                            attributes=ALLOWED_ATTRIBUTES,
-                            protocols=ALLOWED_PROTOCOLS)
+        output = get_cleaner().clean(output)
     # Embed sensitive links into html
     output = linkify(text=output)
 
+    if key:
+        CACHE.set(key, (output, [user.pk for user in inline.mentioned]))
+
     return output
 
 
@@ -98,8 +98,8 @@ def user_tasks(get_response):
             # Set the last login time.
             Profile.objects.filter(user=user).update(last_login=now())
 
-            # Compute latest counts.
-            counts = auth.get_counts(user=user)
+            # Read the latest counts.
+            counts = auth.read_counts(user=user)
 
             # Set the session.
             request.session[settings.SESSION_COUNT_KEY] = counts
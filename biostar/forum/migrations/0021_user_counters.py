@@ -0,0 +1,29 @@
+# Generated by Django 3.2 on 2021-06-02 10:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('forum', '0020_sharedlink_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCounters',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message_count', models.IntegerField(default=0)),
+                ('vote_count', models.IntegerField(default=0)),
+                ('spam_seen', models.IntegerField(default=0)),
+                ('mod_seen', models.IntegerField(default=0)),
+                ('planet_seen', models.IntegerField(default=0)),
+                ('date', models.DateTimeField()),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='counters', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
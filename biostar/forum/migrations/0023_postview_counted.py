@@ -0,0 +1,24 @@
+# Generated by Django 3.2 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0022_daily_stats'),
+    ]
+
+    operations = [
+        # Existing views are already part of the view counts.
+        migrations.AddField(
+            model_name='postview',
+            name='counted',
+            field=models.BooleanField(default=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='postview',
+            name='counted',
+            field=models.BooleanField(default=False, db_index=True),
+        ),
+    ]
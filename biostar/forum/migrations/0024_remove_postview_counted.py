@@ -0,0 +1,35 @@
+# Generated by Django 3.2 on 2026-10-18 12:00
+
+from collections import Counter
+
+from django.db import migrations
+from django.db.models import F
+
+
+def count_views(apps, schema_editor):
+    """
+    Adds the views recorded but not yet counted to the view counts.
+    """
+    PostView = apps.get_model('forum', 'PostView')
+    Post = apps.get_model('forum', 'Post')
+
+    views = PostView.objects.filter(counted=False)
+    counts = Counter(views.values_list('post_id', flat=True))
+    for pid, num in counts.items():
+        Post.objects.filter(id=pid).update(view_count=F('view_count') + num)
+    views.update(counted=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0023_postview_counted'),
+    ]
+
+    operations = [
+        migrations.RunPython(count_views, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='postview',
+            name='counted',
+        ),
+    ]
@@ -1,13 +1,15 @@
 import logging
+from collections import Counter
 from datetime import timedelta
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.sites.models import Site
 from django.core.cache import cache
 from django.core.cache.utils import make_template_fragment_key
-from django.db import models
+from django.db import models, transaction
 from django.db.models import F
 from django.db.models import Q
+from django.db.models import Case, When, Value, IntegerField
 from django.shortcuts import reverse
 from taggit.managers import TaggableManager
 from urllib.parse import urlparse
@@ -427,6 +429,91 @@ class PostView(models.Model):
     date = models.DateTimeField(auto_now_add=True)
 
 
+# Cache keys of the buffered views. Each view takes the next numbered slot,
+# the flushes record the slots up to the flushed mark.
+VIEW_FLUSH = "postview-flush"
+VIEW_LOCK = "postview-lock"
+VIEW_COUNT = "postview-count"
+VIEW_FLUSHED = "postview-flushed"
+
+
+def view_slot(num):
+    return f"postview-slot-{num}"
+
+
+def record_views(views):
+    """
+    Inserts the views, a list of (post id, ip), and adds them to the view counts.
+    """
+    with transaction.atomic():
+        PostView.objects.bulk_create([PostView(post_id=pid, ip=ip) for pid, ip in views])
+
+        # One update for the batch of posts.
+        counts = Counter(pid for pid, ip in views)
+        increment = Case(*[When(id=pid, then=Value(num)) for pid, num in counts.items()],
+                         output_field=IntegerField())
+        Post.objects.filter(id__in=counts).update(view_count=F('view_count') + increment)
+
+
+def flush_post_views(batch_size=500, limit=None):
+    """
+    Records the views buffered in the cache, at most limit batches.
+
+    Slots are claimed by deleting them, a view whose slot is filled
+    after the flush passed it is recorded by its writer.
+    """
+    # One flush at a time, the lock of a flush that died expires.
+    if not cache.add(VIEW_LOCK, 1, 60):
+        return 0
+
+    total = batches = 0
+    try:
+        while limit is None or batches < limit:
+            start = cache.get(VIEW_FLUSHED, 0)
+            end = min(cache.get(VIEW_COUNT, 0), start + batch_size)
+            if end <= start:
+                break
+
+            # Move the mark before reading, writers below the mark record their own view.
+            cache.set(VIEW_FLUSHED, end, None)
+            slots = cache.get_many([view_slot(num) for num in range(start + 1, end + 1)])
+            views = [view for key, view in slots.items() if cache.delete(key)]
+
+            if views:
+                record_views(views)
+
+            total += len(views)
+            batches += 1
+    finally:
+        cache.delete(VIEW_LOCK)
+
+    logger.debug(f"flushed {total} post views")
+
+    return total
+
+
+def buffer_post_view(post_id, ip):
+    """
+    Keeps a view in the cache until a flush records it.
+    """
+    cache.add(VIEW_COUNT, 0, None)
+    num = cache.incr(VIEW_COUNT)
+    cache.set(view_slot(num), (post_id, ip), None)
+
+    # The flush passed the slot before it was filled.
+    flushed = cache.get(VIEW_FLUSHED, 0)
+    if num <= flushed:
+        if cache.delete(view_slot(num)):
+            record_views([(post_id, ip)])
+        return
+
+    # Serving views flushes one batch once enough views wait, or once per interval.
+    # The tasks command flushes the idle periods.
+    full = num - flushed >= settings.POST_VIEW_FLUSH_SIZE
+    if full or cache.add(VIEW_FLUSH, 1, settings.POST_VIEW_FLUSH_SECONDS):
+        flush_post_views(batch_size=settings.POST_VIEW_FLUSH_SIZE, limit=1)
+
+
 def update_post_views(post, request, timeout=settings.POST_VIEW_TIMEOUT):
     """
     Views are updated per interval.
@@ -442,11 +529,15 @@ def update_post_views(post, request, timeout=settings.POST_VIEW_TIMEOUT):
     if cache.get(cache_key):
         return
 
-    # Insert a new view into database.
-    PostView.objects.create(ip=ip, post=post)
+    if settings.POST_VIEW_BUFFER:
+        # The view counts are updated in batches.
+        buffer_post_view(post_id=post.id, ip=ip)
+    else:
+        # Insert a new view into database.
+        PostView.objects.create(ip=ip, post=post)
 
-    # Separately increment post view.
-    Post.objects.filter(id=post.id).update(view_count=F('view_count') + 1)
+        # Separately increment post view.
+        Post.objects.filter(id=post.id).update(view_count=F('view_count') + 1)
 
     # Set the cache.
     cache.set(cache_key, 1, timeout)
@@ -676,3 +767,48 @@ class Log(models.Model):
         self.date = self.date or util.now()
         super(Log, self).save(*args, **kwargs)
 
+
+
+class UserCounters(models.Model):
+    """
+    Counts shown in the menu, kept up to date as the events happen.
+    """
+    user = models.OneToOneField(User, related_name="counters", on_delete=models.CASCADE)
+
+    # Unread messages.
+    message_count = models.IntegerField(default=0)
+
+    # Votes received since the counters were last read.
+    vote_count = models.IntegerField(default=0)
+
+    # The site wide totals when the counters were last read.
+    spam_seen = models.IntegerField(default=0)
+    mod_seen = models.IntegerField(default=0)
+    planet_seen = models.IntegerField(default=0)
+
+    # Date the counters were last read.
+    date = models.DateTimeField()
+
+    def save(self, *args, **kwargs):
+        self.date = self.date or util.now()
+        super(UserCounters, self).save(*args, **kwargs)
+
+
+class DailyStats(models.Model):
+    """
+    Site totals at the end of each day.
+    """
+    date = models.DateField(unique=True)
+
+    questions = models.IntegerField(default=0)
+    answers = models.IntegerField(default=0)
+    toplevel = models.IntegerField(default=0)
+    comments = models.IntegerField(default=0)
+    votes = models.IntegerField(default=0)
+    users = models.IntegerField(default=0)
+
+    # The names of the counts.
+    FIELDS = ['questions', 'answers', 'toplevel', 'comments', 'votes', 'users']
+
+    def counts(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
@@ -1,6 +1,8 @@
 import logging
 import os
+import threading
 import time
+from contextlib import contextmanager
 from itertools import count, islice
 from collections import defaultdict
 
@@ -197,20 +199,109 @@ def crawl(reindex=False, overwrite=False, limit=1000):
     return
 
 
-def whoosh_search(query, limit=10, page=1, ix=None, fields=None, reverse=False, sortedby=[], **kwargs):
+class SearcherPool(object):
+    """
+    Keeps searchers open between queries.
+
+    Each searcher is used by one thread at a time, idle searchers are
+    refreshed only when the index generation has changed.
+    """
+
+    def __init__(self, size=32):
+        self.size = size
+        self.lock = threading.Lock()
+        self.indices = {}
+        self.idle = defaultdict(list)
+
+    def index(self, dirname=None, indexname=None):
+        """
+        Returns the open index for the directory.
+        """
+        dirname = dirname or settings.INDEX_DIR
+        indexname = indexname or settings.INDEX_NAME
+        key = (dirname, indexname)
+
+        with self.lock:
+            if key not in self.indices:
+                self.indices[key] = init_index(dirname=dirname, indexname=indexname)
+            return self.indices[key]
+
+    def acquire(self, ix):
+        key = (ix.storage.folder, ix.indexname)
+        with self.lock:
+            idle = self.idle[key]
+            searcher = idle.pop() if idle else None
+
+        if searcher is None:
+            return ix.searcher()
+
+        # Returns the same searcher when the generation has not changed.
+        return searcher.refresh()
+
+    def release(self, ix, searcher):
+        key = (ix.storage.folder, ix.indexname)
+        with self.lock:
+            idle = self.idle[key]
+            if len(idle) < self.size:
+                idle.append(searcher)
+                return
+
+        searcher.close()
+
+    def clear(self):
+        """
+        Closes all idle searchers and forgets the open indices.
+        """
+        with self.lock:
+            for idle in self.idle.values():
+                for searcher in idle:
+                    searcher.close()
+            self.idle.clear()
+            self.indices.clear()
+
+
+POOL = SearcherPool()
+
+
+@contextmanager
+def open_searcher(ix=None):
+    """
+    Yields a searcher from the pool or a new searcher when pooling is turned off.
+    """
+
+    if not settings.SEARCHER_POOL:
+        ix = ix or init_index()
+        searcher = ix.searcher()
+        try:
+            yield searcher
+        finally:
+            searcher.close()
+        return
+
+    ix = ix or POOL.index()
+    searcher = POOL.acquire(ix)
+    try:
+        yield searcher
+    finally:
+        POOL.release(ix, searcher)
+
+
+def whoosh_search(query, limit=10, page=1, ix=None, fields=None, reverse=False, sortedby=[], searcher=None,
+                  **kwargs):
     """
     Query search index
     """
 
     fields = fields or ['tags', 'title', 'content', 'author']
-    ix = ix or init_index()
-    searcher = ix.searcher()
+    if searcher is None:
+        ix = ix or init_index()
+        searcher = ix.searcher()
 
     # Splits the query into words and applies
     # and OR filter, eg. 'foo bar' == 'foo OR bar'
     orgroup = OrGroup
 
-    parser = MultifieldParser(fieldnames=fields, schema=ix.schema, group=orgroup).parse(query)
+    parser = MultifieldParser(fieldnames=fields, schema=searcher.schema, group=orgroup).parse(query)
 
     hits = searcher.search_page(parser,pagenum=page, pagelen=limit, reverse=reverse, sortedby=sortedby, **kwargs)
     hits.results.fragmenter.maxchars = 100
@@ -226,14 +317,14 @@ def perform_search(query, page=1, fields=None, reverse=False, sortedby=[], limit
 
     limit = limit or settings.SEARCH_LIMIT
 
-    indexed = whoosh_search(query=query, fields=fields, page=page, reverse=reverse, sortedby=sortedby, limit=limit)
+    with open_searcher() as searcher:
+        indexed = whoosh_search(query=query, fields=fields, page=page, reverse=reverse, sortedby=sortedby,
+                                limit=limit, searcher=searcher)
 
-    # Highlight the whoosh results.
-    copier = lambda r: copy_hits(r, highlight=True)
+        # Highlight the whoosh results.
+        copier = lambda r: copy_hits(r, highlight=True)
 
-    final = list(map(copier, indexed))
-
-    indexed.results.searcher.close()
+        final = list(map(copier, indexed))
 
     return final, indexed
 
@@ -245,16 +336,16 @@ def more_like_this(uid, top=0, sortedby=[]):
 
     top = top or settings.SIMILAR_FEED_COUNT
     fields = ['uid']
-    found = whoosh_search(query=uid, sortedby=sortedby, fields=fields)
 
-    if len(found):
-        hits = found[0].more_like_this("content", top=top)
-        # Copy hits to list and close searcher object.
-        final = list(map(copy_hits, hits))
-    else:
-        final = []
+    with open_searcher() as searcher:
+        found = whoosh_search(query=uid, sortedby=sortedby, fields=fields, searcher=searcher)
 
-    found.results.searcher.close()
+        if len(found):
+            hits = found[0].more_like_this("content", top=top)
+            # Copy hits to list.
+            final = list(map(copy_hits, hits))
+        else:
+            final = []
 
     return final
 
@@ -272,3 +363,132 @@ def remove_post(post, ix=None):
     writer.commit()
     logger.debug(f"Removing uid={post.uid} from index")
     return
+
+
+def queue_dir():
+    """
+    Directory holding the posts flagged for indexing.
+    """
+    return os.path.join(settings.INDEX_DIR, "queue")
+
+
+def enqueue(post):
+    """
+    Flags a post for the indexer.
+
+    Every flag is a separate empty file named 'timestamp.pid.post_id',
+    sorting the names gives the order in which the posts were flagged.
+    """
+    path = queue_dir()
+    os.makedirs(path, exist_ok=True)
+    fname = os.path.join(path, f"{time.time_ns()}.{os.getpid()}.{post.pk}")
+    open(fname, 'w').close()
+
+
+def pending(limit=None):
+    """
+    Returns the oldest flags in the queue as a list of (file name, post id) tuples.
+    """
+    path = queue_dir()
+    if not os.path.isdir(path):
+        return []
+
+    names = sorted(os.listdir(path))[:limit]
+    entries = [(name, int(name.split('.')[-1])) for name in names]
+
+    return entries
+
+
+def index_batch(entries, ix=None):
+    """
+    Adds, updates or removes the flagged posts with a single commit.
+    """
+
+    ix = ix or init_index()
+    ids = {pk for name, pk in entries}
+
+    posts = Post.objects.filter(id__in=ids).select_related('author__profile')
+
+    # Only valid top level posts go into the index.
+    valid = Post.objects.valid_posts(id__in=ids, is_toplevel=True).values_list('id', flat=True)
+    valid = set(valid)
+
+    writer = AsyncWriter(ix)
+    done = []
+    for post in posts:
+        if post.id in valid:
+            add_index(post=post, writer=writer)
+            done.append(post.id)
+        else:
+            # Spam, deleted and closed posts leave the index.
+            writer.delete_by_term('uid', text=post.uid)
+            done.append(post.id)
+
+    writer.commit()
+
+    # Set the indexed field to true.
+    Post.objects.filter(id__in=done).update(indexed=True)
+
+    # Flags are removed only once the commit went through.
+    path = queue_dir()
+    for name, pk in entries:
+        os.remove(os.path.join(path, name))
+
+    logger.debug(f"Indexed {len(done)} posts from {len(entries)} flags")
+
+    return len(entries)
+
+
+def drain_queue(size=None, ix=None):
+    """
+    Indexes every flagged post, used when the indexer does not run.
+    Returns the number of flags processed.
+    """
+    total = 0
+    while True:
+        count = flush_queue(size=size, latency=0, ix=ix)
+        if not count:
+            return total
+        total += count
+
+
+def flush_queue(size=None, latency=None, ix=None):
+    """
+    Indexes a batch of flagged posts when enough of them are waiting
+    or the oldest flag is older than the latency (in seconds).
+
+    Returns the number of flags processed.
+    """
+
+    size = size or settings.BATCH_INDEXING_SIZE
+    latency = settings.INDEX_FLUSH_LATENCY if latency is None else latency
+
+    entries = pending(limit=size)
+    if not entries:
+        return 0
+
+    oldest = int(entries[0][0].split('.')[0]) / 10 ** 9
+    if len(entries) < size and time.time() - oldest < latency:
+        return 0
+
+    return index_batch(entries=entries, ix=ix)
+
+
+def run_indexer(size=None, latency=None, poll=0.5):
+    """
+    Long running process that keeps the search index in sync with the queue.
+    """
+
+    ix = init_index()
+    logger.info(f"Indexer started on {queue_dir()}")
+
+    while True:
+        try:
+            count = flush_queue(size=size, latency=latency, ix=ix)
+        except Exception as exc:
+            logger.error(f'Error updating index: {exc}')
+            count = 0
+
+        # Keep going while the queue has a backlog.
+        if not count:
+            time.sleep(poll)
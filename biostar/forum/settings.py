@@ -23,6 +23,9 @@ AWARDS_PER_PAGE = 50
 
 STATS_DIR = os.path.join(BASE_DIR, "export", "stats")
 
+# Longest date range (days) served by the statistics api.
+STATS_RANGE_DAYS = 366
+
 
 # Enable image upload
 PAGEDOWN_IMAGE_UPLOAD_ENABLED = True
@@ -59,12 +62,24 @@ SEARCH_LIMIT = 50
 # Initialize the planet app.
 INIT_PLANET = False
 
+# How many rendered posts to keep in memory, 0 turns off the cache.
+MARKDOWN_CACHE_SIZE = 1000
+
+# Seconds a rendered post is kept, edited titles and user names show after this.
+MARKDOWN_CACHE_TTL = 300
+
+# Reuse open searchers between queries.
+SEARCHER_POOL = True
+
 # Minimum amount of characters to preform searches
 SEARCH_CHAR_MIN = 1
 
 # How many posts to index in one job.
 BATCH_INDEXING_SIZE = 1000
 
+# Longest time (seconds) a flagged post waits for the indexer.
+INDEX_FLUSH_LATENCY = 10
+
 # Add another context processor to first template.
 TEMPLATES[0]['OPTIONS']['context_processors'] += [
     'biostar.forum.context.forum'
@@ -99,6 +114,12 @@ INDEX_DIR = join(MEDIA_ROOT, '..', INDEX_DIR)
 SPAM_DATA  = join(BASE_DIR, "export", "spam.data.tar.gz")
 SPAM_MODEL = join(BASE_DIR, "export", "spam.model")
 
+# Records the last post checked by the spam action of the tasks command.
+SPAM_CHECKED = join(BASE_DIR, "export", "spam.checked")
+
+# Records the last user that received the digest, used to resume an interrupted digest.
+DIGEST_CHECKPOINT = join(BASE_DIR, "export", "digest.json")
+
 SOCIALACCOUNT_EMAIL_VERIFICATION = None
 SOCIALACCOUNT_EMAIL_REQUIRED = False
 SOCIALACCOUNT_QUERY_EMAIL = True
@@ -148,6 +169,17 @@ WSGI_APPLICATION = 'biostar.wsgi.application'
 # Time between two accesses from the same IP to qualify as a different view (seconds)
 POST_VIEW_TIMEOUT = 300
 
+# Record post views and add them to the view counts in batches.
+POST_VIEW_BUFFER = True
+
+# Time between two view count updates made while serving views (seconds).
+# Run the views action of the tasks command to update the counts when the site is idle,
+# the views are kept in the cache, a cache shared by the processes is needed for that.
+POST_VIEW_FLUSH_SECONDS = 60
+
+# Number of buffered views that triggers an update, and the views recorded in one update.
+POST_VIEW_FLUSH_SIZE = 100
+
 # This flag is used flag situation where a data migration is in progress.
 # Allows us to turn off certain type of actions (for example sending emails).
 DATA_MIGRATION = False
@@ -158,6 +190,8 @@ CACHES = {
         #'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'unique-snowflake',
+        # Keeps the buffered post views from being culled.
+        'OPTIONS': {'MAX_ENTRIES': 10000},
     }
 }
 
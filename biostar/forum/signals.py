@@ -4,8 +4,9 @@ from django.dispatch import receiver
 from taggit.models import Tag
 from django.db.models import F, Q
 from biostar.accounts.models import Profile, Message, User
-from biostar.forum.models import Post, Award, Subscription, SharedLink
-from biostar.forum import tasks, auth, util
+from biostar.accounts.signals import messages_created
+from biostar.forum.models import Post, Award, Subscription, SharedLink, Vote, UserCounters
+from biostar.forum import tasks, auth, util, search
 
 
 logger = logging.getLogger("engine")
@@ -152,6 +153,10 @@ def finalize_post(sender, instance, created, **kwargs):
     # Ensure posts get re-indexed after being edited.
     Post.objects.filter(uid=instance.uid).update(indexed=False)
 
+    # Only top level posts go into the index.
+    if instance.is_toplevel:
+        search.enqueue(instance)
+
     # Exclude current authors from receiving messages from themselves
     subs = subs.exclude(Q(type=Subscription.NO_MESSAGES) | Q(user=instance.author))
 
@@ -173,4 +178,31 @@ def check_spam(sender, instance, created, **kwargs):
 def link_title(sender, instance, created, **kwargs):
     # Set the title of each link upon creation
     if created:
-        tasks.set_link_title.spool(pk=instance.pk)
\ No newline at end of file
+        tasks.set_link_title.spool(pk=instance.pk)
+
+
+@receiver(post_save, sender=Vote)
+def count_vote(sender, instance, created, **kwargs):
+    """
+    Count the vote for the author of the post.
+    """
+    if created and instance.author_id != instance.post.author_id:
+        UserCounters.objects.filter(user_id=instance.post.author_id).update(vote_count=F('vote_count') + 1)
+
+
+@receiver(post_save, sender=Message)
+def count_message(sender, instance, created, **kwargs):
+    """
+    Count the unread message for the recipient.
+    """
+    if created and instance.unread:
+        UserCounters.objects.filter(user_id=instance.recipient_id).update(message_count=F('message_count') + 1)
+
+
+@receiver(messages_created, sender=Message)
+def count_messages(sender, user_ids, **kwargs):
+    """
+    Count the unread messages created in bulk.
+    """
+    UserCounters.objects.filter(user_id__in=user_ids).update(message_count=F('message_count') + 1)
+
@@ -144,29 +144,17 @@ def create_user_awards(user_id, limit=None):
 
 def batch_create_awards(limit=100):
     from biostar.accounts.models import User
-    from biostar.forum import auth, models, util
+    from biostar.forum import auth, models
 
     # Randomly order awards
-    users = User.objects.order_by('?')[:limit]
+    ids = list(User.objects.order_by('?').values_list('id', flat=True)[:limit])
+    users = User.objects.filter(id__in=ids)
 
-    # Aggregate target awards into flat list
-    targets = []
-    for u in users:
-        valid = auth.valid_awards(user=u)
-        targets.extend(valid)
+    # Find the awards for all users at once.
+    awards = auth.batch_awards(users=users)
 
-    def batch():
-        for target in targets:
-            if not target:
-                continue
-            user, badge, date, post = target
-            award = models.Award(user=user, badge=badge, date=date, post=post)
-            logger.debug(f"awarded {award.badge.name} to {user}")
-
-            yield award
-
-    models.Award.objects.bulk_create(objs=batch(), batch_size=limit)
-    logger.info(f"{len(targets)} awards given to {len(users)} users")
+    models.Award.objects.bulk_create(objs=awards, batch_size=limit)
+    logger.info(f"{len(awards)} awards given to {len(ids)} users")
 
 
 def high_trust(user, minscore=50):
@@ -213,21 +201,73 @@ def set_link_title(pk):
         logger.warning(exc)
 
 
-@task
-def spam_check(uid):
-    from biostar.forum.models import Post, Log, delete_post_cache
+def needs_spam_check(post):
+    """
+    Returns True if the post should be classified.
+    """
+    from biostar.forum.models import Post
+
+    # Automated spam disabled in for trusted user
+    if post.author.profile.trusted or post.author.profile.score > 50:
+        return False
+
+    # Classify spam only if we have not done it yet.
+    if post.spam != Post.DEFAULT:
+        return False
+
+    return True
+
+
+def handle_spam(post, flag):
+    """
+    Marks the post as spam when flagged, suspends repeated low trust spammers.
+    """
+    from biostar.forum.models import Post, Log
     from biostar.accounts.models import User, Profile
     from biostar.forum.auth import db_logger
 
-    post = Post.objects.filter(uid=uid).first()
     author = post.author
 
-    # Automated spam disabled in for trusted user
-    if author.profile.trusted or author.profile.score > 50:
+    # Another process may have already classified it as spam.
+    check = Post.objects.filter(uid=post.uid).first()
+    if check and check.spam == Post.SPAM:
         return
 
-    # Classify spam only if we have not done it yet.
-    if post.spam != Post.DEFAULT:
+    ## Links in title usually mean spam.
+    spam_words = ["http://", "https://"]
+    for word in spam_words:
+        flag = flag or (word in post.title)
+
+    # Handle the spam.
+    if flag:
+
+        Post.objects.filter(uid=post.uid).update(spam=Post.SPAM, status=Post.CLOSED)
+
+        # Get the first admin.
+        user = User.objects.filter(is_superuser=True).order_by("pk").first()
+
+        create_messages(template="messages/spam-detected.md",
+                        extra_context=dict(post=post),
+                        user_ids=[post.author.id])
+
+        spam_count = Post.objects.filter(spam=Post.SPAM, author=author).count()
+
+        db_logger(user=user, action=Log.CLASSIFY, target=post.author, text=f"classified the post as spam",
+                  post=post)
+
+        if spam_count > 1 and low_trust(post.author):
+            # Suspend the user
+            Profile.objects.filter(user=author).update(state=Profile.SUSPENDED)
+            db_logger(user=user, action=Log.MODERATE, text=f"suspended", target=post.author)
+
+
+@task
+def spam_check(uid):
+    from biostar.forum.models import Post, delete_post_cache
+
+    post = Post.objects.filter(uid=uid).first()
+
+    if not needs_spam_check(post):
         return
 
     # Drop the cache for the post.
@@ -246,40 +286,45 @@ def spam_check(uid):
         # Classify the content.
         flag = spamlib.classify_content(post.content, model=settings.SPAM_MODEL)
 
-        # Another process may have already classified it as spam.
-        check = Post.objects.filter(uid=post.uid).first()
-        if check and check.spam == Post.SPAM:
-            return
+        handle_spam(post=post, flag=flag)
+
+    except Exception as exc:
+        print(exc)
+        logger.error(exc)
 
-        ## Links in title usually mean spam.
-        spam_words = ["http://", "https://"]
-        for word in spam_words:
-            flag = flag or (word in post.title)
+    return False
 
-        # Handle the spam.
-        if flag:
 
-            Post.objects.filter(uid=post.uid).update(spam=Post.SPAM, status=Post.CLOSED)
+@task
+def spam_check_batch(uids):
+    """
+    Classifies many posts at once, the contents are vectorized together.
+    """
+    from biostar.forum.models import Post, delete_post_cache
 
-            # Get the first admin.
-            user = User.objects.filter(is_superuser=True).order_by("pk").first()
+    posts = Post.objects.filter(uid__in=uids).select_related("author", "author__profile")
+    posts = [post for post in posts if needs_spam_check(post)]
 
-            create_messages(template="messages/spam-detected.md",
-                            extra_context=dict(post=post),
-                            user_ids=[post.author.id])
+    # Drop the cache for the posts.
+    for post in posts:
+        delete_post_cache(post)
 
-            spam_count = Post.objects.filter(spam=Post.SPAM, author=author).count()
+    try:
+        from biostar.utils import spamlib
 
-            db_logger(user=user, action=Log.CLASSIFY, target=post.author, text=f"classified the post as spam",
-                      post=post)
+        if not os.path.isfile(settings.SPAM_MODEL):
+            spamlib.build_model(fname=settings.SPAM_DATA, model=settings.SPAM_MODEL)
+
+        # Short posts do not get classified too many false positives
+        posts = [post for post in posts if len(post.content) >= 150]
+
+        # Classify the contents.
+        flags = spamlib.classify_batch([post.content for post in posts], model=settings.SPAM_MODEL)
 
-            if spam_count > 1 and low_trust(post.author):
-                # Suspend the user
-                Profile.objects.filter(user=author).update(state=Profile.SUSPENDED)
-                db_logger(user=user, action=Log.MODERATE, text=f"suspended", target=post.author)
+        for post, flag in zip(posts, flags):
+            handle_spam(post=post, flag=flag)
 
     except Exception as exc:
-        print(exc)
         logger.error(exc)
 
     return False
@@ -23,7 +23,7 @@ from biostar.accounts.models import Profile, Message
 from biostar.forum import const, auth
 from biostar.utils import helpers
 from biostar.forum import markdown
-from biostar.forum.models import Post, Vote, Award, Subscription, Badge
+from biostar.forum.models import Post, Vote, Award, Subscription, Badge, UserCounters
 
 User = get_user_model()
 
@@ -245,6 +245,7 @@ def unread(message, user):
 @register.simple_tag
 def toggle_unread(user):
     Message.objects.filter(recipient=user, unread=True).update(unread=False)
+    UserCounters.objects.filter(user=user).update(message_count=0)
     return ''
 
 
@@ -282,8 +283,11 @@ def follow_label(context, post):
     if user.is_anonymous:
         return not_following
 
-    # Get the current subscription
-    sub = Subscription.objects.filter(post=post.root, user=user).first()
+    # Get the current subscription, post_tree has already looked it up.
+    if hasattr(post, 'user_sub'):
+        sub = post.user_sub
+    else:
+        sub = Subscription.objects.filter(post=post.root, user=user).first()
     sub = sub or Subscription(post=post, user=user, type=Subscription.NO_MESSAGES)
 
     label = label_map.get(sub.type, not_following)
@@ -743,26 +747,23 @@ def traverse_comments(request, post, tree, template_name):
     "Traverses the tree and generates the page"
 
     body = template.loader.get_template(template_name)
-    seen = set()
 
-    def traverse(node, collect=[]):
+    # this collects the comments for the post
+    collect = ['<div class="comment-list">']
+
+    # Number of comments with open indent blocks.
+    opened = 0
+    for depth, node in auth.walk_comments(tree=tree, post=post):
+
+        # Close the blocks of the comments that are not parents of this one.
+        collect.extend(["</div>"] * (opened - depth + 1))
+        opened = depth
 
         cont = {"post": node, 'user': request.user, 'request': request}
         html = body.render(cont)
         collect.append(f'<div class="indent" ><div>{html}</div>')
 
-        for child in tree.get(node.id, []):
-            if child in seen:
-                raise Exception(f"circular tree {child.pk} {child.title}")
-            seen.add(child)
-            traverse(child, collect=collect)
-
-        collect.append(f"</div>")
-
-    # this collects the comments for the post
-    collect = ['<div class="comment-list">']
-    for node in tree[post.id]:
-        traverse(node, collect=collect)
+    collect.extend(["</div>"] * opened)
     collect.append("</div>")
     html = '\n'.join(collect)
 
@@ -0,0 +1,88 @@
+"""
+Benchmarks finding the awards one user at a time against the batch awards.
+
+    python manage.py test biostar.forum.tests.bench_awards --settings biostar.server.test_settings
+
+Set BENCH_USERS to change the number of synthetic users (default 10000),
+the per user path takes several minutes at the default size.
+"""
+import logging
+import os
+import random
+import time
+
+from django.db import connection
+from django.test import TestCase
+
+from biostar.accounts.models import User, Profile
+from biostar.forum import models, auth, util
+
+logger = logging.getLogger('engine')
+
+BENCH_USERS = int(os.environ.get("BENCH_USERS", 10000))
+
+
+def make_users(total):
+    """
+    Inserts synthetic users with profiles and a few posts each, without triggering the signals.
+    """
+    rand = random.Random(1)
+    now = util.now()
+    start = User.objects.order_by('-id').values_list('id', flat=True).first() + 1
+    ids = range(start, start + total)
+
+    User.objects.bulk_create((User(id=idx, username=f"bench{idx}", email=f"bench{idx}@bench.com") for idx in ids),
+                             batch_size=1000)
+
+    profiles = (Profile(user_id=idx, uid=f"bench{idx}", name=f"Bench {idx}", last_login=now, date_joined=now,
+                        text="Bio" * rand.choice([1, 50]), score=rand.randint(0, 5)) for idx in ids)
+    Profile.objects.bulk_create(profiles, batch_size=1000)
+
+    types = [models.Post.QUESTION, models.Post.ANSWER, models.Post.COMMENT]
+    posts = (models.Post(title=f"Post {idx}", content="Bench", html="Bench", type=rand.choice(types),
+                         author_id=idx, lastedit_user_id=idx, uid=f"b{idx}-{k}", vote_count=rand.randint(0, 12),
+                         view_count=rand.choice([0, 2000]), creation_date=now, lastedit_date=now)
+             for idx in ids for k in range(rand.randint(0, 3)))
+    models.Post.objects.bulk_create(posts, batch_size=1000)
+
+    return User.objects.filter(id__in=ids)
+
+
+class QueryCounter:
+    """
+    Counts the queries, the captured queries of the test runner stop at 9000.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class AwardBench(TestCase):
+
+    def setUp(self):
+        logger.setLevel(logging.WARNING)
+        self.users = make_users(total=BENCH_USERS)
+
+    def test_award_rate(self):
+
+        single, batch = QueryCounter(), QueryCounter()
+
+        with connection.execute_wrapper(single):
+            start = time.time()
+            found = [target for user in self.users for target in auth.valid_awards(user=user)]
+            single_secs = time.time() - start
+
+        with connection.execute_wrapper(batch):
+            start = time.time()
+            awards = auth.batch_awards(users=self.users)
+            models.Award.objects.bulk_create(awards, batch_size=1000)
+            batch_secs = time.time() - start
+
+        print()
+        print(f"users: {BENCH_USERS}")
+        print(f"per user: {len(found)} awards, {single_secs:.2f}s, {single.count} queries")
+        print(f"batch: {len(awards)} awards, {batch_secs:.2f}s, {batch.count} queries")
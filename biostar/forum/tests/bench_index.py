@@ -0,0 +1,91 @@
+"""
+Benchmarks the queue driven indexer against the cron driven index command.
+
+    python manage.py test biostar.forum.tests.bench_index --settings biostar.server.test_settings
+
+Set BENCH_POSTS to change the number of synthetic posts (default 100000).
+"""
+import logging
+import os
+import shutil
+import time
+
+from django.conf import settings
+from django.db.models import F
+from django.test import TestCase
+
+from biostar.accounts.models import User
+from biostar.forum import models, search, util
+from biostar.forum.management.commands import index
+
+logger = logging.getLogger('engine')
+
+BENCH_POSTS = int(os.environ.get("BENCH_POSTS", 100000))
+
+# The cron job runs the index command every 5 minutes.
+CRON_SECONDS = 300
+
+WORDS = "sequence alignment genome reads variant expression quality coverage samtools bowtie".split()
+
+
+def make_posts(author, total):
+    """
+    Inserts synthetic top level posts without triggering the signals.
+    """
+    now = util.now()
+
+    def post(i):
+        words = " ".join(WORDS[(i + k) % len(WORDS)] for k in range(30))
+        return models.Post(title=f"Post {i} {WORDS[i % len(WORDS)]}", content=words, html=words,
+                           type=models.Post.QUESTION, is_toplevel=True, author=author, lastedit_user=author,
+                           tag_val="tag1,tag2", uid=f"b{i}", creation_date=now, lastedit_date=now)
+
+    models.Post.objects.bulk_create((post(i) for i in range(total)), batch_size=1000)
+    models.Post.objects.update(root_id=F('id'), parent_id=F('id'))
+
+
+class IndexBench(TestCase):
+
+    def setUp(self):
+        logger.setLevel(logging.WARNING)
+        self.author = User.objects.create(username="bench", email="bench@bench.com")
+        make_posts(author=self.author, total=BENCH_POSTS)
+        shutil.rmtree(settings.INDEX_DIR, ignore_errors=True)
+
+    def test_index_lag(self):
+        posts = models.Post.objects.filter(type=models.Post.QUESTION).only('id')
+
+        # The cron driven command indexes every post not yet indexed.
+        start = time.time()
+        index.build(size=BENCH_POSTS)
+        cron_secs = time.time() - start
+        shutil.rmtree(settings.INDEX_DIR, ignore_errors=True)
+
+        # The indexer consumes the flags in batches.
+        models.Post.objects.update(indexed=False)
+        for post in posts:
+            search.enqueue(post)
+
+        start = time.time()
+        while search.flush_queue(latency=0):
+            pass
+        daemon_secs = time.time() - start
+
+        # Time for a single edit to become searchable.
+        latency = settings.INDEX_FLUSH_LATENCY
+        search.enqueue(posts.first())
+        start = time.time()
+        while not search.flush_queue(latency=latency):
+            time.sleep(0.1)
+        daemon_lag = time.time() - start
+
+        # A cron edit waits on average half a cycle and then for the whole run.
+        cron_lag = CRON_SECONDS / 2 + cron_secs
+
+        print()
+        print(f"posts: {BENCH_POSTS}")
+        print(f"cron:    {BENCH_POSTS / cron_secs:.0f} posts/s, mean index lag {cron_lag:.1f}s")
+        print(f"indexer: {BENCH_POSTS / daemon_secs:.0f} posts/s, index lag {daemon_lag:.1f}s "
+              f"(latency={latency}s, batch={settings.BATCH_INDEXING_SIZE})")
+
+        self.assertFalse(search.pending())
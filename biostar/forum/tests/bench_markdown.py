@@ -0,0 +1,88 @@
+"""
+Benchmarks rendering posts with markdown.parse.
+
+    python manage.py test biostar.forum.tests.bench_markdown --settings biostar.server.test_settings
+
+Set BENCH_POSTS to change the size of the corpus (default 1000),
+corpora larger than MARKDOWN_CACHE_SIZE will not fit into the html cache.
+"""
+import logging
+import os
+import random
+import time
+
+import bleach
+import mistune
+from bleach.callbacks import nofollow
+from functools import partial
+from django.test import TestCase
+
+from biostar.accounts.models import User
+from biostar.forum import markdown, models
+
+logger = logging.getLogger('engine')
+
+BENCH_POSTS = int(os.environ.get("BENCH_POSTS", 1000))
+
+PARAGRAPHS = [
+    "I am trying to align **paired end** reads to the hg38 genome with `bwa mem` but the "
+    "mapping rate is below 50%. Has anyone seen this before?",
+    "See the manual at http://bio-bwa.sourceforge.net/bwa.shtml and the discussion "
+    "in http://www.biostars.org/p/1/ for details.",
+    "```\nbwa mem -t 8 ref.fa R1.fq.gz R2.fq.gz | samtools sort -o out.bam\nsamtools index out.bam\n```",
+    "* check the adapter content with FastQC\n* trim with cutadapt\n* run the alignment again",
+    "Thanks @bench, that solved it. The reads were from *mouse* not human.",
+    "| sample | reads | mapped |\n|---|---|---|\n| A | 1000 | 950 |\n| B | 2000 | 1890 |",
+    "> Quoting the documentation: the -M option marks shorter split hits as secondary.",
+]
+
+
+def make_corpus(total):
+    rand = random.Random(1)
+    return ["\n\n".join(rand.sample(PARAGRAPHS, k=4)) + f"\n\nPost number {i}" for i in range(total)]
+
+
+def parse_uncached(text):
+    """
+    Renders the text building a new parser, cleaner and linker on every call.
+    """
+    renderer = markdown.BiostarRenderer(escape=False)
+    inline = markdown.BiostarInlineLexer(renderer=renderer)
+    output = mistune.Markdown(hard_wrap=True, renderer=renderer, inline=inline)(text=text)
+    output = bleach.clean(text=output, tags=markdown.ALLOWED_TAGS, styles=markdown.ALLOWED_STYLES,
+                          attributes=markdown.ALLOWED_ATTRIBUTES, protocols=markdown.ALLOWED_PROTOCOLS)
+    return bleach.linkify(text=output, callbacks=[partial(markdown.embedder, embed=[]), nofollow],
+                          skip_tags=['pre', 'code'])
+
+
+def rate(func, corpus):
+    start = time.time()
+    for text in corpus:
+        func(text)
+    return len(corpus) / (time.time() - start)
+
+
+class MarkdownBench(TestCase):
+
+    def setUp(self):
+        logger.setLevel(logging.WARNING)
+        user = User.objects.create(username="bench", email="bench@bench.com")
+        user.profile.handle = "bench"
+        user.profile.save()
+        self.corpus = make_corpus(BENCH_POSTS)
+
+    def test_parse_rate(self):
+        post = models.Post()
+        markdown.CACHE.clear()
+
+        before = rate(parse_uncached, self.corpus)
+        after = rate(lambda text: markdown.parse(text, clean=True, escape=False), self.corpus)
+        first = rate(lambda text: markdown.parse(text, post=post, clean=True, escape=False), self.corpus)
+        cached = rate(lambda text: markdown.parse(text, post=post, clean=True, escape=False), self.corpus)
+
+        print()
+        print(f"posts: {BENCH_POSTS}")
+        print(f"new parser per call: {before:.0f} posts/s")
+        print(f"thread local parser: {after:.0f} posts/s")
+        print(f"html cache, first save: {first:.0f} posts/s")
+        print(f"html cache, unchanged save: {cached:.0f} posts/s")
@@ -0,0 +1,70 @@
+"""
+Benchmarks perform_search latency with and without the searcher pool.
+
+    python manage.py test biostar.forum.tests.bench_search --settings biostar.server.test_settings
+
+Set BENCH_POSTS to change the size of the index (default 10000)
+and BENCH_QUERIES to change the number of queries per run (default 640).
+"""
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from biostar.accounts.models import User
+from biostar.forum import models, search
+from biostar.forum.tests.bench_index import make_posts, WORDS
+
+logger = logging.getLogger('engine')
+
+BENCH_POSTS = int(os.environ.get("BENCH_POSTS", 10000))
+BENCH_QUERIES = int(os.environ.get("BENCH_QUERIES", 640))
+
+THREADS = [1, 8, 32]
+
+
+def percentile(values, perc):
+    values = sorted(values)
+    idx = min(len(values) - 1, int(len(values) * perc / 100))
+    return values[idx]
+
+
+def run_queries(threads):
+    """
+    Returns the latency in milliseconds of every query.
+    """
+
+    def query(i):
+        start = time.time()
+        search.perform_search(query=WORDS[i % len(WORDS)])
+        return (time.time() - start) * 1000
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(query, range(BENCH_QUERIES)))
+
+
+class SearchBench(TestCase):
+
+    def setUp(self):
+        logger.setLevel(logging.WARNING)
+        shutil.rmtree(settings.INDEX_DIR, ignore_errors=True)
+        search.POOL.clear()
+
+        author = User.objects.create(username="bench", email="bench@bench.com")
+        make_posts(author=author, total=BENCH_POSTS)
+        search.index_posts(posts=models.Post.objects.all())
+
+    def test_search_latency(self):
+        print()
+        print(f"posts: {BENCH_POSTS}, queries: {BENCH_QUERIES}")
+
+        for pooled in (False, True):
+            with override_settings(SEARCHER_POOL=pooled):
+                for threads in THREADS:
+                    times = run_queries(threads=threads)
+                    print(f"pool={pooled!s:5} threads={threads:2}: p50={percentile(times, 50):.1f}ms "
+                          f"p99={percentile(times, 99):.1f}ms")
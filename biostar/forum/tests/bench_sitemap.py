@@ -0,0 +1,79 @@
+"""
+Benchmarks printing the sitemap batches against writing the compressed shards.
+
+    python manage.py test biostar.forum.tests.bench_sitemap --settings biostar.server.test_settings
+
+Set BENCH_POSTS to change the number of synthetic posts (default 1000000).
+The rss is the high water mark of the process, it includes creating the posts.
+"""
+import contextlib
+import logging
+import os
+import resource
+import shutil
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.test import TestCase
+
+from biostar.accounts.models import User
+from biostar.forum import models, util
+from biostar.forum.management.commands import sitemap
+from biostar.forum.tests.bench_index import make_posts
+
+logger = logging.getLogger('engine')
+
+BENCH_POSTS = int(os.environ.get("BENCH_POSTS", 1000000))
+
+TARGET = os.path.join(settings.BASE_DIR, 'export', 'tested', 'bench-sitemap')
+
+
+def measure(func):
+    """
+    Returns the wall time and the peak of the python allocations while running the function.
+    """
+    tracemalloc.start()
+    start = time.time()
+    func()
+    secs = time.time() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return secs, peak / 1024 / 1024
+
+
+def max_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class SitemapBench(TestCase):
+
+    def setUp(self):
+        logger.setLevel(logging.WARNING)
+        self.author = User.objects.create(username="bench", email="bench@bench.com")
+        make_posts(author=self.author, total=BENCH_POSTS)
+        shutil.rmtree(TARGET, ignore_errors=True)
+
+    def test_sitemap(self):
+        batches = BENCH_POSTS // sitemap.SHARD_SIZE + 1
+
+        def print_batches():
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                for batch in range(1, batches + 1):
+                    sitemap.generate_sitemap(index=0, batch=batch)
+
+        print()
+        print(f"posts: {BENCH_POSTS}, rss before: {max_rss():.0f}MB")
+
+        secs, peak = measure(print_batches)
+        print(f"printed batches: {secs:.1f}s, peak python memory {peak:.0f}MB, rss {max_rss():.0f}MB")
+
+        secs, peak = measure(lambda: sitemap.write_sitemap(target=TARGET))
+        print(f"all shards written: {secs:.1f}s, peak python memory {peak:.0f}MB, rss {max_rss():.0f}MB")
+
+        # Editing a few recent posts changes a single shard.
+        last = models.Post.objects.order_by('-pk').values_list('pk', flat=True)[:10]
+        models.Post.objects.filter(pk__in=list(last)).update(lastedit_date=util.now())
+
+        secs, peak = measure(lambda: sitemap.write_sitemap(target=TARGET))
+        print(f"changed shards written: {secs:.1f}s, peak python memory {peak:.0f}MB, rss {max_rss():.0f}MB")
@@ -0,0 +1,74 @@
+"""
+Benchmarks classifying posts as spam one by one and in batches.
+
+    python manage.py test biostar.forum.tests.bench_spam --settings biostar.server.test_settings
+
+Set BENCH_POSTS to change the number of posts (default 2000)
+and BENCH_BATCH to change the batch size (default 100).
+"""
+import logging
+import os
+import random
+import time
+
+from django.conf import settings
+from django.test import TestCase
+from joblib import dump
+
+from biostar.utils import spamlib
+
+logger = logging.getLogger('engine')
+
+BENCH_POSTS = int(os.environ.get("BENCH_POSTS", 2000))
+BENCH_BATCH = int(os.environ.get("BENCH_BATCH", 100))
+
+BENCH_MODEL = os.path.join(settings.BASE_DIR, 'export', 'tested', 'bench-spam.model')
+
+WORDS = ("sequence alignment genome reads variant expression quality coverage samtools bowtie "
+         "cheap pills casino winner free money click offer discount viagra loan").split()
+
+
+def make_texts(total, rand):
+    return [" ".join(rand.choices(WORDS, k=200)) for i in range(total)]
+
+
+def rate(func, texts):
+    start = time.time()
+    func(texts)
+    return len(texts) / (time.time() - start)
+
+
+class SpamBench(TestCase):
+
+    def setUp(self):
+        logger.setLevel(logging.WARNING)
+        rand = random.Random(1)
+        os.makedirs(os.path.dirname(BENCH_MODEL), exist_ok=True)
+
+        # Fit a model to labelled synthetic posts.
+        X = make_texts(1000, rand)
+        y = [int(text.count("free") > text.count("genome")) for text in X]
+        dump(spamlib.fit_model(X, y), BENCH_MODEL)
+
+        self.texts = make_texts(BENCH_POSTS, rand)
+        spamlib.MODELS.clear()
+
+    def test_classify_rate(self):
+
+        def load_each(texts):
+            for text in texts:
+                spamlib.load_model(BENCH_MODEL).predict([text])
+
+        def single(texts):
+            for text in texts:
+                spamlib.classify_content(text, model=BENCH_MODEL)
+
+        def batched(texts):
+            for idx in range(0, len(texts), BENCH_BATCH):
+                spamlib.classify_batch(texts[idx:idx + BENCH_BATCH], model=BENCH_MODEL)
+
+        print()
+        print(f"posts: {BENCH_POSTS}, batch: {BENCH_BATCH}")
+        print(f"model loaded on each call: {rate(load_each, self.texts):.0f} posts/s")
+        print(f"model loaded once, single: {rate(single, self.texts):.0f} posts/s")
+        print(f"model loaded once, batched: {rate(batched, self.texts):.0f} posts/s")
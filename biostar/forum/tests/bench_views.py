@@ -0,0 +1,85 @@
+"""
+Benchmarks counting post views from many threads, updating the view count
+on every view and buffering the views in the cache to add them in batches.
+
+    python manage.py test biostar.forum.tests.bench_views --settings biostar.server.test_settings
+
+Set BENCH_THREADS and BENCH_VIEWS to change the number of threads
+and views per thread (defaults 16 and 200).
+"""
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, OperationalError
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from biostar.accounts.models import User
+from biostar.forum import models
+from biostar.utils.helpers import fake_request
+
+logger = logging.getLogger('engine')
+
+BENCH_THREADS = int(os.environ.get("BENCH_THREADS", 16))
+BENCH_VIEWS = int(os.environ.get("BENCH_VIEWS", 200))
+
+
+def hammer(post, user, thread):
+    """
+    Views the post from a new IP each time, returns the number of lock errors.
+    """
+    url = reverse("post_view", kwargs=dict(uid=post.uid))
+    errors = 0
+    try:
+        for idx in range(BENCH_VIEWS):
+            meta = {settings.IP_HEADER_KEY: f"10.{thread}.{idx // 250}.{idx % 250}"}
+            request = fake_request(url=url, data={}, user=user, method="GET", rmeta=meta)
+            try:
+                models.update_post_views(post=post, request=request)
+            except OperationalError:
+                errors += 1
+    finally:
+        connection.close()
+
+    return errors
+
+
+@override_settings(POST_VIEW_FLUSH_SECONDS=1)
+class PostViewBench(TransactionTestCase):
+
+    def setUp(self):
+        logger.setLevel(logging.WARNING)
+        self.user = User.objects.create(username="bench", email="bench@bench.com")
+        self.post = models.Post.objects.create(title="Bench", author=self.user, content="Bench",
+                                               type=models.Post.QUESTION)
+
+    def run_views(self):
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=BENCH_THREADS) as pool:
+            jobs = [pool.submit(hammer, self.post, self.user, thread) for thread in range(BENCH_THREADS)]
+            errors = sum(job.result() for job in jobs)
+        models.flush_post_views()
+        secs = time.time() - start
+
+        return errors, secs
+
+    def test_view_throughput(self):
+        total = BENCH_THREADS * BENCH_VIEWS
+
+        print()
+        print(f"threads: {BENCH_THREADS}, views: {total}")
+        for buffered in (False, True):
+            models.Post.objects.update(view_count=0)
+            models.PostView.objects.all().delete()
+            cache.clear()
+
+            with override_settings(POST_VIEW_BUFFER=buffered):
+                errors, secs = self.run_views()
+
+            self.post.refresh_from_db()
+            print(f"buffered={buffered!s:5}: {total / secs:.0f} views/s, {errors} lock errors, "
+                  f"{self.post.view_count} views counted")
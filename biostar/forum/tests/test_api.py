@@ -2,13 +2,15 @@ import logging
 import os
 import shutil
 import datetime
+import json
 from django.core import management
+from django.utils import timezone
 from django.urls import reverse
 from django.test import TestCase, override_settings
 from django.conf import settings
 from biostar.forum import models, api
 from biostar.utils.helpers import fake_request
-from biostar.accounts.models import User
+from biostar.accounts.models import User, Profile
 
 logger = logging.getLogger('engine')
 
@@ -60,3 +62,77 @@ class PostAPITest(TestCase):
         #self.process_response(response=response)
 
 
+class DailyStatsTest(TestCase):
+
+    def setUp(self):
+        logger.setLevel(logging.WARNING)
+        self.today = timezone.localdate()
+        models.DailyStats.objects.all().delete()
+
+        # Content created over the past days.
+        for idx, ago in enumerate((30, 12, 12, 5, 2)):
+            date = timezone.now() - datetime.timedelta(days=ago)
+            user = User.objects.create(username=f"user{idx}", email=f"user{idx}@tested.com")
+            Profile.objects.filter(user=user).update(date_joined=date)
+            question = models.Post.objects.create(title="Question", author=user, content="Question",
+                                                  type=models.Post.QUESTION)
+            answer = models.Post.objects.create(title="Answer", author=user, content="Answer",
+                                                type=models.Post.ANSWER, parent=question)
+            models.Post.objects.create(title="Comment", author=user, content="Comment",
+                                       type=models.Post.COMMENT, parent=answer)
+            vote = models.Vote.objects.create(author=user, post=question, type=models.Vote.UP)
+            models.Post.objects.filter(root=question).update(creation_date=date)
+            models.Vote.objects.filter(pk=vote.pk).update(date=date)
+
+    def assertMatches(self):
+        """Each row holds the same totals as computing the counts of that day."""
+        rows = models.DailyStats.objects.order_by('date')
+        self.assertTrue(rows)
+        for row in rows:
+            end = row.date + datetime.timedelta(days=1)
+            self.assertEqual(row.counts(), api.get_counts(end=end), row.date)
+
+    def test_backfill(self):
+        """Test the backfill against the counts computed for each day"""
+        management.call_command('stats', backfill=True)
+
+        rows = models.DailyStats.objects.order_by('date')
+        self.assertEqual(rows.last().date, self.today - datetime.timedelta(days=1))
+        self.assertEqual(rows.count(), (rows.last().date - rows.first().date).days + 1)
+        self.assertMatches()
+
+    def test_incremental(self):
+        """Test adding the days since the last row"""
+        api.rollup_stats(until=self.today - datetime.timedelta(days=10))
+        added = api.rollup_stats()
+        self.assertEqual(added, 10)
+        self.assertEqual(api.rollup_stats(), 0)
+        self.assertMatches()
+
+    def test_range(self):
+        """Test the statistics of a date range"""
+        api.rollup_stats()
+        start, end = self.today - datetime.timedelta(days=13), self.today - datetime.timedelta(days=4)
+        kwargs = dict(start=str(start), end=str(end))
+        url = reverse("api_stats_range", kwargs=kwargs)
+        request = fake_request(url=url, data={}, user=User.objects.first())
+
+        response = api.daily_stats_range(request=request, **kwargs)
+        data = json.loads(response.content)
+
+        self.assertEqual(len(data), 10)
+        self.assertEqual(data[0]['questions'], 1)
+        self.assertEqual(data[-1]['questions'], 4)
+
+    def test_range_invalid(self):
+        """Test invalid and too long date ranges are rejected"""
+        long = self.today - datetime.timedelta(days=settings.STATS_RANGE_DAYS)
+        for start, end in [("2021-02-30", "2021-03-01"), ("today", "2021-03-01"), (str(long), str(self.today))]:
+            kwargs = dict(start=start, end=end)
+            url = reverse("api_stats_range", kwargs=kwargs)
+            request = fake_request(url=url, data={}, user=User.objects.first())
+
+            response = api.daily_stats_range(request=request, **kwargs)
+
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', json.loads(response.content))
@@ -0,0 +1,90 @@
+import logging
+import random
+
+from django.test import TestCase
+
+from biostar.accounts.models import User, Message, MessageBody
+from biostar.accounts.tasks import create_messages
+from biostar.forum import models, auth
+from biostar.forum.templatetags.forum_tags import toggle_unread
+
+logger = logging.getLogger('engine')
+
+
+class CounterTest(TestCase):
+
+    def setUp(self):
+        logger.setLevel(logging.WARNING)
+        self.users = [User.objects.create(username=f"user{idx}", email=f"user{idx}@tested.com")
+                      for idx in range(5)]
+        self.body = MessageBody.objects.create(body="Hello")
+
+        # The first read creates the counters, the counts are compared from then on.
+        for user in self.users:
+            auth.read_counts(user=user)
+            user.profile.last_login = user.counters.date
+            user.profile.save()
+
+    def activity(self, rand, steps=200):
+        """
+        Random posts, votes, messages and moderation actions.
+        """
+        posts = []
+        for step in range(steps):
+            user = rand.choice(self.users)
+            action = rand.choice(["post", "vote", "message", "notify", "read", "spam", "log"])
+
+            if action == "post" or not posts:
+                post = models.Post.objects.create(title=f"Post {step}", author=user, content="Content",
+                                                  type=models.Post.QUESTION)
+                posts.append(post)
+            elif action == "vote":
+                vote_type = rand.choice([models.Vote.UP, models.Vote.BOOKMARK])
+                auth.apply_vote(post=rand.choice(posts), user=user, vote_type=vote_type)
+            elif action == "message":
+                Message.objects.create(sender=user, recipient=rand.choice(self.users), body=self.body)
+            elif action == "notify":
+                user_ids = [u.id for u in rand.sample(self.users, k=3)]
+                create_messages(template="messages/welcome.md", user_ids=user_ids, sender=user)
+            elif action == "read":
+                toggle_unread(user=user)
+            elif action == "spam":
+                models.Post.objects.filter(id=rand.choice(posts).id).update(spam=models.Post.SPAM)
+            else:
+                models.Log.objects.create(user=user, text="Moderated")
+
+    def test_counters(self):
+        """Test the user counters match the counts computed from scratch"""
+        rand = random.Random(1)
+
+        for round in range(3):
+            self.activity(rand=rand)
+            auth.site_counts(fresh=True)
+
+            for user in self.users:
+                user = User.objects.get(id=user.id)
+                expected = auth.get_counts(user=user)
+
+                # Recomputing the counters does not change them.
+                counters = models.UserCounters.objects.filter(user=user)
+                before = counters.values().first()
+                auth.reconcile_counters(counters)
+                self.assertEqual(before, counters.values().first())
+
+                # Reading the counters resets the counts since the last read.
+                self.assertEqual(auth.read_counts(user=user), expected)
+                user.profile.last_login = user.counters.date
+                user.profile.save()
+
+    def test_created_on_read(self):
+        """Test counters missing for a user are rebuilt on read"""
+        user, other = self.users[:2]
+        post = models.Post.objects.create(title="Post", author=user, content="Content", type=models.Post.QUESTION)
+        auth.apply_vote(post=post, user=other, vote_type=models.Vote.UP)
+        Message.objects.create(sender=other, recipient=user, body=self.body)
+
+        models.UserCounters.objects.filter(user=user).delete()
+        counts = auth.read_counts(user=User.objects.get(id=user.id))
+
+        self.assertEqual(counts['vote_count'], 1)
+        self.assertEqual(counts['message_count'], Message.objects.filter(recipient=user, unread=True).count())
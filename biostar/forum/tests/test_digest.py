@@ -0,0 +1,117 @@
+import logging
+import os
+import tracemalloc
+from datetime import date
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from biostar.accounts.models import User, Profile
+from biostar.forum import models, util
+from biostar.forum.management.commands import digest
+
+logger = logging.getLogger('engine')
+
+TOTAL_USERS = 20000
+
+
+@override_settings(SEND_MAIL=True)
+class DigestTest(TestCase):
+
+    def setUp(self):
+        logger.setLevel(logging.WARNING)
+        if os.path.isfile(settings.DIGEST_CHECKPOINT):
+            os.remove(settings.DIGEST_CHECKPOINT)
+
+        start = User.objects.order_by('-id').values_list('id', flat=True).first() + 1
+        self.ids = range(start, start + TOTAL_USERS)
+
+        # Recipients are inserted without triggering the signals.
+        users = (User(id=idx, username=f"digest{idx}", email=f"digest{idx}@tested.com") for idx in self.ids)
+        User.objects.bulk_create(users, batch_size=1000)
+        now = util.now()
+        profiles = (Profile(user_id=idx, uid=f"digest{idx}", digest_prefs=Profile.DAILY_DIGEST, date_joined=now,
+                            last_login=now) for idx in self.ids)
+        Profile.objects.bulk_create(profiles, batch_size=1000)
+
+        self.owner = User.objects.create(username="owner", email="owner@tested.com")
+        models.Post.objects.create(title="Digest post", author=self.owner, content="Digest", type=models.Post.QUESTION)
+        mail.outbox.clear()
+
+    def recipients(self):
+        return [rec for msg in mail.outbox for rec in msg.to]
+
+    def test_digest_stream(self):
+        """Test the digest streams the recipients with bounded memory and queries"""
+        sizes = []
+
+        def send_messages(backend, messages):
+            sizes.append(len(messages))
+            return send(backend, messages)
+
+        send = EmailBackend.send_messages
+
+        tracemalloc.start()
+        with patch.object(EmailBackend, "send_messages", send_messages):
+            with CaptureQueriesContext(connection) as queries:
+                total = digest.send_digests(days=1, subject="Daily digest", chunk_size=1000)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.assertEqual(total, TOTAL_USERS)
+        self.assertEqual(sorted(self.recipients()), sorted(f"digest{idx}@tested.com" for idx in self.ids))
+
+        # Each chunk of 1000 users goes out in one call, in emails of 40 recipients.
+        self.assertEqual(len(sizes), TOTAL_USERS // 1000)
+        self.assertEqual(max(sizes), 25)
+
+        self.assertLess(len(queries), 20)
+        self.assertLess(peak, 32 * 1024 * 1024)
+
+    def test_digest_resume(self):
+        """Test an interrupted digest resumes after the last chunk sent"""
+        calls = []
+        send = EmailBackend.send_messages
+
+        def failing(backend, messages):
+            calls.append(1)
+            if len(calls) == 3:
+                raise ConnectionError("connection lost")
+            return send(backend, messages)
+
+        with patch.object(EmailBackend, "send_messages", failing):
+            with self.assertRaises(ConnectionError):
+                digest.send_digests(days=1, subject="Daily digest", chunk_size=5000)
+
+        self.assertEqual(len(self.recipients()), 10000)
+
+        total = digest.send_digests(days=1, subject="Daily digest", chunk_size=5000)
+        self.assertEqual(total, 10000)
+
+        # Every user got the digest once.
+        recipients = self.recipients()
+        self.assertEqual(len(recipients), TOTAL_USERS)
+        self.assertEqual(len(set(recipients)), TOTAL_USERS)
+
+        # Nothing is sent twice in the same period.
+        self.assertEqual(digest.send_digests(days=1, subject="Daily digest"), 0)
+
+    def test_digest_period(self):
+        """Test a digest resumed later in its period keeps the checkpoint"""
+        monday, sunday = date(2021, 6, 7), date(2021, 6, 13)
+        self.assertEqual(digest.digest_period(7, monday), digest.digest_period(7, sunday))
+        self.assertNotEqual(digest.digest_period(7, sunday), digest.digest_period(7, date(2021, 6, 14)))
+        self.assertEqual(digest.digest_period(30, date(2021, 6, 1)), digest.digest_period(30, date(2021, 6, 30)))
+        self.assertNotEqual(digest.digest_period(1, monday), digest.digest_period(1, sunday))
+
+    @override_settings(DATA_MIGRATION=True)
+    def test_digest_migration(self):
+        """Test no digest goes out during a data migration"""
+        self.assertIsNone(digest.send_digests(days=1, subject="Daily digest"))
+        self.assertFalse(mail.outbox)
+        self.assertFalse(os.path.isfile(settings.DIGEST_CHECKPOINT))
@@ -1,6 +1,11 @@
 import logging
 import os
+import time
+from unittest.mock import patch
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.db.models import F
 from django.conf import settings
 from biostar.forum import models, markdown
 from biostar.accounts.models import User
@@ -111,3 +116,75 @@ class MarkdownTest(TestCase):
 
         # Catch all errors at once.
         self.assertTrue(error_count == 0)
+
+    def test_html_cache(self):
+        """
+        Test saving unchanged content skips the parser.
+        """
+        markdown.CACHE.clear()
+        self.post.content = "Cached **content** for @test"
+        self.post.save()
+        html = self.post.html
+
+        with patch('biostar.forum.markdown.get_markdown') as parser:
+            self.post.save()
+            parser.assert_not_called()
+
+        self.assertEqual(self.post.html, html)
+
+    def test_html_cache_mentions(self):
+        """
+        Test cached html still subscribes the mentioned users and expires.
+        """
+        user = User.objects.create(username="mentioned", email="mentioned@tested.com")
+        user.profile.handle = "mentioned"
+        user.profile.save()
+
+        comment = models.Post.objects.create(title="Test", author=self.owner, content="Test",
+                                             type=models.Post.COMMENT, parent=self.post)
+
+        markdown.CACHE.clear()
+        text = "Thanks @mentioned"
+        markdown.parse(text, post=comment)
+        models.Subscription.objects.filter(post=self.post, user=user).delete()
+
+        markdown.parse(text, post=comment)
+        self.assertTrue(models.Subscription.objects.filter(post=self.post, user=user).exists())
+
+        # Expired entries are rendered again.
+        key = markdown.CACHE.key(text, self.post.pk, True, True, False)
+        self.assertIsNotNone(markdown.CACHE.get(key))
+        with patch('biostar.forum.markdown.time.time', return_value=time.time() + settings.MARKDOWN_CACHE_TTL + 1):
+            self.assertIsNone(markdown.CACHE.get(key))
+
+    def test_reference_queries(self):
+        """
+        Test mentions and post links are resolved with a bounded number of queries.
+        """
+        total = 50
+        users = [User.objects.create(username=f"user{i}", email=f"user{i}@tested.com") for i in range(total)]
+        for i, user in enumerate(users):
+            user.profile.handle = f"handle{i}"
+            user.profile.save()
+
+        posts = [models.Post(title=f"Linked {i}", author=self.owner, content="Test", type=models.Post.QUESTION,
+                             uid=f"linked{i}", creation_date=self.post.creation_date,
+                             lastedit_date=self.post.lastedit_date) for i in range(total)]
+        models.Post.objects.bulk_create(posts)
+        models.Post.objects.filter(uid__startswith="linked").update(root_id=F('id'), parent_id=F('id'))
+
+        mentions = " ".join(f"@handle{i}" for i in range(total))
+        links = "\n\n".join(f"{settings.PROTOCOL}://{SITE_URL}/p/linked{i}/" for i in range(total))
+        text = f"{mentions}\n\n{links}"
+
+        markdown.CACHE.clear()
+        with CaptureQueriesContext(connection) as context:
+            html = markdown.parse(text, post=self.answer, clean=True, escape=False)
+
+        self.assertLessEqual(len(context.captured_queries), 10)
+        self.assertIn("Linked 49", html)
+        self.assertIn(users[-1].profile.name, html)
+
+        # Every mentioned user is subscribed to the thread.
+        subs = models.Subscription.objects.filter(post=self.answer.root, user__in=users).count()
+        self.assertEqual(subs, total)
@@ -1,11 +1,13 @@
 import logging
 import os
 import shutil
+from unittest.mock import patch
+from joblib import dump
 from django.core import management
 from django.urls import reverse
 from django.test import TestCase, override_settings
 from django.conf import settings
-from biostar.forum import models, views
+from biostar.forum import models, views, tasks
 from biostar.utils.helpers import fake_request
 from biostar.accounts.models import User
 from biostar.utils import spamlib
@@ -15,6 +17,10 @@ logger = logging.getLogger('engine')
 TEST_SPAM_ROOT = os.path.abspath(os.path.join(settings.BASE_DIR, 'export', 'test', 'test_spammers'))
 TEST_SPAM_DIR = TEST_SPAM_ROOT
 TEST_SPAM_INDEX_NAME = "test_spam"
+TEST_SPAM_MODEL = os.path.join(TEST_SPAM_ROOT, "spam.model")
+
+SPAM_TEXT = "cheap pills buy now casino winner free money click here "
+HAM_TEXT = "alignment of paired end reads with bwa against the reference genome "
 
 
 @override_settings(SPAM_INDEX_NAME=TEST_SPAM_INDEX_NAME,
@@ -54,3 +60,70 @@ class TestSpam(TestCase):
         self.assertTrue(new_spam.is_spam, "Spam is classifier is not working")
 
         pass
+
+
+@override_settings(SPAM_MODEL=TEST_SPAM_MODEL)
+class TestSpamModel(TestCase):
+
+    def setUp(self):
+        logger.setLevel(logging.WARNING)
+        os.makedirs(TEST_SPAM_ROOT, exist_ok=True)
+        X = [SPAM_TEXT * (r + 1) for r in range(10)] + [HAM_TEXT * (r + 1) for r in range(10)]
+        y = [1] * 10 + [0] * 10
+        dump(spamlib.fit_model(X, y), TEST_SPAM_MODEL)
+        spamlib.MODELS.clear()
+
+        self.owner = User.objects.create(username=f"spammer", email="spammer@tested.com", password="tested")
+
+    def test_model_reload(self):
+        """Test the model is loaded once and reloaded when the file changes"""
+        with patch.object(spamlib, "load_model", wraps=spamlib.load_model) as load:
+            for r in range(5):
+                spamlib.classify_content(SPAM_TEXT, model=TEST_SPAM_MODEL)
+            self.assertEqual(load.call_count, 1)
+
+            # Changing the modification time triggers a reload.
+            mtime = os.path.getmtime(TEST_SPAM_MODEL)
+            os.utime(TEST_SPAM_MODEL, (mtime + 10, mtime + 10))
+            spamlib.classify_content(SPAM_TEXT, model=TEST_SPAM_MODEL)
+            self.assertEqual(load.call_count, 2)
+
+    def test_classify_batch(self):
+        """Test classifying many texts at once matches classifying them one by one"""
+        texts = [SPAM_TEXT * 3, HAM_TEXT * 3, SPAM_TEXT + HAM_TEXT * 2, HAM_TEXT]
+        single = [spamlib.classify_content(text, model=TEST_SPAM_MODEL) for text in texts]
+
+        self.assertEqual(spamlib.classify_batch(texts, model=TEST_SPAM_MODEL), single)
+        self.assertEqual(single[:2], [1, 0])
+
+    def test_spam_check_batch(self):
+        """Test classifying posts in a batch"""
+        posts = [models.Post.objects.create(title=f"Post {r}", author=self.owner, content="Short",
+                                            type=models.Post.QUESTION) for r in range(4)]
+
+        # Updating the content skips the check done on save.
+        for post, text in zip(posts, [SPAM_TEXT, HAM_TEXT, SPAM_TEXT, HAM_TEXT]):
+            models.Post.objects.filter(id=post.id).update(content=text * 4)
+
+        tasks.spam_check_batch(uids=[post.uid for post in posts])
+
+        spam = models.Post.objects.filter(id__in=[p.id for p in posts], spam=models.Post.SPAM)
+        self.assertEqual(set(spam.values_list("id", flat=True)), {posts[0].id, posts[2].id})
+
+
+    def test_spam_action(self):
+        """Test the spam action checks each post once"""
+        posts = [models.Post.objects.create(title=f"Post {r}", author=self.owner, content=HAM_TEXT * 4,
+                                            type=models.Post.QUESTION) for r in range(3)]
+        checked = os.path.join(TEST_SPAM_ROOT, "spam.checked")
+        if os.path.isfile(checked):
+            os.remove(checked)
+
+        with override_settings(SPAM_CHECKED=checked), patch.object(tasks, "spam_check_batch") as check:
+            management.call_command("tasks", action="spam", limit=2)
+            management.call_command("tasks", action="spam", limit=2)
+            management.call_command("tasks", action="spam", limit=2)
+
+        uids = [call.kwargs["uids"] for call in check.call_args_list]
+        self.assertEqual(sum(uids, []), [post.uid for post in models.Post.objects.order_by("pk")])
+        self.assertEqual(uids[-1], [posts[-1].uid])
@@ -112,12 +112,16 @@ def check_job(request, uid):
         logger.error(f'Error checking job:{exc}')
         state_changed = False
 
-    if os.path.exists(stdout_path) and os.path.exists(stderr_path):
-        stdout = open(stdout_path, 'r').read()
-        stderr = open(stderr_path, 'r').read()
-        Job.objects.filter(uid=job.uid).update(stderr_log=stderr, stdout_log=stdout)
-    else:
-        stdout = stderr = None
+    # The client sends the byte offsets of the logs it has shown.
+    # Only the bytes written after them are read, the job saves the logs when it finishes.
+    logs = {}
+    for name, path in (('stdout', stdout_path), ('stderr', stderr_path)):
+        offset = request.GET.get(f'{name}_offset')
+        if offset is None or not offset.isdigit():
+            logs.update({name: None, f'{name}_offset': 0, f'{name}_skipped': 0})
+            continue
+        text, offset, skipped = util.read_log(path, offset=int(offset))
+        logs.update({name: text, f'{name}_offset': offset, f'{name}_skipped': skipped})
 
     # Render the updated image icon
     redir = job.url() if job.is_finished() else ""
@@ -132,8 +136,8 @@ def check_job(request, uid):
 
     return ajax_success(msg='success', redir=redir,
                         html=template, state=job.get_state_display(), is_running=job.is_running(),
-                        stdout=stdout, stderr=stderr, job_color=auth.job_color(job),
-                        state_changed=state_changed, img_tmpl=image_tmpl)
+                        job_color=auth.job_color(job), state_changed=state_changed, img_tmpl=image_tmpl,
+                        **logs)
 
 
 def check_size(fobj, maxsize=0.3):
@@ -287,6 +291,7 @@ def manage_access(request):
     # Update existing access
     if access:
         Access.objects.filter(id=access.id).update(access=new_access)
+        auth.clear_access()
     # Create a new access object
     else:
         Access.objects.create(user=user, project=project, access=new_access)
@@ -1,4 +1,5 @@
 import difflib
+import functools
 import logging
 import uuid, copy, base64
 import json
@@ -6,13 +7,16 @@ import base64
 import io
 import subprocess
 import random
+import threading
+import shutil
 from mimetypes import guess_type
 import mistune
 import toml as hjson
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.messages.storage import fallback
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Q, Sum
 from django.template import Template, Context
 from django.template import loader
 from django.shortcuts import reverse
@@ -22,6 +26,7 @@ from django.utils.timezone import now
 from biostar.recipes import models
 from biostar.recipes import util
 from biostar.recipes.const import *
+from biostar.accounts.models import Profile
 from biostar.recipes.models import Data, Analysis, Job, Project, Access
 
 logger = logging.getLogger("engine")
@@ -665,20 +670,24 @@ def paste(project, user, board, clone=False):
     # Special case to paste files.
     if key == COPIED_FILES:
         # Add each path in clipboard as a data object.
-        new = [data_paste(project=project, user=user, path=p) for p in vals]
-        return new
-
-    # Map the objects in the clipboard to a database class.
-    klass = obj_map.get(key)
-    if not klass:
-        return []
-
-    # Select existing object by uid.
-    objs = [klass.objects.filter(uid=uid).first() for uid in vals]
-    objs = filter(None, objs)
-
-    # Apply copier to each object.
-    new = list(map(copier, objs))
+        objs = vals
+        copier = lambda path: data_paste(project=project, user=user, path=path)
+    else:
+        # Map the objects in the clipboard to a database class.
+        klass = obj_map.get(key)
+        if not klass:
+            return []
+
+        # Select existing object by uid.
+        objs = [klass.objects.filter(uid=uid).first() for uid in vals]
+        objs = list(filter(None, objs))
+
+    # Each batch commits on its own, the files are copied while the transaction is open.
+    # The project counts are refreshed once per batch.
+    new = []
+    for idx in range(0, len(objs), settings.PASTE_BATCH_SIZE):
+        with transaction.atomic():
+            new.extend(map(copier, objs[idx:idx + settings.PASTE_BATCH_SIZE]))
 
     return new
 
@@ -840,32 +849,45 @@ def delete_recipe(recipe, user):
         clone.project.set_counts()
 
 
-def transform(root, node, path):
+@functools.lru_cache(maxsize=settings.LISTING_CACHE_SIZE)
+def list_dir(path, mtime, version):
+    """
+    Lists a directory with the stat results cached by the scandir entries.
+    The modification time and the version in the key list the directory again once they change.
+    Returns the name, time stamp, size, is_dir and is_link of each entry.
+    """
+    entries = []
+    with os.scandir(path) as items:
+        for item in items:
+            try:
+                # Follows the links like os.stat does.
+                stat = item.stat()
+                tstamp, size = stat.st_mtime, stat.st_size
+            except OSError:
+                tstamp, size = 0, 0
+            entries.append((item.name, tstamp, size, item.is_dir(), item.is_symlink()))
+
+    return tuple(entries)
+
+
+def read_dir(path, version=None):
+    if version is not None:
+        return list_dir(path, os.stat(path).st_mtime_ns, version)
+    return list_dir.__wrapped__(path, None, None)
+
+
+def transform(root, path, real, tstamp, size, is_dir):
     # Image extension types.
     IMAGE_EXT = {"png", "jpg", "gif", "jpeg"}
 
-    # Get the absolute path /root/node/path.
-    path = os.path.abspath(os.path.join(node, path))
-
     # Find the relative path of the current node/path to the root.
     relative = os.path.relpath(path, root)
 
-    # Follow symlinks and get the real path.
-    real = os.path.realpath(path)
-
     # Get the parent directory
     parent = os.path.dirname(path)
 
-    tstamp, size = 0, 0
-
-    if os.path.exists(path):
-        # Time stamp and size info.
-        tstamp = os.stat(path).st_mtime
-        size = os.stat(path).st_size
-
     # Get the elements. i.e. foo/bar.txt -> ['foo', 'bar.txt']
     elems = os.path.split(relative)
-    is_dir = os.path.isdir(path)
 
     # Get all directories.
     dirs = elems[:-1]
@@ -878,23 +900,37 @@ def transform(root, node, path):
     return real, relative, dirs, last, tstamp, size, is_image, parent, is_dir
 
 
-def listing(root, node=None, show_all=True):
+def listing(root, node=None, show_all=True, version=None):
+    """
+    Lists the files under the root, or the entries of the node when show_all is False.
+
+    With a version the listing of each directory is cached until the time of the directory
+    or the version changes. A file rewritten in place keeps the time of its directory,
+    the version has to change with the files, for example the end date of a job.
+    """
     paths = []
-    node = node or root
+    root = os.path.abspath(root)
+    node = os.path.abspath(node or root)
 
     try:
-        # Walk the root filesystem and collect all files.
-        if show_all:
-            for fpath, fdirs, fnames in os.walk(root, followlinks=True):
-                paths.extend([join(fpath, fname) for fname in fnames])
+        # Walk the root filesystem and collect all files, following the links to directories.
         # Get the list of file in current directory node being traversed.
-        else:
-            paths = os.listdir(node)
-
-        # Add metadata to each path.
-        transformer = lambda path: transform(root=root, node=node, path=path)
+        stack = [(root if show_all else node, None)]
+        while stack:
+            path, real = stack.pop()
+            # Follow symlinks and get the real path, once per directory.
+            real = real or os.path.realpath(path)
+
+            for name, tstamp, size, is_dir, is_link in read_dir(path, version=version):
+                child = os.path.join(path, name)
+                real_child = os.path.realpath(child) if is_link else os.path.join(real, name)
+
+                if show_all and is_dir:
+                    stack.append((child, real_child))
+                    continue
 
-        paths = list(map(transformer, paths))
+                paths.append(transform(root=root, path=child, real=real_child, tstamp=tstamp, size=size,
+                                       is_dir=is_dir))
 
         paths = sorted(paths, key=lambda x: x[0])
 
@@ -984,6 +1020,41 @@ def create_data_link(path, data):
         logger.info(f"Linked dir: {path}")
 
 
+# Changes each time access rows are saved or deleted, see signals.
+ACCESS_VERSION = 0
+
+ACCESS_LOCK = threading.Lock()
+
+
+def clear_access():
+    """
+    Invalidates the access levels loaded by access_levels.
+    Bulk updates send no signals, call it after them.
+    """
+    global ACCESS_VERSION
+    with ACCESS_LOCK:
+        ACCESS_VERSION += 1
+
+
+def access_levels(user):
+    """
+    Returns the access levels of a user keyed by project id.
+    The rows are loaded in one query and kept on the user instance,
+    the request user lives as long as the request.
+    """
+    cached = getattr(user, '_access_levels', None)
+    if cached and cached[0] == ACCESS_VERSION:
+        return cached[1]
+
+    version = ACCESS_VERSION
+    levels = {}
+    for project_id, access in Access.objects.filter(user=user).order_by('pk').values_list('project_id', 'access'):
+        levels.setdefault(project_id, []).append(access)
+
+    user._access_levels = (version, levels)
+    return levels
+
+
 def is_readable(user, obj, strict=False):
     """
     strict=True policy ensures public projects still get their access checked.
@@ -992,14 +1063,13 @@ def is_readable(user, obj, strict=False):
     if project.is_public and not strict:
         return True
 
-    if user.is_anonymous:
+    if not user or user.is_anonymous:
         return False
 
-    query = Q(access=Access.READ_ACCESS) | Q(access=Access.WRITE_ACCESS) | Q(access=Access.SHARE_ACCESS)
+    valid = {Access.READ_ACCESS, Access.WRITE_ACCESS, Access.SHARE_ACCESS}
+    levels = access_levels(user).get(project.id, [])
 
-    access = Access.objects.filter(query, project=project, user=user)
-
-    return access.exists()
+    return bool(valid.intersection(levels))
 
 
 def is_writable(user, project, owner=None):
@@ -1015,12 +1085,11 @@ def is_writable(user, project, owner=None):
     cond1 = user.is_staff or user.is_superuser
 
     # User has been given write access to the project
-    cond2 = models.Access.objects.filter(user=user, project=project,
-                                         access=models.Access.WRITE_ACCESS).first()
+    cond2 = Access.WRITE_ACCESS in access_levels(user).get(project.id, [])
 
     # User owns this project.
-    owner = owner or project.owner
-    cond3 = user == owner
+    owner_id = owner.id if owner else project.owner_id
+    cond3 = user.id == owner_id
 
     # One of the conditions has to be true.
     access = cond1 or cond2 or cond3
@@ -1082,7 +1151,35 @@ def fill_data_by_name(project, json_data):
     return json_data
 
 
-def create_data(project, user=None, stream=None, path='', name='', text='', type='', uid=None):
+def upload_space(user):
+    """
+    Returns the number of bytes a user may still upload.
+    """
+    # The cumulative size of the uploaded data, the profile of the user may be older.
+    current_size = Profile.objects.filter(user=user).values_list('upload_usage', flat=True).first() or 0
+
+    return user.profile.upload_size * 1024 * 1024 - current_size
+
+
+def reconcile_usage():
+    """
+    Sets the upload usage of each user to the cumulative size of their uploaded data.
+    Returns the number of users whose usage changed.
+    """
+    uploads = Data.objects.filter(method=Data.UPLOAD).values('owner').annotate(total=Sum('size'))
+    totals = {row['owner']: row['total'] or 0 for row in uploads}
+
+    changed = 0
+    for pk, user_id, usage in Profile.objects.values_list('pk', 'user_id', 'upload_usage'):
+        total = totals.get(user_id, 0)
+        if usage != total:
+            Profile.objects.filter(pk=pk).update(upload_usage=total)
+            changed += 1
+
+    return changed
+
+
+def create_data(project, user=None, stream=None, path='', name='', text='', type='', uid=None, limit=None):
     # We need absolute paths with no trailing slashes.
     path = os.path.abspath(path).rstrip("/") if path else ""
 
@@ -1107,8 +1204,15 @@ def create_data(project, user=None, stream=None, path='', name='', text='', type
         # Create path for the stream
         path = create_path(data=data, fname=fname)
 
-        # Write stream into newly created path.
-        util.write_stream(stream=stream, dest=path)
+        # Write stream into newly created path, streams over the limit leave no data behind.
+        try:
+            size, digest = util.copy_stream(stream=stream, dest=path, limit=limit)
+        except util.UploadLimitError:
+            shutil.rmtree(data.get_data_dir(), ignore_errors=True)
+            data.delete()
+            raise
+
+        logger.info(f"Uploaded {size} bytes sha256={digest} into {path}")
 
         # Mark incoming file as uploaded
         data.method = Data.UPLOAD
@@ -1130,6 +1234,7 @@ def create_data(project, user=None, stream=None, path='', name='', text='', type
     # Set updated attributes
     data.state = state
     data.name = name or os.path.basename(path) or 'Data'
+    data.files_changed = True
 
     # Trigger another save to remake the toc file.
     data.save()
@@ -1153,6 +1258,7 @@ def get_or_create(**kwargs):
 
     if data and not data.deleted:
         create_data_link(path=fname, data=data)
+        data.files_changed = True
         logger.info("Updated data file, name, and text.")
     else:
         # Create new data.
@@ -77,7 +77,7 @@ class read_access:
             readable = auth.is_readable(user=user, obj=project, strict=self.strict)
 
             # Project owners may read their project.
-            if readable or project.owner == user:
+            if readable or project.owner_id == user.id:
                 return function(request, *args, **kwargs)
 
             # Deny access by default.
@@ -6,7 +6,6 @@ import re
 
 from django import forms
 from django.template import Template, Context
-from django.db.models import Sum
 from django.utils.safestring import mark_safe
 from django.utils.timezone import now
 from django.contrib import messages
@@ -66,23 +65,11 @@ def check_upload_limit(file, user):
     Checks if the file pushes user over their upload limit."
     """
 
-    # Existing data.
-    data = Data.objects.filter(owner=user, method=Data.UPLOAD)
-
-    # The current cumulative size of the current data.
-    current_size = data.aggregate(Sum("size"))["size__sum"] or 0
-
-    # The projected size in MB.
-    projected_size = file.size + current_size
-
-    # Maximal cumulative sizes.
-    max_size = user.profile.upload_size * 1024 * 1024
-
     # Current file size in MB
     file_mb = file.size / 1024 / 1024
 
     # Verify projected data sizes.
-    if projected_size > max_size:
+    if file.size > auth.upload_space(user):
         msg = f"You don't have enough storage space for data of size <b>{file_mb:.2f} MB</b>"
         raise forms.ValidationError(mark_safe(msg))
 
@@ -215,10 +202,13 @@ class DataUploadForm(forms.ModelForm):
         else:
             stream = io.StringIO(initial_value=input_text)
 
+        # The space is checked again while writing, the declared size may be wrong.
         data = auth.create_data(stream=stream, name=name, text=text, user=self.user,
-                                project=self.project, type=type)
+                                project=self.project, type=type, limit=auth.upload_space(self.user))
         if input_text and not self.cleaned_data["file"]:
             Data.objects.filter(pk=data.pk).update(method=Data.TEXTAREA)
+            data.method = Data.TEXTAREA
+            data.update_usage()
             stream.close()
 
         return data
@@ -300,7 +290,11 @@ class DataEditForm(forms.ModelForm):
             fobj = io.StringIO(initial_value=input_text)
 
         if fobj:
-            util.write_stream(stream=fobj, dest=current_file)
+            # The replaced file frees its space.
+            limit = auth.upload_space(self.user) + os.path.getsize(current_file)
+            size, digest = util.copy_stream(stream=fobj, dest=current_file, limit=limit)
+            logger.info(f"Uploaded {size} bytes sha256={digest} into {current_file}")
+            self.instance.files_changed = True
 
         self.instance.lastedit_user = self.user
         self.instance.lasedit_date = now()
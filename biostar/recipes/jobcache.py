@@ -0,0 +1,209 @@
+"""
+Results of recipe runs addressed by the content of their inputs.
+
+Recipes opt in with:
+
+[settings.execute]
+cache = true
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from functools import lru_cache
+
+from django.conf import settings
+
+logger = logging.getLogger('engine')
+
+CHUNK = 1024 * 1024
+
+# The runtime values, such as the job id and directory, differ for each run.
+SKIP = ('runtime',)
+
+# The ioctl that shares the blocks of a file on copy on write file systems (btrfs, xfs).
+FICLONE = 0x40049409
+
+
+@lru_cache(maxsize=10000)
+def content_digest(path, size, mtime):
+    """
+    Returns the digest of the content of a file, the size and modification time key the cache.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(CHUNK), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def file_digest(path):
+    """
+    Returns the digest of the content of a file.
+    """
+    stat = os.stat(path)
+    return content_digest(path, stat.st_size, stat.st_mtime_ns)
+
+
+def job_key(script, json_data):
+    """
+    Hashes the rendered script, the parameters and the content of the input data files.
+    """
+    params = {field: item for field, item in json_data.items() if field not in SKIP}
+
+    digest = hashlib.sha256()
+    digest.update(script.encode())
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+
+    for field, item in sorted(params.items()):
+        if not isinstance(item, dict):
+            continue
+        for path in item.get('files') or []:
+            if path and os.path.isfile(path):
+                digest.update(file_digest(path).encode())
+
+    return digest.hexdigest()
+
+
+def entry_path(key):
+    return os.path.join(settings.JOB_CACHE_ROOT, key[:2], key)
+
+
+def clone_file(src, dst):
+    """
+    Copies a file, sharing its blocks where the file system allows it.
+    The copies never share an inode, writing to one leaves the other unchanged.
+    """
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        shutil.copystat(src, dst)
+    except OSError:
+        # Other file systems copy the content.
+        shutil.copy2(src, dst)
+
+
+def copy_tree(src, dst, skip=()):
+    """
+    Copies the files of src into dst and returns their size.
+    """
+    size = 0
+    for dirpath, dirnames, filenames in os.walk(src):
+        rel = os.path.relpath(dirpath, src)
+        target = os.path.normpath(os.path.join(dst, rel))
+        os.makedirs(target, exist_ok=True)
+
+        # Symbolic links are recreated, not followed.
+        links = [name for name in dirnames if os.path.islink(os.path.join(dirpath, name))]
+        dirnames[:] = [name for name in dirnames if name not in links]
+
+        for name in filenames + links:
+            source, dest = os.path.join(dirpath, name), os.path.join(target, name)
+            if os.path.normpath(os.path.join(rel, name)) in skip:
+                continue
+            if os.path.isdir(dest) and not os.path.islink(dest):
+                shutil.rmtree(dest)
+            elif os.path.lexists(dest):
+                os.remove(dest)
+
+            if os.path.islink(source):
+                os.symlink(os.readlink(source), dest)
+            else:
+                clone_file(source, dest)
+            size += os.lstat(dest).st_size
+
+    return size
+
+
+def restore(key, work_dir):
+    """
+    Copies the results cached under the key into the work directory.
+    Returns False when there are no such results.
+    """
+    entry = entry_path(key)
+
+    # The entry is complete once its size is written.
+    if not os.path.isfile(f"{entry}.json"):
+        return False
+
+    # The input of the current run is kept.
+    skip = [os.path.join(settings.JOB_LOGDIR, "input.json")]
+    copy_tree(entry, work_dir, skip=skip)
+
+    # Recently used entries are evicted last.
+    os.utime(f"{entry}.json")
+
+    return True
+
+
+def store(key, work_dir):
+    """
+    Caches the results in the work directory under the key.
+    """
+    entry = entry_path(key)
+    if os.path.isdir(entry):
+        return
+
+    # Concurrent runs of the same job write the entry once.
+    tmp = f"{entry}.{uuid.uuid4().hex}"
+    size = copy_tree(work_dir, tmp)
+    try:
+        os.rename(tmp, entry)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        return
+
+    with open(f"{entry}.json", 'wt') as fp:
+        json.dump(dict(size=size), fp)
+
+    evict()
+
+
+def evict(max_size=None, max_age=None):
+    """
+    Removes the entries unused for longer than max_age days,
+    then the least recently used ones above max_size MB.
+    Returns the number of removed entries.
+    """
+    max_size = (max_size or settings.JOB_CACHE_MAX_SIZE) * 1024 * 1024
+    max_age = max_age or settings.JOB_CACHE_MAX_AGE
+    root = settings.JOB_CACHE_ROOT
+
+    if not os.path.isdir(root):
+        return 0
+
+    entries = []
+    for prefix in os.scandir(root):
+        if not prefix.is_dir():
+            continue
+        for item in os.scandir(prefix.path):
+            if not item.name.endswith(".json"):
+                continue
+            with open(item.path) as fp:
+                size = json.load(fp).get('size', 0)
+            entries.append((item.stat().st_mtime, size, item.path[:-len(".json")]))
+
+    # Oldest first.
+    entries.sort()
+
+    oldest = time.time() - max_age * 24 * 3600
+    total = sum(size for mtime, size, path in entries)
+
+    removed = 0
+    for mtime, size, path in entries:
+        if mtime >= oldest and total <= max_size:
+            break
+        os.remove(f"{path}.json")
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        removed += 1
+
+    if removed:
+        logger.info(f"Evicted {removed} cached job results")
+
+    return removed
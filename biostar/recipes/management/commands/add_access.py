@@ -2,7 +2,7 @@ import logging, os, csv
 
 from django.core.management.base import BaseCommand
 
-from biostar.recipes import models
+from biostar.recipes import models, auth
 from biostar.recipes.models import Access
 
 logger = logging.getLogger('engine')
@@ -66,6 +66,7 @@ class Command(BaseCommand):
 
             # Drop all other permissions for the user.
             models.Access.objects.filter(user=user, project=project).delete()
+            auth.clear_access()
 
             # Get the access value and create the access entry.
             access_value = CHOICE_MAP.get(access)
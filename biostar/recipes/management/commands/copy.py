@@ -3,9 +3,11 @@ import logging
 import psycopg2
 
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.db.models import Q
 from biostar.accounts.models import Profile, User
 from biostar.recipes.models import Project, Data, Access, Analysis, Job
+from biostar.recipes import auth
 import sys
 
 
@@ -175,10 +177,17 @@ def copy_access(cursor):
         else:
             Access.objects.filter(pk=access.pk).update(access=access_int, date=date)
 
+    # The updates send no signals.
+    auth.clear_access()
+
     logger.info(f'Finished copying access={len(access_rows)}.')
     return
 
 
+# The copy functions run in one transaction each, so the project counts are refreshed once.
+# The database stays locked while the rows, and the files of the data, are copied,
+# run the copy on a site that is offline.
+@transaction.atomic
 def copy_data(cursor):
 
     data_table = 'engine_data'
@@ -207,6 +216,7 @@ def copy_data(cursor):
     return
 
 
+@transaction.atomic
 def copy_analysis(cursor):
 
     recipe_table = 'engine_analysis'
@@ -236,6 +246,7 @@ def copy_analysis(cursor):
     return
 
 
+@transaction.atomic
 def copy_job(cursor):
     job_table = 'engine_job'
     cursor.execute(f'SELECT * FROM {job_table}')
@@ -1,6 +1,6 @@
 import toml as hjson
 import time
-import os, logging, subprocess, pprint
+import os, sys, logging, subprocess, pprint, resource, signal
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
@@ -8,7 +8,8 @@ from django.template import Template, Context
 from django.utils.encoding import force_text
 
 from biostar.recipes.models import Job
-from biostar.recipes import auth
+from biostar.recipes import auth, util, jobcache
+from biostar.recipes.const import MAX_LOG_LEN
 from django.conf import settings
 from django.utils import timezone
 from biostar.emailer.tasks import send_email
@@ -80,6 +81,150 @@ def create_logs(job):
     return stdout_fname, stderr_fname
 
 
+# The resource limits of the job process, with the unit of the settings.
+RLIMITS = dict(cpu=(resource.RLIMIT_CPU, 1), memory=(resource.RLIMIT_AS, 1024 * 1024),
+               filesize=(resource.RLIMIT_FSIZE, 1024 * 1024))
+
+# Explains the signals sent by the limits, with the limit that sends them.
+REASONS = {
+    signal.SIGXCPU: ("cpu", "Job exceeded the CPU time limit of {cpu} seconds."),
+    signal.SIGXFSZ: ("filesize", "Job exceeded the file size limit of {filesize} MB."),
+}
+
+# Errors of programs that fail to allocate memory under the address space limit.
+MEMORY_ERRORS = ["MemoryError", "Cannot allocate memory", "std::bad_alloc", "out of memory"]
+
+# Applies the limits given as name:soft:hard arguments then replaces itself with the shell.
+LIMIT_SCRIPT = """
+import os, resource, signal, sys
+# Python ignores these signals, the ignored signals are kept by the shell.
+signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+signal.signal(signal.SIGXFSZ, signal.SIG_DFL)
+for arg in sys.argv[2:]:
+    name, soft, hard = map(int, arg.split(':'))
+    resource.setrlimit(name, (soft, hard))
+os.execv('/bin/sh', ['/bin/sh', '-c', sys.argv[1]])
+"""
+
+
+def get_limits(json_data):
+    """
+    Returns the resource limits of a job, zero means no limit.
+    Recipes may lower the defaults in the json_text:
+
+    [settings.limits]
+    cpu = 60
+    memory = 1000
+    filesize = 100
+    timeout = 120
+    """
+    limits = dict(cpu=settings.JOB_CPU_LIMIT, memory=settings.JOB_MEMORY_LIMIT,
+                  filesize=settings.JOB_FILESIZE_LIMIT, timeout=settings.JOB_TIMEOUT)
+
+    custom = json_data.get("settings", {}).get("limits", {})
+    for key, default in limits.items():
+        try:
+            value = int(custom.get(key, 0))
+        except (ValueError, TypeError) as exc:
+            logger.error(f"Invalid {key} limit: {exc}")
+            value = 0
+
+        # Invalid values keep the default, a recipe can not go above the default.
+        if value <= 0:
+            continue
+        limits[key] = min(value, default) if default else value
+
+    return limits
+
+
+def limit_command(command, limits):
+    """
+    Returns the arguments that run the command in a shell with the resource limits applied.
+    """
+    args = [sys.executable, "-c", LIMIT_SCRIPT, command]
+    for key, (name, unit) in RLIMITS.items():
+        if not limits.get(key):
+            continue
+        soft = limits[key] * unit
+        # The CPU limit sends SIGXCPU first, SIGKILL a few seconds later.
+        hard = soft + 5 if name == resource.RLIMIT_CPU else soft
+        # Limits can not be raised above the current hard limits.
+        current = resource.getrlimit(name)[1]
+        if current != resource.RLIM_INFINITY:
+            soft, hard = min(soft, current), min(hard, current)
+        args.append(f"{name}:{soft}:{hard}")
+
+    return args
+
+
+def wait_command(proc, timeout):
+    """
+    Waits for the process and returns its resource usage, including the commands it waited for.
+    Raises subprocess.TimeoutExpired when the process runs longer than timeout seconds.
+    """
+    start, delay = time.time(), 0.01
+    while True:
+        pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+        if pid:
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            return usage
+        if timeout and time.time() - start > timeout:
+            raise subprocess.TimeoutExpired(proc.args, timeout)
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+
+def limit_reached(key, limits, usage, work_dir):
+    """
+    Returns True when the job used up the limit.
+    """
+    if key == "cpu":
+        return usage.ru_utime + usage.ru_stime >= limits['cpu']
+
+    if key == "filesize":
+        size = limits['filesize'] * 1024 * 1024
+        for dirpath, dirnames, filenames in os.walk(work_dir):
+            if any(util.file_size(os.path.join(dirpath, name)) >= size for name in filenames):
+                return True
+
+    return False
+
+
+def run_command(command, work_dir, stdout, stderr, limits):
+    """
+    Runs the command with resource limits.
+    The whole process group is killed when the command runs longer than the timeout.
+    """
+    proc = subprocess.Popen(limit_command(command, limits), cwd=work_dir, stdout=stdout, stderr=stderr,
+                            start_new_session=True)
+    try:
+        usage = wait_command(proc, timeout=limits['timeout'])
+    except subprocess.TimeoutExpired:
+        os.killpg(proc.pid, signal.SIGKILL)
+        proc.wait()
+        raise Exception(f"Job exceeded the time limit of {limits['timeout']} seconds.")
+
+    code = proc.returncode
+    if not code:
+        return proc
+
+    # The signal stopped the shell, or the shell reports 128 + signal for its commands.
+    # Exit codes are only blamed on a limit that was used up.
+    signum = -code if code < 0 else code - 128
+    key, reason = REASONS.get(signum, (None, None))
+    if key and limits.get(key) and limit_reached(key, limits=limits, usage=usage, work_dir=work_dir):
+        raise Exception(reason.format(**limits))
+
+    errors = util.read_log(stderr.name)[0]
+    if limits.get('memory') and any(error in errors for error in MEMORY_ERRORS):
+        raise Exception(f"Job exceeded the memory limit of {limits['memory']} MB.")
+
+    if code < 0:
+        raise Exception(f"Job was stopped by signal {-code} ({signal.Signals(-code).name}).")
+
+    return proc
+
+
 def run(job, options={}):
     """
     Runs a job
@@ -206,13 +351,22 @@ def run(job, options={}):
         Job.objects.filter(pk=job.pk).update(state=Job.RUNNING,
                                              start_date=timezone.now(),
                                              script=script)
-        # Run the command.
-        proc = subprocess.run(command, cwd=work_dir, shell=True,
-                              stdout=open(stdout_fname, "w"),
-                              stderr=open(stderr_fname, "w"))
 
-        # Raise an error if returncode is anything but 0.
-        proc.check_returncode()
+        # Recipes that opt in reuse the results of an identical run.
+        key = jobcache.job_key(script=script, json_data=json_data) if execute.get('cache') else None
+        cached = key and jobcache.restore(key, work_dir)
+
+        if cached:
+            logger.info(f'Job id={job.id} reused the cached results key={key}')
+        else:
+            # Run the command.
+            limits = get_limits(json_data)
+            with open(stdout_fname, "w") as stdout, open(stderr_fname, "w") as stderr:
+                proc = run_command(command, work_dir=work_dir, stdout=stdout, stderr=stderr, limits=limits)
+
+            # Raise an error if returncode is anything but 0.
+            if proc.returncode:
+                raise subprocess.CalledProcessError(proc.returncode, command)
 
         # Perform tasks at job finalization
         finalize_job(data=json_data, job=job)
@@ -221,6 +375,9 @@ def run(job, options={}):
         logger.info(f"uid={job.uid}, name={job.name}")
         Job.objects.filter(pk=job.pk).update(state=Job.COMPLETED)
 
+        if key and not cached:
+            jobcache.store(key, work_dir)
+
     except Exception as exc:
         # Write error to log file
         open(stderr_fname, "a").write(f"\n{exc}")
@@ -228,8 +385,9 @@ def run(job, options={}):
         Job.objects.filter(pk=job.pk).update(state=Job.ERROR)
         logger.error(f'job id={job.pk} error {exc}')
 
-    stdout_log = open(stdout_fname, "r").read()
-    stderr_log = open(stderr_fname, "r").read()
+    # Keep the end of the logs, the errors are written last.
+    stdout_log = util.read_log(stdout_fname, size=MAX_LOG_LEN)[0]
+    stderr_log = util.read_log(stderr_fname, size=MAX_LOG_LEN)[0]
     # Save the logs and end time
     Job.objects.filter(pk=job.pk).update(end_date=timezone.now(),
                                          stdout_log=stdout_log,
@@ -0,0 +1,29 @@
+import logging
+from django.core.management.base import BaseCommand
+from biostar.recipes.models import Data
+from biostar.recipes import auth
+
+logger = logging.getLogger('engine')
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the upload usage of the users from the size of their uploaded data.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--disk', action='store_true', default=False,
+                            help="Measures the uploaded data on disk first.")
+
+    def handle(self, *args, **options):
+        disk = options['disk']
+
+        # The sizes stored in the database may be older than the files.
+        if disk:
+            uploads = Data.objects.filter(method=Data.UPLOAD)
+            logger.info(f"Measuring {uploads.count()} uploaded data")
+            for data in uploads.iterator():
+                data.make_toc()
+
+        # Uploads that finish while counting are only corrected by the next run.
+        changed = auth.reconcile_usage()
+
+        logger.info(f"Corrected the upload usage of {changed} users")
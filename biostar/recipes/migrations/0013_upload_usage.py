@@ -0,0 +1,29 @@
+# Generated by Django 3.2 on 2026-10-18 12:00
+
+from django.db import migrations
+from django.db.models import Sum
+
+
+def count_usage(apps, schema_editor):
+    """
+    Sets the upload usage of the users to the size of their uploaded data.
+    """
+    Data = apps.get_model('recipes', 'Data')
+    Profile = apps.get_model('accounts', 'Profile')
+
+    # Data.UPLOAD
+    uploads = Data.objects.filter(method=2).values('owner').annotate(total=Sum('size'))
+    for row in uploads:
+        Profile.objects.filter(user_id=row['owner']).update(upload_usage=row['total'] or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0027_profile_upload_usage'),
+        ('recipes', '0012_rank'),
+    ]
+
+    operations = [
+        migrations.RunPython(count_usage, migrations.RunPython.noop),
+    ]
@@ -1,17 +1,19 @@
+import json
 import logging
 
 import toml as hjson
 import mistune
 import urllib.parse
 import base64
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.template import loader
 from django.urls import reverse
 from django.utils import timezone
 from django.conf import settings
-from biostar.accounts.models import User
+from biostar.accounts.models import User, Profile
 from . import util
 from .const import *
 
@@ -22,6 +24,35 @@ def join(*args):
     return os.path.abspath(os.path.join(*args))
 
 
+def flush_counts(connection):
+    """
+    Updates the counts of the projects waiting for the commit on the connection.
+    """
+    pending, connection.pending_counts = getattr(connection, 'pending_counts', {}), {}
+    for project in pending.values():
+        project.set_counts()
+
+
+def refresh_counts(project):
+    """
+    Updates the counts of a project once the current transaction commits.
+    Calls made within the same transaction are merged into one update per project.
+    """
+    connection = transaction.get_connection()
+
+    # Outside of transactions the counts are updated right away.
+    if not connection.in_atomic_block:
+        project.set_counts()
+        return
+
+    # The first callback that runs updates every waiting project, the others find none.
+    # Projects left by a rollback are counted again with the next commit.
+    if not hasattr(connection, 'pending_counts'):
+        connection.pending_counts = {}
+    connection.pending_counts[project.id] = project
+    transaction.on_commit(lambda: flush_counts(connection))
+
+
 class Bunch(object):
     def __init__(self, **kwargs):
         self.__dict__.update(kwargs)
@@ -352,6 +383,37 @@ class Data(models.Model):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
+        # Set when the files change, saves that only edit the metadata keep the table of contents.
+        self.files_changed = False
+
+        # The owner and the upload usage counted for them, new data is not counted yet.
+        self.counted_usage = (None, 0)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        data = super().from_db(db, field_names, values)
+        data.counted_usage = (data.owner_id, data.upload_usage())
+        return data
+
+    def upload_usage(self):
+        "The space taken from the upload limit of the owner"
+        return (self.size or 0) if self.method == Data.UPLOAD else 0
+
+    def update_usage(self, usage=None):
+        """
+        Adds the change in upload usage since the data was last counted to its owner.
+        """
+        usage = self.upload_usage() if usage is None else usage
+        owner_id, counted = self.counted_usage
+
+        changes = {owner_id: -counted}
+        changes[self.owner_id] = changes.get(self.owner_id, 0) + usage
+        for user_id, delta in changes.items():
+            if user_id and delta:
+                Profile.objects.filter(user_id=user_id).update(upload_usage=F('upload_usage') + delta)
+
+        self.counted_usage = (self.owner_id, usage)
+
     def save(self, *args, **kwargs):
         now = timezone.now()
         self.name = self.name[:MAX_NAME_LEN]
@@ -366,7 +428,8 @@ class Data(models.Model):
         super(Data, self).save(*args, **kwargs)
 
         # Set the counts
-        self.project.set_counts(save=True)
+        refresh_counts(self.project)
+        self.update_usage()
 
     def peek(self):
         """
@@ -412,28 +475,62 @@ class Data(models.Model):
     def get_path(self):
         return self.toc
 
+    def get_index(self):
+        "The file sizes and directory times of the last table of contents"
+        return f"{self.get_path()}.json"
+
+    def files_version(self):
+        """
+        Changes each time the table of contents is made, that is each time the files change.
+        Returns None before the first table of contents.
+        """
+        try:
+            stat = os.stat(self.get_index())
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
     def make_toc(self):
 
         tocname = self.get_path()
+        indexname = self.get_index()
 
-        collect = util.findfiles(self.get_data_dir(), collect=[])
-
-        # Create a sorted file path collection.
-        collect.sort()
-        # Write the table of contents.
-        with open(tocname, 'w') as fp:
-            fp.write("\n".join(collect))
+        try:
+            with open(indexname, 'rt') as fp:
+                index = json.load(fp)
+        except (OSError, ValueError):
+            index = {}
+
+        # Only the directories that changed since the last time are listed.
+        current = util.scan_tree(self.get_data_dir(), index=index)
+
+        files = {}
+        for entry in current.values():
+            files.update(entry['files'])
+
+        if current != index or not os.path.isfile(tocname):
+            # Create a sorted file path collection.
+            collect = sorted(files)
+            # Write the table of contents.
+            with open(tocname, 'w') as fp:
+                fp.write("\n".join(collect))
+
+            tmp = f"{indexname}.tmp"
+            with open(tmp, 'wt') as fp:
+                json.dump(current, fp)
+            os.replace(tmp, indexname)
+        else:
+            # The files changed without changing the index, the version still moves.
+            os.utime(indexname)
 
         # Find the cumulative size of the files.
-        size = 0
-        for elem in collect:
-            if os.path.isfile(elem):
-                size += os.stat(elem, follow_symlinks=True).st_size
+        size = sum(files.values())
 
         self.size = size
         self.file = tocname
-        self.file_count = len(collect)
+        self.file_count = len(files)
         Data.objects.filter(id=self.id).update(size=self.size, file=self.file, file_count=self.file_count)
+        self.update_usage()
 
         return tocname
 
@@ -530,6 +627,12 @@ class Analysis(models.Model):
 
     objects = Manager()
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # The json_text as loaded, saves that keep it skip stripping the settings.
+        self.loaded_json = self.__dict__.get('json_text')
+
     def __str__(self):
         return self.name
 
@@ -539,7 +642,7 @@ class Analysis(models.Model):
         Returns the json_text as parsed json_data
         """
         try:
-            json_data = hjson.loads(self.json_text)
+            json_data = util.load_toml(self.json_text)
         except Exception as exc:
             logger.error(f"{exc}. json_text={self.json_text}")
             json_data = {}
@@ -581,7 +684,7 @@ class Analysis(models.Model):
         # Ensure Unix line endings.
         self.template = self.template.replace('\r\n', '\n') if self.template else ""
 
-        self.project.set_counts(save=True)
+        refresh_counts(self.project)
         super(Analysis, self).save(*args, **kwargs)
 
     @property
@@ -46,12 +46,49 @@ MAX_DATA_ADMINS = 10000
 # Maximum amount of items per clipboard
 MAX_CLIPBOARD = 5
 
+# Amount of files shown per page.
+FILES_PER_PAGE = 1000
+
+# Number of directory listings kept in memory.
+LISTING_CACHE_SIZE = 256
+
+# Number of clipboard items pasted in one transaction.
+PASTE_BATCH_SIZE = 100
+
 # Name of the clipboard inside of sessions
 CLIPBOARD_NAME = "clipboard"
 
 # Maximum amount of total running jobs allowed for non-staff user.
 MAX_RUNNING_JOBS = 5
 
+# Number of jobs running at the same time.
+JOB_WORKERS = 4
+
+# Number of jobs of the same user running at the same time.
+JOB_USER_WORKERS = 2
+
+# Resource limits of each job, zero means no limit.
+# Recipes may set their own limits in the json_text, see the job command.
+JOB_TIMEOUT = 24 * 3600
+
+# CPU time in seconds.
+JOB_CPU_LIMIT = 24 * 3600
+
+# Address space in MB.
+JOB_MEMORY_LIMIT = 16 * 1024
+
+# Size of each file written in MB.
+JOB_FILESIZE_LIMIT = 100 * 1024
+
+# Results of the recipes that opt in to caching, see the jobcache module.
+JOB_CACHE_ROOT = join(MEDIA_ROOT, 'cache')
+
+# Total size of the cached results in MB.
+JOB_CACHE_MAX_SIZE = 50 * 1024
+
+# Cached results unused for this many days are removed.
+JOB_CACHE_MAX_AGE = 30
+
 # Maximum amount of cumulative uploaded files a user is allowed, in mega-bytes.
 MAX_UPLOAD_SIZE = 10
 
@@ -4,9 +4,9 @@ import logging
 import mistune
 import toml
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from biostar.recipes.models import Project, Access, Analysis, Job, Data
+from biostar.recipes.models import Project, Access, Analysis, Job, Data, refresh_counts
 from biostar.recipes import util, auth
 
 logger = logging.getLogger("engine")
@@ -29,10 +29,17 @@ def update_access(sender, instance, created, raw, update_fields, **kwargs):
         entry = Access.objects.create(user=instance.owner, project=instance, access=Access.WRITE_ACCESS)
 
 
+@receiver(post_save, sender=Access)
+@receiver(post_delete, sender=Access)
+def clear_access(sender, **kwargs):
+    # Access levels loaded earlier are stale.
+    auth.clear_access()
+
+
 def strip_json(json_text):
     """
-    Strip settings parameter in json_text to only contain execute options
-    Deletes the 'settings' parameter if there are no execute options.
+    Strip settings parameter in json_text to only contain execute, create and limits options
+    Deletes the 'settings' parameter if there are no such options.
     """
 
     try:
@@ -44,11 +51,14 @@ def strip_json(json_text):
     # Fetch the execute options
     execute_options = local_dict.get('settings', {}).get('execute', {})
     data_options = local_dict.get('settings', {}).get('create', {})
+    limit_options = local_dict.get('settings', {}).get('limits', {})
 
     # Check to see if it is present
-    if execute_options or data_options:
+    if execute_options or data_options or limit_options:
         # Strip run settings of every thing but execute options
         local_dict['settings'] = dict(execute=execute_options, create=data_options)
+        if limit_options:
+            local_dict['settings']['limits'] = limit_options
     else:
         # NOTE: Delete 'settings' from json text
         local_dict['settings'] = ''
@@ -132,8 +142,10 @@ def finalize_recipe(sender, instance, created, raw, update_fields, **kwargs):
     # Update the last edit date and user of project
     user = instance.lastedit_user
 
-    # Strip json text of 'settings' parameter
-    instance.json_text = strip_json(instance.json_text)
+    # Strip json text of 'settings' parameter when it changed since it was loaded.
+    if created or instance.json_text != instance.loaded_json:
+        instance.json_text = strip_json(instance.json_text)
+    instance.loaded_json = instance.json_text
     Project.objects.filter(id=instance.project.id).update(lastedit_date=instance.lastedit_date,
                                                           lastedit_user=user)
 
@@ -142,14 +154,14 @@ def finalize_recipe(sender, instance, created, raw, update_fields, **kwargs):
         instance.update_children()
 
     # Update the project count and last edit date when job is created
-    instance.project.set_counts()
+    refresh_counts(instance.project)
 
 
 @receiver(post_save, sender=Job)
 def finalize_job(sender, instance, created, raw, update_fields, **kwargs):
 
     # Update the project count.
-    instance.project.set_counts()
+    refresh_counts(instance.project)
 
     if created:
         # Generate friendly uid
@@ -166,6 +178,12 @@ def finalize_job(sender, instance, created, raw, update_fields, **kwargs):
                                                   text=instance.text, html=instance.html)
 
 
+@receiver(post_delete, sender=Data)
+def remove_usage(sender, instance, **kwargs):
+    # The data no longer takes upload space.
+    instance.update_usage(usage=0)
+
+
 @receiver(post_save, sender=Data)
 def finalize_data(sender, instance, created, raw, update_fields, **kwargs):
 
@@ -173,7 +191,7 @@ def finalize_data(sender, instance, created, raw, update_fields, **kwargs):
     Project.objects.filter(id=instance.project.id).update(lastedit_user=instance.lastedit_user,
                                                           lastedit_date=instance.lastedit_date)
     # Update the project count.
-    instance.project.set_counts()
+    refresh_counts(instance.project)
 
     if created:
         # Generate friendly uid
@@ -197,4 +215,7 @@ def finalize_data(sender, instance, created, raw, update_fields, **kwargs):
         # Update the dir, toc, and uid.
         Data.objects.filter(id=instance.id).update(uid=instance.uid, dir=instance.dir, toc=instance.toc)
 
-    instance.make_toc()
+    # Saves that only edit the metadata keep the table of contents.
+    if created or instance.files_changed:
+        instance.make_toc()
+        instance.files_changed = False
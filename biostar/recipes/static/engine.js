@@ -19,11 +19,25 @@ function change_state(job, data) {
     }
     // Update the image, stdout, and stderr.
     image.replaceWith(data.img_tmpl);
-    stdout.text(data.stdout);
-    stderr.text(data.stderr);
+    update_log(stdout, data.stdout, data.stdout_offset, data.stdout_skipped);
+    update_log(stderr, data.stderr, data.stderr_offset, data.stderr_skipped);
 
 }
 
+function update_log(elem, text, offset, skipped) {
+    // Logs are only sent to pages that show them.
+    if (text === null || text === undefined) {
+        return
+    }
+    // Append the new text, unless the log skipped ahead.
+    if (skipped) {
+        elem.text(text);
+    } else {
+        elem.append(document.createTextNode(text));
+    }
+    elem.data('offset', offset);
+}
+
 function trigger_running(job, data) {
 
     var loader = $('#stdout .loader');
@@ -44,6 +58,20 @@ function trigger_running(job, data) {
 }
 
 
+function log_offsets(state) {
+    // Ask for the log bytes after the ones already shown.
+    var data = {'state': state};
+    var stdout = $('#stdout pre:first');
+    var stderr = $('#stderr');
+    if (stdout.length) {
+        data['stdout_offset'] = stdout.data('offset') || 0;
+    }
+    if (stderr.length) {
+        data['stderr_offset'] = stderr.data('offset') || 0;
+    }
+    return data
+}
+
 function check_jobs() {
 
     // Look at each job with a 'check_back' tag
@@ -65,7 +93,7 @@ function check_jobs() {
         $.ajax('/ajax/check/job/{0}/'.format(uid), {
             type: 'GET',
             dataType: 'json',
-            data: {'state': state},
+            data: log_offsets(state),
             ContentType: 'application/json',
             success: function (data) {
 
@@ -2,8 +2,12 @@
 This is active only when deployed via UWSGI
 '''
 
-import logging, time, shutil, subprocess
+import logging, time, shutil, subprocess, threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from django.conf import settings
 from django.core import management
+from django.db import connection
 from biostar.utils.decorators import task, timer
 
 import time
@@ -33,18 +37,133 @@ def send_emails(*args ,**kwargs):
 #     logger.info('TESTING'*10)
 #
 
+# The local pool running the jobs, keyed by the number of workers.
+POOLS = {}
+
+# The jobs submitted to the local pool and not yet finished.
+FUTURES = set()
+
+LOCK = threading.Lock()
+
+
+def claim_job(job_id, limit=None, per_user=None):
+    """
+    Moves a queued job to SPOOLED, returns False when the job was claimed already.
+    With limits the job is claimed only while fewer than limit jobs are active
+    and fewer than per_user jobs of its owner are active.
+    """
+    from biostar.recipes.models import Job
+
+    if limit or per_user:
+        # Spooled and running jobs count towards the limits.
+        active = Job.objects.filter(state__in=[Job.SPOOLED, Job.RUNNING])
+        owner_id = Job.objects.filter(id=job_id).values_list('owner_id', flat=True).first()
+        if limit and active.count() >= limit:
+            return False
+        if per_user and active.filter(owner_id=owner_id).count() >= per_user:
+            return False
+
+    # Only one of the concurrent schedulers changes the state of a queued job.
+    return bool(Job.objects.filter(id=job_id, state=Job.QUEUED).update(state=Job.SPOOLED))
+
+
+def claim_jobs(limit, per_user):
+    """
+    Moves the oldest queued jobs to SPOOLED while fewer than limit jobs are active
+    and fewer than per_user jobs of their owner are active.
+    Returns the ids of the claimed jobs.
+    """
+    from biostar.recipes.models import Job
+
+    # Spooled and running jobs count towards the limits.
+    active = Counter(Job.objects.filter(state__in=[Job.SPOOLED, Job.RUNNING]).values_list('owner_id', flat=True))
+    limit -= sum(active.values())
+    if limit <= 0:
+        return []
+
+    # The cursor is closed before the updates.
+    queued = list(Job.objects.filter(state=Job.QUEUED).order_by('id').values_list('id', 'owner_id'))
+
+    claimed = []
+    for job_id, owner_id in queued:
+        if len(claimed) >= limit:
+            break
+        if active[owner_id] >= per_user:
+            continue
+
+        if claim_job(job_id):
+            claimed.append(job_id)
+            active[owner_id] += 1
+
+    return claimed
+
+
+def run_job(job_id):
+    """
+    Runs a claimed job in a worker of the local pool.
+    """
+    try:
+        management.call_command('job', id=job_id)
+    except Exception as exc:
+        logger.error(f"job id={job_id} error {exc}")
+    finally:
+        # Each worker thread has its own database connection.
+        connection.close()
+
+
+def submit_jobs(workers=None, per_user=None):
+    """
+    Claims queued jobs for the free workers of the local pool.
+    Returns the number of submitted jobs.
+    """
+    workers = workers or settings.JOB_WORKERS
+    per_user = per_user or settings.JOB_USER_WORKERS
+
+    with LOCK:
+        if workers not in POOLS:
+            POOLS[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        pool = POOLS[workers]
+
+        FUTURES.difference_update([f for f in FUTURES if f.done()])
+
+        # The jobs of the pool are active, the limit covers them.
+        free = workers - len(FUTURES)
+        job_ids = claim_jobs(limit=workers, per_user=per_user) if free > 0 else []
+
+        for job_id in job_ids:
+            FUTURES.add(pool.submit(run_job, job_id))
+
+    return len(job_ids)
+
+
+def run_jobs(workers=None, per_user=None, timeout=None):
+    """
+    Runs the queued jobs in the local pool until none are left.
+    Queued jobs are claimed each time a job finishes, or every timeout seconds.
+    """
+    while True:
+        submit_jobs(workers=workers, per_user=per_user)
+        with LOCK:
+            pending = [f for f in FUTURES if not f.done()]
+        if not pending:
+            break
+        wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+
 @timer(30)
 def scheduler(*args, **kwargs):
     try:
-        from biostar.recipes.models import Job
-        # Check for queued jobs.
-        jobs = Job.objects.filter(state=Job.QUEUED)
-        if jobs:
-            # Put the jobs in SPOOLED state so that it do not get respooled.
-            for job in jobs:
-                execute_job.spool(job_id=job.id)
-
-            jobs.update(state=Job.SPOOLED)
+        # The blocking runner starts the jobs in the views, the job command runs the leftovers.
+        if settings.TASK_RUNNER == 'block':
+            return
+
+        # The spooler and celery run the jobs in their own workers.
+        if settings.TASK_RUNNER in ('uwsgi', 'celery'):
+            for job_id in claim_jobs(limit=settings.JOB_WORKERS, per_user=settings.JOB_USER_WORKERS):
+                execute_job.spool(job_id=job_id)
+        else:
+            # Runs in the timer thread until the queue is empty.
+            run_jobs(timeout=30)
     except Exception as exc:
         logger.error(exc)
 
@@ -79,14 +198,8 @@ def execute_job(job_id):
     Execute job in spooler.
     """
     logger.info(f"Executing spooled job id={job_id}")
-    from biostar.recipes.models import Job
-
-    # Spend 3 seconds in queued state.
-    time.sleep(3)
-    Job.objects.filter(id=job_id).update(state=Job.SPOOLED)
-    # Spend 3 seconds in spooled state
-    time.sleep(3)
 
+    # The job has been claimed by the scheduler or the view.
     management.call_command('job', id=job_id)
 
 #
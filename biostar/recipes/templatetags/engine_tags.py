@@ -120,12 +120,12 @@ def access_class(user, project):
     if user.is_anonymous:
         return ""
 
-    if user == project.owner:
+    if user.id == project.owner_id:
         return "write_access"
 
-    obj = Access.objects.filter(user=user, project=project).first()
+    levels = auth.access_levels(user).get(project.id)
 
-    return obj.access if obj else ""
+    return levels[0] if levels else ""
 
 
 @register.simple_tag
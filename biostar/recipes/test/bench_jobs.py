@@ -0,0 +1,79 @@
+"""
+Benchmarks running queued jobs one after the other against the local pool.
+
+    python manage.py test biostar.recipes.test.bench_jobs --settings biostar.server.test_settings
+
+Set BENCH_JOBS to change the number of jobs (default 100),
+BENCH_WORKERS to change the size of the pool (default 8)
+and BENCH_SLEEP to change the seconds each job sleeps (default 0.2).
+"""
+import logging
+import os
+import time
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core import management
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+
+from biostar.recipes import auth, models, tasks
+from biostar.utils.helpers import get_uuid
+
+logger = logging.getLogger('engine')
+
+BENCH_JOBS = int(os.environ.get("BENCH_JOBS", 100))
+BENCH_WORKERS = int(os.environ.get("BENCH_WORKERS", 8))
+BENCH_SLEEP = float(os.environ.get("BENCH_SLEEP", 0.2))
+
+TEST_ROOT = os.path.join(settings.BASE_DIR, 'export', 'tested')
+
+
+@override_settings(MEDIA_ROOT=TEST_ROOT)
+class JobBench(TransactionTestCase):
+
+    def setUp(self):
+        logger.setLevel(logging.WARNING)
+
+        # The in-memory test database exists in this connection only, the workers share it.
+        shared = connections['default']
+        shared.inc_thread_sharing()
+        run_job = tasks.run_job
+
+        def shared_run(job_id):
+            connections['default'] = shared
+            run_job(job_id)
+
+        patcher = patch.object(tasks, "run_job", shared_run)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(shared.dec_thread_sharing)
+        self.owner = models.User.objects.create_user(username=f"bench{get_uuid(10)}", email="bench@l.com")
+        project = auth.create_project(user=self.owner, name="bench", text="Text", summary="summary")
+        self.recipe = auth.create_analysis(project=project, json_text="", template=f"sleep {BENCH_SLEEP}",
+                                           security=models.Analysis.AUTHORIZED)
+
+    def make_jobs(self):
+        return [auth.create_job(analysis=self.recipe, user=self.owner) for idx in range(BENCH_JOBS)]
+
+    def test_throughput(self):
+
+        # One job at a time, as the spooler without the fixed sleeps.
+        jobs = self.make_jobs()
+        start = time.time()
+        for job in jobs:
+            management.call_command('job', id=job.id)
+        single = BENCH_JOBS / (time.time() - start)
+
+        # The pool claims the next job as soon as a worker is free.
+        self.make_jobs()
+        start = time.time()
+        tasks.run_jobs(workers=BENCH_WORKERS, per_user=BENCH_WORKERS)
+        pooled = BENCH_JOBS / (time.time() - start)
+
+        self.assertFalse(models.Job.objects.exclude(state=models.Job.COMPLETED).exists())
+
+        print()
+        print(f"jobs: {BENCH_JOBS}, sleep: {BENCH_SLEEP}s")
+        print(f"one at a time: {single:.1f} jobs/s")
+        print(f"pool of {BENCH_WORKERS} workers: {pooled:.1f} jobs/s")
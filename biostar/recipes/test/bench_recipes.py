@@ -0,0 +1,102 @@
+"""
+Benchmarks rendering a recipe list and reading the recipe parameters.
+
+    python manage.py test biostar.recipes.test.bench_recipes --settings biostar.server.test_settings
+
+Set BENCH_RECIPES to change the number of recipes (default 500).
+"""
+import logging
+import os
+import time
+
+import toml
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from biostar.recipes import auth, models, util, views
+from biostar.utils.helpers import fake_request, get_uuid
+
+logger = logging.getLogger('engine')
+
+BENCH_RECIPES = int(os.environ.get("BENCH_RECIPES", 500))
+
+TEST_ROOT = os.path.join(settings.BASE_DIR, 'export', 'tested')
+
+# The parameters of the starter recipe.
+JSON_TEXT = """
+[readlen]
+label = "Read Length"
+display = "INTEGER"
+value = 250
+range = [ 70, 100000,]
+
+[instrument]
+label = "Select Instrument"
+display = "DROPDOWN"
+choices = [ [ "hiseq", "Illumina Hiseq",], [ "pacbio", "Pacific BioSciences Sequel",], [ "minion", "Oxford Nanopor Minion",],]
+value = "pacbio"
+
+[reference]
+label = "Reference Genome"
+display = "DROPDOWN"
+type = "FASTA"
+source = "PROJECT"
+value = "Genome.fa"
+
+[settings]
+name = "Starter Recipe"
+summary = "This recipe can be a starting point for other recipes."
+help = '''
+# Help
+
+Use this recipe to create new recipes.
+'''
+"""
+
+
+def timed(func):
+    start = time.time()
+    func()
+    return time.time() - start
+
+
+@override_settings(MEDIA_ROOT=TEST_ROOT, PER_PAGE=BENCH_RECIPES)
+class RecipeBench(TestCase):
+
+    def setUp(self):
+        logger.setLevel(logging.WARNING)
+
+        self.owner = models.User.objects.create_user(username=f"bench{get_uuid(10)}", email="bench@l.com",
+                                                     is_staff=True)
+        self.project = auth.create_project(user=self.owner, name="bench", uid=f"bench-{get_uuid(6)}")
+        for idx in range(BENCH_RECIPES):
+            json_text = f"{JSON_TEXT}\n# Recipe {idx}\n"
+            auth.create_analysis(project=self.project, name=f"recipe {idx}", json_text=json_text)
+
+    def read_params(self):
+        for recipe in models.Analysis.objects.filter(project=self.project).select_related('project', 'root'):
+            recipe.json_data
+
+    def test_recipe_list(self):
+        recipes = list(models.Analysis.objects.filter(project=self.project))
+
+        # Parsing every text as before.
+        parsed = timed(lambda: [toml.loads(recipe.json_text) for recipe in recipes])
+
+        util.TOML_CACHE.clear()
+        cold = timed(self.read_params)
+        warm = timed(self.read_params)
+
+        # Saves that keep the text.
+        saved = timed(lambda: [recipe.save() for recipe in recipes])
+
+        request = fake_request(url="/", method="GET", data={}, user=self.owner)
+        rendered = timed(lambda: views.recipe_list(request, uid=self.project.uid))
+
+        print()
+        print(f"recipes: {BENCH_RECIPES}")
+        print(f"toml parse: {parsed * 1000:.0f}ms")
+        print(f"json_data cold: {cold * 1000:.0f}ms")
+        print(f"json_data cached: {warm * 1000:.0f}ms")
+        print(f"save: {saved * 1000:.0f}ms")
+        print(f"recipe list: {rendered * 1000:.0f}ms")
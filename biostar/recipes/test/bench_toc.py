@@ -0,0 +1,78 @@
+"""
+Benchmarks saving a Data with a large directory.
+
+    python manage.py test biostar.recipes.test.bench_toc --settings biostar.server.test_settings
+
+Set BENCH_FILES to change the number of files (default 200000), in directories of 1000 files.
+"""
+import logging
+import os
+import shutil
+import time
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from biostar.recipes import auth, models
+from biostar.utils.helpers import get_uuid
+
+logger = logging.getLogger('engine')
+
+BENCH_FILES = int(os.environ.get("BENCH_FILES", 200000))
+
+TEST_ROOT = os.path.join(settings.BASE_DIR, 'export', 'tested', 'bench-toc')
+TOC_ROOT = os.path.join(TEST_ROOT, 'toc')
+
+
+def timed(func):
+    start = time.time()
+    func()
+    return time.time() - start
+
+
+@override_settings(MEDIA_ROOT=TEST_ROOT, TOC_ROOT=TOC_ROOT)
+class TocBench(TestCase):
+
+    def setUp(self):
+        logger.setLevel(logging.WARNING)
+        shutil.rmtree(TEST_ROOT, ignore_errors=True)
+        os.makedirs(TOC_ROOT)
+
+        owner = models.User.objects.create_user(username=f"bench{get_uuid(10)}", email="bench@l.com")
+        project = auth.create_project(user=owner, name="bench", text="Text", summary="summary")
+        self.data = auth.create_data(project=project, name="bench")
+
+        for idx in range(BENCH_FILES):
+            path = os.path.join(self.data.dir, f"dir{idx // 1000}")
+            if idx % 1000 == 0:
+                os.makedirs(path)
+            open(os.path.join(path, f"file{idx}.txt"), 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(TEST_ROOT, ignore_errors=True)
+
+    def test_save_latency(self):
+        data = self.data
+
+        def files_changed():
+            data.files_changed = True
+            data.save()
+
+        # Every directory is listed.
+        full = timed(files_changed)
+
+        # A file added to one directory.
+        open(os.path.join(data.dir, "dir0", "added.txt"), 'w').close()
+        incremental = timed(files_changed)
+
+        # Only the name changes.
+        data.name = "renamed"
+        metadata = timed(data.save)
+
+        self.assertEqual(models.Data.objects.get(pk=data.pk).file_count, BENCH_FILES + 1)
+
+        print()
+        print(f"files: {BENCH_FILES}")
+        print(f"full scan: {full * 1000:.0f}ms")
+        print(f"one directory changed: {incremental * 1000:.0f}ms")
+        print(f"metadata only: {metadata * 1000:.0f}ms")
@@ -0,0 +1,108 @@
+"""
+Benchmarks writing an uploaded stream into a data file.
+
+    python manage.py test biostar.recipes.test.bench_upload --settings biostar.server.test_settings
+
+Set BENCH_SIZE to change the size of the upload in MB (default 1024)
+and BENCH_SPARSE to change the size of the sparse upload in GB (default 3).
+"""
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from biostar.recipes import util
+
+BENCH_SIZE = int(os.environ.get("BENCH_SIZE", 1024))
+
+BENCH_SPARSE = int(os.environ.get("BENCH_SPARSE", 3))
+
+TEST_ROOT = os.path.join(settings.BASE_DIR, 'export', 'tested', 'bench-upload')
+
+
+def timed(func):
+    start = time.time()
+    func()
+    return time.time() - start
+
+
+def line_copy(stream, dest):
+    """
+    Copies the stream line by line through a temporary file, as the upload did before.
+    """
+    tmp = tempfile.NamedTemporaryFile(mode="w+b")
+    for line in stream:
+        tmp.write(line)
+    tmp.flush()
+    tmp.seek(0)
+    with open(dest, "w+b", buffering=util.CHUNK) as fp:
+        for line in tmp:
+            fp.write(line)
+    tmp.close()
+
+
+class UploadBench(SimpleTestCase):
+
+    def setUp(self):
+        shutil.rmtree(TEST_ROOT, ignore_errors=True)
+        os.makedirs(TEST_ROOT)
+
+        # Sequencing reads, lines of a few hundred bytes.
+        self.source = os.path.join(TEST_ROOT, "reads.fq")
+        record = b"@read\n" + b"ACGT" * 50 + b"\n+\n" + b"I" * 200 + b"\n"
+        block = record * (util.CHUNK // len(record))
+        with open(self.source, 'wb') as fp:
+            for _ in range(BENCH_SIZE):
+                fp.write(block)
+
+    def tearDown(self):
+        shutil.rmtree(TEST_ROOT, ignore_errors=True)
+
+    def copy(self, func):
+        with open(self.source, 'rb') as stream:
+            func(stream=stream, dest=os.path.join(TEST_ROOT, "dest.fq"))
+
+    def test_upload(self):
+        size = os.path.getsize(self.source) / 1024 / 1024
+
+        before = timed(lambda: self.copy(line_copy))
+        after = timed(lambda: self.copy(util.copy_stream))
+
+        self.assertEqual(os.path.getsize(os.path.join(TEST_ROOT, "dest.fq")), os.path.getsize(self.source))
+
+        print()
+        print(f"size: {size:.0f}MB")
+        print(f"line copy: {before * 1000:.0f}ms, {size / before:.0f}MB/s")
+        print(f"chunked stream: {after * 1000:.0f}ms, {size / after:.0f}MB/s")
+
+    def test_sparse(self):
+        # A sparse file of several gigabytes with content at both ends.
+        size = BENCH_SPARSE * 1024 ** 3
+        source = os.path.join(TEST_ROOT, "sparse.bin")
+        with open(source, 'wb') as fp:
+            fp.write(b"start")
+            fp.seek(size - 3)
+            fp.write(b"end")
+
+        dest = os.path.join(TEST_ROOT, "sparse-dest.bin")
+        with open(source, 'rb') as stream:
+            over = timed(lambda: self.assertRaises(util.UploadLimitError, util.copy_stream, stream=stream,
+                                                   dest=dest, limit=size // 2))
+        self.assertFalse(os.path.exists(dest))
+
+        with open(source, 'rb') as stream:
+            elapsed = timed(lambda: util.copy_stream(stream=stream, dest=dest, limit=size))
+
+        self.assertEqual(os.path.getsize(dest), size)
+        with open(dest, 'rb') as fp:
+            self.assertEqual(fp.read(5), b"start")
+            fp.seek(size - 3)
+            self.assertEqual(fp.read(), b"end")
+
+        print()
+        print(f"sparse size: {BENCH_SPARSE}GB")
+        print(f"over the limit: {over * 1000:.0f}ms")
+        print(f"chunked stream: {elapsed * 1000:.0f}ms, {size / 1024 / 1024 / elapsed:.0f}MB/s")
@@ -4,10 +4,12 @@ import json
 from unittest.mock import patch, MagicMock
 
 from django.conf import settings
+from django.db import connection
 from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from biostar.recipes import models, auth, ajax
+from biostar.recipes import models, auth, ajax, util
 from biostar.utils.helpers import fake_request, get_uuid
 
 TEST_ROOT = os.path.abspath(os.path.join(settings.BASE_DIR, 'export', 'tested'))
@@ -68,6 +70,61 @@ class AjaxTest(TestCase):
         json_response = ajax.check_job(request=request, uid=self.job.uid)
         self.process_response(json_response)
 
+    def test_check_job_tail(self):
+        """
+        Test polling a running job reads only the log bytes written since the last poll
+        """
+        path = os.path.join(self.job.path, settings.JOB_STDOUT)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = 100 * 1024 * 1024
+        with open(path, 'wb') as fp:
+            fp.truncate(size)
+        models.Job.objects.filter(pk=self.job.pk).update(state=models.Job.RUNNING)
+
+        url = reverse('ajax_check_job', kwargs=dict(uid=self.job.uid))
+
+        def poll(offset):
+            data = {'state': models.Job.RUNNING, 'stdout_offset': offset, 'stderr_offset': 0}
+            request = fake_request(url=url, data=data, user=self.owner, method='GET')
+            with CaptureQueriesContext(connection) as queries:
+                response = ajax.check_job(request=request, uid=self.job.uid)
+            return json.loads(response.content), len(queries)
+
+        # The first poll skips to the end of the log.
+        data, count = poll(0)
+        self.assertEqual(data['stdout_offset'], size)
+        self.assertEqual(data['stdout_skipped'], size - util.CHUNK)
+        self.assertEqual(len(data['stdout']), util.CHUNK)
+
+        offset = data['stdout_offset']
+        for idx in range(3):
+            with open(path, 'a') as fp:
+                fp.write(f"line {idx}\n")
+            data, queries = poll(offset)
+            self.assertEqual(data['stdout'], f"line {idx}\n")
+            self.assertEqual(data['stdout_skipped'], 0)
+            self.assertEqual(queries, count)
+            offset = data['stdout_offset']
+
+        # The logs are saved by the job when it finishes.
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.stdout_log, "")
+        os.remove(path)
+
+    def test_read_log(self):
+        """
+        Test a character split between two reads is returned whole
+        """
+        path = os.path.join(TEST_ROOT, f"log-{get_uuid(6)}.txt")
+        with open(path, 'wb') as fp:
+            fp.write(b"caf\xc3")
+        self.assertEqual(util.read_log(path), ("caf", 3, 0))
+
+        with open(path, 'ab') as fp:
+            fp.write(b"\xa9!")
+        self.assertEqual(util.read_log(path, offset=3), ("\u00e9!", 6, 0))
+        os.remove(path)
+
     def test_copy_file(self):
         """
         Test AJAX function used to copy file
@@ -1,12 +1,19 @@
+import glob
+import hashlib
+import io
 import logging
 import os
+import random
+import shutil
 from unittest.mock import patch, MagicMock
 
 from django.conf import settings
-from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 
-from biostar.recipes import models, views, auth, const, ajax
+from biostar.recipes import models, views, auth, const, ajax, util
 from biostar.utils.helpers import fake_request, get_uuid
 
 TEST_ROOT = os.path.abspath(os.path.join(settings.BASE_DIR, 'export', 'tested'))
@@ -35,6 +42,208 @@ class DataViewTest(TestCase):
         # Set up generic data for editing
         self.data = auth.create_data(project=self.project, path=__file__, name="tested")
 
+    def test_toc(self):
+        "Test the table of contents lists again only the changed directories"
+        data = auth.create_data(project=self.project, name="toc")
+
+        # Directories of earlier test runs are reused.
+        shutil.rmtree(data.dir)
+        os.makedirs(data.dir)
+        for idx in range(3):
+            os.makedirs(os.path.join(data.dir, f"dir{idx}"))
+            with open(os.path.join(data.dir, f"dir{idx}", "file.txt"), 'wt') as fp:
+                fp.write("x" * idx)
+        data.make_toc()
+        self.assertEqual(data.file_count, 3)
+        self.assertEqual(data.size, 3)
+
+        # A file added to a single directory.
+        with open(os.path.join(data.dir, "dir1", "more.txt"), 'wt') as fp:
+            fp.write("more")
+
+        with patch('os.scandir', wraps=os.scandir) as scandir:
+            data.files_changed = True
+            data.save()
+            self.assertEqual([call.args[0] for call in scandir.call_args_list], [os.path.join(data.dir, "dir1")])
+
+        data.refresh_from_db()
+        self.assertEqual(data.file_count, 4)
+        self.assertEqual(data.size, 7)
+        self.assertIn(os.path.join(data.dir, "dir1", "more.txt"), data.get_files())
+
+        # The target of a link rewritten in place keeps the time of the directory of the link.
+        target = os.path.join(TEST_ROOT, f"linked-{get_uuid(6)}.txt")
+        with open(target, 'wt') as fp:
+            fp.write("x" * 2)
+        os.symlink(target, os.path.join(data.dir, "dir2", "linked.txt"))
+        data.files_changed = True
+        data.save()
+        data.refresh_from_db()
+        self.assertEqual(data.size, 9)
+
+        with open(target, 'wt') as fp:
+            fp.write("x" * 10)
+
+        # Only the link is checked again.
+        with patch.object(util, 'file_size', wraps=util.file_size) as file_size:
+            data.files_changed = True
+            data.save()
+            self.assertEqual([call.args[0] for call in file_size.call_args_list],
+                             [os.path.join(data.dir, "dir2", "linked.txt")])
+
+        data.refresh_from_db()
+        self.assertEqual(data.size, 17)
+        os.remove(target)
+
+        # Editing the metadata does not look at the files.
+        with patch.object(util, 'scan_tree', wraps=util.scan_tree) as scan_tree:
+            data.name = "renamed"
+            data.save()
+            self.assertFalse(scan_tree.called)
+
+    def test_write_stream(self):
+        "Test streams are written in chunks, hashed and replace the target at once"
+        root = os.path.join(TEST_ROOT, "streams")
+        shutil.rmtree(root, ignore_errors=True)
+        os.makedirs(root)
+
+        # A few megabytes with content at both ends, read in many small chunks.
+        size = 4 * 1024 * 1024
+        content = b"start" + bytes(size - 8) + b"end"
+
+        dest = os.path.join(root, "dest.bin")
+        with open(dest, 'wt') as fp:
+            fp.write("previous")
+
+        with patch.object(util, 'CHUNK', 4096):
+            # Uploads over the limit keep the previous content.
+            self.assertRaises(util.UploadLimitError, util.copy_stream, stream=io.BytesIO(content), dest=dest,
+                              limit=size // 2)
+            self.assertEqual(open(dest).read(), "previous")
+            self.assertEqual(glob.glob(os.path.join(root, ".*.part")), [])
+
+            written, digest = util.copy_stream(stream=io.BytesIO(content), dest=dest, limit=size)
+
+        self.assertEqual((written, digest), (size, hashlib.sha256(content).hexdigest()))
+        with open(dest, 'rb') as fp:
+            self.assertEqual(fp.read(), content)
+
+        # New files follow the umask of the process.
+        umask = os.umask(0)
+        os.umask(umask)
+        self.assertEqual(os.stat(dest).st_mode & 0o777, 0o666 & ~umask)
+
+        shutil.rmtree(root)
+
+        # Text streams.
+        text = "line\n" * 1000
+        path = os.path.join(self.data.get_data_dir(), "text.txt")
+        written, digest = util.copy_stream(stream=io.StringIO(text), dest=path)
+        self.assertEqual((written, digest), (len(text), hashlib.sha256(text.encode()).hexdigest()))
+        self.assertEqual(open(path).read(), text)
+
+    def test_upload_limit(self):
+        "Test streams over the upload space leave no data behind"
+        count = models.Data.objects.count()
+        stream = io.StringIO("x" * 100)
+        stream.name = "upload.txt"
+
+        self.assertRaises(util.UploadLimitError, auth.create_data, project=self.project, user=self.owner,
+                          stream=stream, limit=10)
+        self.assertEqual(models.Data.objects.count(), count)
+
+    def test_listing(self):
+        "Test the file listing is cached until a directory changes"
+        data = auth.create_data(project=self.project, name="listing")
+        shutil.rmtree(data.dir)
+        os.makedirs(os.path.join(data.dir, "sub"))
+        for name in ("a.txt", "image.png", os.path.join("sub", "b.txt")):
+            with open(os.path.join(data.dir, name), 'wt') as fp:
+                fp.write(name)
+        os.symlink(os.path.join(data.dir, "sub"), os.path.join(data.dir, "link"))
+
+        paths = auth.listing(root=data.dir, version=1)
+        rels = [path[1] for path in paths]
+        self.assertEqual(sorted(rels), ["a.txt", "image.png", "link/b.txt", "sub/b.txt"])
+
+        # Links report the real path, the size of the target and the image flag.
+        byrel = {path[1]: path for path in paths}
+        real, relative, dirs, last, tstamp, size, is_image, parent, is_dir = byrel["link/b.txt"]
+        self.assertEqual(real, os.path.join(os.path.realpath(data.dir), "sub", "b.txt"))
+        self.assertEqual((dirs, last, size, is_dir), (("link",), "b.txt", 9, False))
+        self.assertTrue(byrel["image.png"][6])
+
+        # Unchanged directories are not listed again.
+        with patch('os.scandir', wraps=os.scandir) as scandir:
+            self.assertEqual(auth.listing(root=data.dir, version=1), paths)
+            self.assertFalse(scandir.called)
+
+            with open(os.path.join(data.dir, "sub", "c.txt"), 'wt') as fp:
+                fp.write("c")
+            self.assertEqual(len(auth.listing(root=data.dir, version=1)), 6)
+            self.assertTrue(scandir.called)
+
+        # A file rewritten in place shows with a new version.
+        with open(os.path.join(data.dir, "a.txt"), 'at') as fp:
+            fp.write("more")
+        sizes = {path[1]: path[5] for path in auth.listing(root=data.dir, version=1)}
+        self.assertEqual(sizes["a.txt"], 5)
+        sizes = {path[1]: path[5] for path in auth.listing(root=data.dir, version=2)}
+        self.assertEqual(sizes["a.txt"], 9)
+
+        # Listings without a version are not cached.
+        with patch('os.scandir', wraps=os.scandir) as scandir:
+            auth.listing(root=data.dir)
+            self.assertTrue(scandir.called)
+
+        # The entries of a single directory.
+        nodes = auth.listing(root=data.dir, node=os.path.join(data.dir, "sub"), show_all=False)
+        self.assertEqual([path[1] for path in nodes], ["sub/b.txt", "sub/c.txt"])
+
+    def test_files_version(self):
+        "Test the listing version changes with files rewritten in place with the same size"
+        data = auth.create_data(project=self.project, name="version")
+        path = os.path.join(data.dir, "a.txt")
+        with open(path, 'wt') as fp:
+            fp.write("a")
+        data.files_changed = True
+        data.save()
+
+        version = data.files_version()
+        self.assertIsNotNone(version)
+        listed = {p[1]: p[4] for p in auth.listing(root=data.dir, version=version)}
+
+        # Same size, same directory time, a new modification time of the file.
+        mtime = os.stat(data.dir).st_mtime_ns
+        with open(path, 'wt') as fp:
+            fp.write("b")
+        os.utime(path, ns=(mtime + 10 ** 9, mtime + 10 ** 9))
+        os.utime(data.dir, ns=(mtime, mtime))
+        data.files_changed = True
+        data.save()
+
+        self.assertNotEqual(data.files_version(), version)
+        current = {p[1]: p[4] for p in auth.listing(root=data.dir, version=data.files_version())}
+        self.assertNotEqual(current["a.txt"], listed["a.txt"])
+
+    def test_data_view_pages(self):
+        "Test the file list of a data is paged"
+        data = auth.create_data(project=self.project, name="pages")
+        shutil.rmtree(data.dir)
+        os.makedirs(data.dir)
+        for idx in range(25):
+            open(os.path.join(data.dir, f"file{idx:02d}.txt"), 'w').close()
+
+        url = reverse('data_view', kwargs=dict(uid=data.uid))
+        with self.settings(FILES_PER_PAGE=10):
+            request = fake_request(url=url, data={'page': 3}, user=self.owner, method="GET")
+            response = views.data_view(request=request, uid=data.uid)
+
+        content = response.content.decode()
+        self.assertIn("file24.txt", content)
+        self.assertNotIn("file09.txt", content)
+        self.assertIn("</span> 3 of 3", content)
+
     @patch('biostar.recipes.models.Data.save', MagicMock(name="save"))
     def test_data_edit(self):
         "Test Data edit view with POST request"
@@ -148,3 +357,90 @@ class DataViewTest(TestCase):
 
         self.assertEqual(response.status_code, stat,
                          f"Could not redirect to project view after tested :\nresponse:{response}")
+
+
+@override_settings(MEDIA_ROOT=TEST_ROOT, TOC_ROOT=TOC_ROOT)
+class PasteCountsTest(TransactionTestCase):
+
+    def setUp(self):
+        logger.setLevel(logging.WARNING)
+
+        self.owner = models.User.objects.create_user(username=f"tested{get_uuid(10)}", email="tested@l.com")
+        self.project = auth.create_project(user=self.owner, name="source", uid=f"source-{get_uuid(6)}")
+        self.data = auth.create_data(project=self.project, path=__file__, name="tested")
+
+    def test_paste_counts(self):
+        "Test pasting many data refreshes the project counts once per batch"
+        target = auth.create_project(user=self.owner, name="target", uid=f"target-{get_uuid(6)}")
+        board = (const.COPIED_DATA, [self.data.uid] * 500)
+
+        calls = []
+        set_counts = models.Project.set_counts
+
+        def counted(project, *args, **kwargs):
+            calls.append(project.id)
+            return set_counts(project, *args, **kwargs)
+
+        with patch.object(models.Project, 'set_counts', counted):
+            pasted = auth.paste(project=target, user=self.owner, board=board)
+
+        self.assertEqual(len(pasted), 500)
+        self.assertEqual(calls.count(target.id), 500 // settings.PASTE_BATCH_SIZE)
+
+        # The counts are current after the commit.
+        target.refresh_from_db()
+        self.assertEqual(target.data_count, 500)
+
+
+@override_settings(MEDIA_ROOT=TEST_ROOT, TOC_ROOT=TOC_ROOT)
+class UploadUsageTest(TestCase):
+
+    def setUp(self):
+        logger.setLevel(logging.WARNING)
+
+        self.users = [models.User.objects.create_user(username=f"tested{get_uuid(10)}", email=f"{idx}@l.com")
+                      for idx in range(3)]
+        self.project = auth.create_project(user=self.users[0], name="usage", uid=f"usage-{get_uuid(6)}")
+
+        # Linked data point to this file.
+        self.linked = os.path.join(TEST_ROOT, "linked.txt")
+        with open(self.linked, 'wt') as fp:
+            fp.write("linked")
+
+    def assert_usage(self):
+        for user in self.users:
+            uploads = models.Data.objects.filter(owner=user, method=models.Data.UPLOAD)
+            total = uploads.aggregate(Sum("size"))["size__sum"] or 0
+            user.profile.refresh_from_db()
+            self.assertEqual(user.profile.upload_usage, total)
+
+    def test_usage(self):
+        "Test the upload usage follows randomized create, delete and resize sequences"
+        rand = random.Random(1)
+
+        for step in range(60):
+            action = rand.choice(["upload", "link", "delete", "resize", "owner"])
+            data = models.Data.objects.filter(project=self.project).order_by('?').first()
+
+            if action == "upload" or not data:
+                stream = io.StringIO("x" * rand.randint(0, 5000))
+                stream.name = f"upload{step}.txt"
+                auth.create_data(project=self.project, user=rand.choice(self.users), stream=stream)
+            elif action == "link":
+                auth.create_data(project=self.project, user=rand.choice(self.users), path=self.linked)
+            elif action == "delete":
+                data.delete()
+            elif action == "resize":
+                with open(data.get_files()[0], 'wt') as fp:
+                    fp.write("y" * rand.randint(0, 5000))
+                data.make_toc()
+            else:
+                data.owner = rand.choice(self.users)
+                data.save()
+
+            self.assert_usage()
+
+        # The command corrects counters that drifted.
+        models.Profile.objects.filter(user__in=self.users).update(upload_usage=123)
+        call_command("usage", disk=True)
+        self.assert_usage()
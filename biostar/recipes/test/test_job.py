@@ -1,11 +1,16 @@
 import logging,os
-from django.test import TestCase, override_settings
+import shutil
+import threading
+import time
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
 from unittest.mock import patch, MagicMock
 from django.core import management
 from django.urls import reverse
 from django.conf import settings
 from biostar.recipes import auth, const
-from biostar.recipes import models, views
+from biostar.recipes import models, views, tasks, jobcache
+from biostar.recipes.management.commands import job as job_command
 
 from biostar.utils.helpers import fake_request, get_uuid
 
@@ -13,6 +18,7 @@ logger = logging.getLogger('engine')
 
 TEST_ROOT = os.path.abspath(os.path.join(settings.BASE_DIR, 'export', 'tested'))
 TOC_ROOT = os.path.join(TEST_ROOT, 'toc')
+CACHE_ROOT = os.path.join(TEST_ROOT, 'cache')
 
 # Ensure that the table of directory exists.
 os.makedirs(TOC_ROOT, exist_ok=True)
@@ -112,3 +118,267 @@ class JobViewTest(TestCase):
 
         if save:
             self.assertTrue( models.Job.save.called, "save() method not called")
+
+
+@override_settings(MEDIA_ROOT=TEST_ROOT, TOC_ROOT=TOC_ROOT)
+class JobExecutorTest(TransactionTestCase):
+
+    def setUp(self):
+        logger.setLevel(logging.WARNING)
+
+        # The in-memory test database exists in this connection only, the threads share it.
+        self.shared = connections['default']
+        self.shared.inc_thread_sharing()
+        run_job = tasks.run_job
+
+        def shared_run(job_id):
+            connections['default'] = self.shared
+            run_job(job_id)
+
+        patcher = patch.object(tasks, "run_job", shared_run)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.shared.dec_thread_sharing)
+
+        self.owner = models.User.objects.create_user(username=f"tested{get_uuid(10)}", email="tested@l.com")
+        self.other = models.User.objects.create_user(username=f"tested{get_uuid(10)}", email="other@l.com")
+        self.project = auth.create_project(user=self.owner, name="tested", text="Text", summary="summary")
+
+        # Every run of a job appends its id to the same file.
+        self.runs = os.path.join(TEST_ROOT, f"runs-{get_uuid(6)}.txt")
+        template = f"echo {{{{runtime.job_id}}}} >> {self.runs}"
+        self.recipe = auth.create_analysis(project=self.project, json_text="", template=template,
+                                           security=models.Analysis.AUTHORIZED)
+
+    def tearDown(self):
+        if os.path.isfile(self.runs):
+            os.remove(self.runs)
+
+    def test_run_jobs(self):
+        """Test the pool runs every queued job exactly once"""
+        users = [self.owner, self.other]
+        jobs = [auth.create_job(analysis=self.recipe, user=users[idx % 2]) for idx in range(200)]
+
+        def scheduler():
+            connections['default'] = self.shared
+            tasks.run_jobs(workers=4, per_user=2)
+
+        # A second scheduler claims jobs at the same time.
+        thread = threading.Thread(target=scheduler)
+        thread.start()
+        tasks.run_jobs(workers=8, per_user=4)
+        thread.join()
+
+        states = models.Job.objects.filter(id__in=[job.id for job in jobs]).values_list('state', flat=True)
+        self.assertEqual(set(states), {models.Job.COMPLETED})
+
+        runs = [int(line) for line in open(self.runs)]
+        self.assertEqual(sorted(runs), sorted(job.id for job in jobs))
+
+    def test_claim_limits(self):
+        """Test claiming respects the global and the per user limits"""
+        for idx in range(5):
+            auth.create_job(analysis=self.recipe, user=self.owner)
+            auth.create_job(analysis=self.recipe, user=self.other)
+
+        claimed = tasks.claim_jobs(limit=3, per_user=2)
+        self.assertEqual(len(claimed), 3)
+
+        # The spooled jobs count towards the limit of their owner.
+        claimed += tasks.claim_jobs(limit=10, per_user=2)
+        self.assertEqual(len(claimed), 4)
+
+        spooled = models.Job.objects.filter(state=models.Job.SPOOLED)
+        self.assertEqual(sorted(spooled.values_list('id', flat=True)), sorted(claimed))
+        self.assertEqual(spooled.filter(owner=self.owner).count(), 2)
+
+        # A job claimed by the scheduler is not claimed by the view.
+        self.assertFalse(tasks.claim_job(claimed[0]))
+
+        # The view leaves the job queued when its owner is at the limit.
+        job = auth.create_job(analysis=self.recipe, user=self.owner)
+        self.assertFalse(tasks.claim_job(job.id, limit=10, per_user=2))
+        self.assertFalse(tasks.claim_job(job.id, limit=4, per_user=10))
+        self.assertTrue(tasks.claim_job(job.id, limit=10, per_user=3))
+        claimed.append(job.id)
+
+        # Claimed jobs are not claimed again.
+        models.Job.objects.filter(id__in=claimed).update(state=models.Job.COMPLETED)
+        self.assertFalse(set(claimed) & set(tasks.claim_jobs(limit=10, per_user=10)))
+
+    def test_claim_active(self):
+        """Test active jobs take up the slots of the global limit"""
+        spooled = auth.create_job(analysis=self.recipe, user=self.owner)
+        running = auth.create_job(analysis=self.recipe, user=self.other)
+        models.Job.objects.filter(id=spooled.id).update(state=models.Job.SPOOLED)
+        models.Job.objects.filter(id=running.id).update(state=models.Job.RUNNING)
+
+        for idx in range(5):
+            auth.create_job(analysis=self.recipe, user=self.owner)
+            auth.create_job(analysis=self.recipe, user=self.other)
+
+        # Two of the three slots are taken.
+        self.assertEqual(len(tasks.claim_jobs(limit=3, per_user=10)), 1)
+
+        # The next ticks find every slot taken.
+        self.assertEqual(tasks.claim_jobs(limit=3, per_user=10), [])
+        self.assertEqual(tasks.claim_jobs(limit=2, per_user=10), [])
+
+        # Finished jobs free their slots.
+        models.Job.objects.filter(id__in=[spooled.id, running.id]).update(state=models.Job.COMPLETED)
+        self.assertEqual(len(tasks.claim_jobs(limit=3, per_user=10)), 2)
+
+
+@override_settings(MEDIA_ROOT=TEST_ROOT, TOC_ROOT=TOC_ROOT)
+class JobLimitTest(TestCase):
+
+    def setUp(self):
+        logger.setLevel(logging.WARNING)
+        self.owner = models.User.objects.create_user(username=f"tested{get_uuid(10)}", email="tested@l.com")
+        self.project = auth.create_project(user=self.owner, name="tested", text="Text", summary="summary")
+
+    def run_recipe(self, template, limits):
+        """
+        Runs a recipe with the limits set in its json_text.
+        """
+        json_text = "[settings.limits]\n" + "\n".join(f"{key} = {value}" for key, value in limits.items())
+        recipe = auth.create_analysis(project=self.project, json_text=json_text, template=template,
+                                      security=models.Analysis.AUTHORIZED)
+        job = auth.create_job(analysis=recipe, user=self.owner)
+
+        management.call_command('job', id=job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.state, models.Job.ERROR)
+        return job
+
+    def test_cpu_limit(self):
+        "Test a runaway CPU loop is stopped"
+        job = self.run_recipe("while true; do :; done", limits=dict(cpu=1, timeout=30))
+        self.assertIn("CPU time limit of 1 seconds", job.stderr_log)
+
+    def test_memory_limit(self):
+        "Test a memory hog can not allocate above the limit"
+        job = self.run_recipe("python3 -c 'x = bytearray(2 * 1024 ** 3)'", limits=dict(memory=200, timeout=30))
+        self.assertIn("MemoryError", job.stderr_log)
+        self.assertIn("memory limit of 200 MB", job.stderr_log)
+
+    def test_signals(self):
+        "Test crashes are reported with their signal and exit codes are not read as signals"
+        # The shell that runs the script is stopped.
+        job = self.run_recipe("kill -ABRT $PPID", limits=dict(memory=200, timeout=30))
+        self.assertIn("stopped by signal 6 (SIGABRT)", job.stderr_log)
+        self.assertNotIn("memory limit", job.stderr_log)
+
+        job = self.run_recipe("exit 139", limits=dict(memory=200, timeout=30))
+        self.assertIn("exit status 139", job.stderr_log)
+        self.assertNotIn("signal", job.stderr_log)
+
+        # The limits are blamed only when used up.
+        job = self.run_recipe("exit 152", limits=dict(cpu=10, timeout=30))
+        self.assertNotIn("CPU time limit", job.stderr_log)
+
+    def test_custom_limits(self):
+        "Test the limits of a recipe stay between one and the defaults"
+        custom = dict(cpu=0, memory=-5, filesize=settings.JOB_FILESIZE_LIMIT * 2, timeout=10)
+        limits = job_command.get_limits({"settings": {"limits": custom}})
+        self.assertEqual(limits, dict(cpu=settings.JOB_CPU_LIMIT, memory=settings.JOB_MEMORY_LIMIT,
+                                      filesize=settings.JOB_FILESIZE_LIMIT, timeout=10))
+
+        # Values that are not numbers keep the defaults.
+        custom = dict(cpu="ten", memory=[100], timeout="20")
+        limits = job_command.get_limits({"settings": {"limits": custom}})
+        self.assertEqual(limits, dict(cpu=settings.JOB_CPU_LIMIT, memory=settings.JOB_MEMORY_LIMIT,
+                                      filesize=settings.JOB_FILESIZE_LIMIT, timeout=20))
+
+    def test_filesize_limit(self):
+        "Test infinite output is stopped"
+        job = self.run_recipe("yes", limits=dict(filesize=1, timeout=30))
+        self.assertIn("file size limit of 1 MB", job.stderr_log)
+        self.assertLessEqual(os.path.getsize(os.path.join(job.path, settings.JOB_STDOUT)), 1024 * 1024)
+
+    def test_timeout(self):
+        "Test the process group is killed after the timeout"
+        job = self.run_recipe("sleep 60 & sleep 60", limits=dict(timeout=1))
+        self.assertIn("time limit of 1 seconds", job.stderr_log)
+        self.assertLess((job.end_date - job.start_date).total_seconds(), 30)
+
+
+@override_settings(MEDIA_ROOT=TEST_ROOT, TOC_ROOT=TOC_ROOT, JOB_CACHE_ROOT=CACHE_ROOT)
+class JobCacheTest(TestCase):
+
+    def setUp(self):
+        logger.setLevel(logging.WARNING)
+        shutil.rmtree(CACHE_ROOT, ignore_errors=True)
+        self.owner = models.User.objects.create_user(username=f"tested{get_uuid(10)}", email="tested@l.com")
+        self.project = auth.create_project(user=self.owner, name="tested", text="Text", summary="summary")
+
+        json_text = "[settings.execute]\ncache = true"
+        self.recipe = auth.create_analysis(project=self.project, json_text=json_text,
+                                           template="mkdir -p out && echo hello > out/hello.txt",
+                                           security=models.Analysis.AUTHORIZED)
+
+    def run_job(self):
+        job = auth.create_job(analysis=self.recipe, user=self.owner)
+        management.call_command('job', id=job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.state, models.Job.COMPLETED)
+        return job
+
+    def run_job_file(self, path):
+        job = self.run_job()
+        return open(os.path.join(job.path, path)).read()
+
+    def test_reuse(self):
+        "Test an identical job reuses the results without running the script"
+        from biostar.recipes.management.commands import job as command
+
+        first = self.run_job()
+
+        with patch.object(command.subprocess, 'Popen', wraps=command.subprocess.Popen) as popen:
+            second = self.run_job()
+            self.assertFalse(popen.called)
+
+        # The results are copies, writing to one leaves the others unchanged.
+        path = os.path.join("out", "hello.txt")
+        with open(os.path.join(second.path, path), 'a') as fp:
+            fp.write("changed\n")
+        self.assertEqual(open(os.path.join(first.path, path)).read(), "hello\n")
+        self.assertEqual(self.run_job_file(path), "hello\n")
+
+        # The runtime input is not shared.
+        self.assertIn(f"job_id = {second.id}", open(os.path.join(second.path, "runlog", "input.json")).read())
+
+        # A different script runs again.
+        self.recipe.template = "mkdir -p out && echo world > out/hello.txt"
+        with patch.object(command.subprocess, 'Popen', wraps=command.subprocess.Popen) as popen:
+            third = self.run_job()
+            self.assertTrue(popen.called)
+        self.assertEqual(open(os.path.join(third.path, path)).read(), "world\n")
+
+    def test_evict(self):
+        "Test the old and the least recently used entries are evicted"
+        root = os.path.join(TEST_ROOT, "cached")
+        os.makedirs(root, exist_ok=True)
+        keys = []
+        for idx in range(4):
+            with open(os.path.join(root, "data.txt"), 'wb') as fp:
+                fp.write(b"x" * 1024 * 1024)
+            key = f"{idx:02d}" + "0" * 62
+            jobcache.store(key, root)
+            keys.append(key)
+            os.remove(os.path.join(root, "data.txt"))
+
+        def age(key, days):
+            mtime = time.time() - days * 24 * 3600
+            os.utime(f"{jobcache.entry_path(key)}.json", (mtime, mtime))
+
+        for idx, key in enumerate(keys):
+            age(key, 10 - idx)
+        age(keys[0], 100)
+
+        # The entry unused for 100 days goes first, then the least recent ones.
+        self.assertEqual(jobcache.evict(max_size=2, max_age=30), 2)
+        remaining = [key for key in keys if os.path.isdir(jobcache.entry_path(key))]
+        self.assertEqual(remaining, keys[2:])
+        shutil.rmtree(root)
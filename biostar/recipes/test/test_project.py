@@ -2,7 +2,9 @@ import logging
 import os
 from unittest.mock import patch, MagicMock
 
+from django.db import connection
 from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from  django.conf import settings
 from biostar.recipes import auth
@@ -130,6 +132,53 @@ class ProjectViewTest(TestCase):
 
         self.assertEqual(changed.uid, self.project.uid)
 
+    def access_queries(self, view, user, uid):
+        "Returns the number of access queries made by a view."
+
+        # Each request loads its own user.
+        user = models.User.objects.get(pk=user.pk)
+        request = fake_request(url="/", method='GET', data={}, user=user)
+
+        with CaptureQueriesContext(connection) as context:
+            response = view(request, uid=uid)
+
+        self.assertEqual(response.status_code, 200)
+        return len([query for query in context.captured_queries if '"recipes_access"' in query['sql']])
+
+    def test_access_queries(self):
+        "Test the access checks of a page load the access rows once"
+
+        reader = models.User.objects.create_user(username=f"reader{get_uuid(10)}", email="reader@l.com")
+        models.Access.objects.create(user=reader, project=self.project, access=models.Access.READ_ACCESS)
+
+        counts = []
+        for size in (1, 10):
+            for idx in range(size):
+                auth.create_analysis(project=self.project, name=f"recipe {idx}")
+                auth.create_data(project=self.project, name=f"data {idx}")
+            data = models.Data.objects.filter(project=self.project).first()
+
+            counts.append((self.access_queries(views.recipe_list, reader, self.project.uid),
+                           self.access_queries(views.project_view, reader, self.project.uid),
+                           self.access_queries(views.data_view, reader, data.uid)))
+
+        self.assertEqual(counts, [(1, 1, 1), (1, 1, 1)])
+
+    def test_access_bulk_update(self):
+        "Test the access levels are loaded again after a bulk update"
+        reader = models.User.objects.create_user(username=f"reader{get_uuid(10)}", email="reader@l.com")
+        access = models.Access.objects.create(user=reader, project=self.project, access=models.Access.READ_ACCESS)
+        self.assertEqual(auth.access_levels(reader)[self.project.id], [models.Access.READ_ACCESS])
+
+        models.Access.objects.filter(pk=access.pk).update(access=models.Access.WRITE_ACCESS)
+        auth.clear_access()
+        self.assertEqual(auth.access_levels(reader)[self.project.id], [models.Access.WRITE_ACCESS])
+
+        # Changes to the access are seen by the next check.
+        self.assertTrue(auth.is_readable(user=reader, obj=self.project))
+        models.Access.objects.filter(user=reader).delete()
+        self.assertFalse(auth.is_readable(user=reader, obj=self.project))
+
     def process_response(self, response, data, save=False):
         "Check the response on POST request is redirected"
 
@@ -8,7 +8,7 @@ from django.urls import reverse
 from django.test import TestCase, override_settings
 #from biostar.accounts.models import Use
 
-from biostar.recipes import auth, const
+from biostar.recipes import auth, const, signals, util
 from biostar.recipes import models, views, api
 from biostar.utils.helpers import fake_request, get_uuid
 
@@ -54,6 +54,30 @@ class RecipeRunTest(TestCase):
         self.assertFalse(auth.authorize_run(user2, recipe), "Unauthorized users can run recipes.")
         return
 
+    def test_json_data(self):
+        "Test the parsed json_text is shared between reads but not changed by them"
+        json_text = '[reads]\nvalue = "a.fq"\n\n[settings.execute]\ncache = true\n'
+        recipe = auth.create_analysis(project=self.project, json_text=json_text, template="# code")
+
+        with patch('biostar.recipes.util.hjson.loads', wraps=util.hjson.loads) as loads:
+            first = recipe.json_data
+            first['reads']['value'] = "changed"
+            second = recipe.json_data
+
+        self.assertEqual(loads.call_count, 1)
+        self.assertEqual(second['reads']['value'], "a.fq")
+
+        # Saves that keep the text do not strip it again.
+        recipe = models.Analysis.objects.get(pk=recipe.pk)
+        with patch('biostar.recipes.signals.strip_json', wraps=signals.strip_json) as strip_json:
+            recipe.name = "renamed"
+            recipe.save()
+            self.assertFalse(strip_json.called)
+
+            recipe.json_text = json_text + '\n[settings.create]\nname = "x"\n'
+            recipe.save()
+            self.assertTrue(strip_json.called)
+
 
 @override_settings(MEDIA_ROOT=TEST_ROOT)
 class RecipeViewTest(TestCase):
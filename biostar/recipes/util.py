@@ -1,4 +1,7 @@
+import codecs
+import copy
 import gzip
+import hashlib
 import io
 import mimetypes
 import os
@@ -8,7 +11,6 @@ import uuid
 import bleach
 import shlex
 import random
-import tempfile
 from itertools import islice
 from urllib.parse import quote
 from datetime import datetime
@@ -17,6 +19,12 @@ import toml as hjson
 
 CHUNK = 1024 * 1024
 
+# Parsed TOML texts keyed by the digest of the text.
+TOML_CACHE = {}
+
+# Number of parsed texts kept in memory.
+TOML_CACHE_SIZE = 1024
+
 
 def get_uuid(limit=32):
     return str(uuid.uuid4())[:limit]
@@ -47,6 +55,25 @@ def pp(json):
     return text
 
 
+def load_toml(text):
+    """
+    Parses a TOML text, each distinct text is parsed once.
+    Returns a copy that the caller may change.
+    """
+    digest = hashlib.md5(text.encode()).hexdigest()
+
+    parsed = TOML_CACHE.get(digest)
+    if parsed is None:
+        parsed = hjson.loads(text)
+
+        # Start over once the cache is full.
+        if len(TOML_CACHE) >= TOML_CACHE_SIZE:
+            TOML_CACHE.clear()
+        TOML_CACHE[digest] = parsed
+
+    return copy.deepcopy(parsed)
+
+
 def toml_error(exp_msg, text):
 
     # Parse the last part with the line number
@@ -100,34 +127,90 @@ def smart_preview(fname):
     return text
 
 
-def write_stream(stream, dest):
-
-    # Output needs to be opened in "w" if the incoming stream is a string
-    # and "wb" if the incoming stream is a file.
-    mode = "w+t" if isinstance(stream, io.StringIO) else "w+b"
+class UploadLimitError(Exception):
+    pass
 
-    # Save a stream into file.
-    # Use a temporary file in case the process fails.
-    # We don't want a failed cache file.
-    tmp = tempfile.NamedTemporaryFile(mode=mode)
 
-    for line in stream:
-        tmp.write(line)
+def stream_chunks(stream):
+    """
+    Yields the content of a stream in chunks of bytes.
+    """
+    # Uploaded files are read from the beginning.
+    if hasattr(stream, 'chunks'):
+        chunks = stream.chunks(chunk_size=CHUNK)
+    else:
+        chunks = iter(lambda: stream.read(CHUNK), stream.read(0))
 
-    # Not sure if this is needed. Can't hurt.
-    tmp.flush()
+    for chunk in chunks:
+        yield chunk.encode() if isinstance(chunk, str) else chunk
 
-    # Rewind temporary file to beginning
-    tmp.seek(0)
 
-    with open(dest, mode, buffering=CHUNK) as fp:
-        for line in tmp:
-            fp.write(line)
-    tmp.close()
+def copy_stream(stream, dest, limit=None):
+    """
+    Writes a stream into dest and returns the size and the sha256 digest of the content.
+    The content goes into a temporary file next to dest that replaces it once complete.
+    Raises UploadLimitError when the content is larger than limit bytes, dest is left unchanged.
+    """
+    # Linked files are written in place.
+    dest = os.path.realpath(dest)
+
+    # The temporary file gets the permissions of a new file under the process umask.
+    tmp = os.path.join(os.path.dirname(dest), f".{os.path.basename(dest)}.{get_uuid(8)}.part")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(fd, 'wb') as fp:
+            for chunk in stream_chunks(stream):
+                size += len(chunk)
+                if limit is not None and size > limit:
+                    raise UploadLimitError(f"Upload exceeds the {limit / 1024 / 1024:.2f} MB space left.")
+                digest.update(chunk)
+                fp.write(chunk)
+        os.replace(tmp, dest)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+    return size, digest.hexdigest()
+
+
+def write_stream(stream, dest, limit=None):
+    """
+    Writes a stream into dest, see copy_stream.
+    """
+    copy_stream(stream=stream, dest=dest, limit=limit)
 
     return dest
 
 
+def read_log(path, offset=0, size=CHUNK):
+    """
+    Reads the text of a log file written after a byte offset.
+    Reads at most the last size bytes, a log growing faster than it is read skips ahead.
+    Returns the text, the offset to continue from and the number of bytes skipped.
+    """
+    if not os.path.isfile(path):
+        return "", 0, 0
+
+    with open(path, 'rb') as fp:
+        end = fp.seek(0, os.SEEK_END)
+
+        # The log was written again, start over.
+        offset = 0 if offset > end else offset
+
+        start = max(offset, end - size)
+        fp.seek(start)
+        content = fp.read(end - start)
+
+    # A character split by the end of the read is returned with the next read.
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    text = decoder.decode(content)
+    pending = len(decoder.getstate()[0])
+
+    return text, end - pending, start - offset
+
+
 def clean_text(value):
     #TODO: investigate more,
     # shoule be applied only to bash scripts.
@@ -143,6 +226,53 @@ def qiime2view_link(file_url):
     return template + file_url
 
 
+def file_size(path):
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        # Broken links are listed without a size.
+        return 0
+
+
+def scan_tree(location, index):
+    """
+    Lists the files and their sizes under a location.
+    Directories with the same modification time as in the index are not listed again,
+    adding, removing or replacing a file changes the time of its directory.
+    The target of a linked file may be rewritten elsewhere without changing the directory,
+    the links of unchanged directories are checked for a new size.
+    Returns the new index, keyed by directory.
+    """
+    result = {}
+    stack = [os.path.abspath(location)]
+    while stack:
+        path = stack.pop()
+        mtime = os.stat(path).st_mtime_ns
+        entry = index.get(path)
+
+        if not entry or entry['mtime'] != mtime or 'links' not in entry:
+            files, dirs, links = {}, [], []
+            with os.scandir(path) as items:
+                for item in items:
+                    if item.is_dir():
+                        dirs.append(os.path.abspath(item.path))
+                        continue
+                    name = os.path.abspath(item.path)
+                    files[name] = file_size(item.path)
+                    if item.is_symlink():
+                        links.append(name)
+            entry = dict(mtime=mtime, files=files, dirs=dirs, links=links)
+        elif entry['links']:
+            files = dict(entry['files'])
+            files.update((name, file_size(name)) for name in entry['links'])
+            entry = dict(entry, files=files)
+
+        result[path] = entry
+        stack.extend(entry['dirs'])
+
+    return result
+
+
 def findfiles(location, collect):
     """
     Returns a list of all files in a directory.
@@ -14,7 +14,6 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.decorators import user_passes_test
 from django.db.models import Q, Count
 from django.template import loader
-from django.db.models import Sum
 from django.core.paginator import Paginator
 from django.views.decorators.csrf import csrf_exempt
 from django.http import HttpResponse
@@ -378,7 +377,9 @@ def data_view(request, uid):
 
     data = Data.objects.filter(uid=uid).first()
     project = data.project
-    paths = auth.listing(root=data.get_data_dir())
+    # The table of contents is rebuilt when the files change.
+    paths = auth.listing(root=data.get_data_dir(), version=data.files_version())
+    paths = Paginator(paths, per_page=settings.FILES_PER_PAGE).get_page(request.GET.get('page'))
 
     context = dict(data=data, project=project, paths=paths, serve_view="data_serve",
                    activate='Selected Data', uid=data.uid, show_all=True)
@@ -399,8 +400,11 @@ def data_edit(request, uid):
     if request.method == "POST":
         form = forms.DataEditForm(data=request.POST, instance=data, user=request.user, files=request.FILES)
         if form.is_valid():
-            form.save()
-            return redirect(reverse("data_view", kwargs=dict(uid=data.uid)))
+            try:
+                form.save()
+                return redirect(reverse("data_view", kwargs=dict(uid=data.uid)))
+            except util.UploadLimitError as exc:
+                form.add_error(None, str(exc))
 
     context = dict(data=data, form=form, activate='Edit Data', project=data.project)
 
@@ -419,15 +423,17 @@ def data_upload(request, uid):
     if request.method == "POST":
         form = forms.DataUploadForm(data=request.POST, files=request.FILES, user=owner, project=project)
         if form.is_valid():
-            data = form.save()
-            messages.info(request, f"Uploaded: {data.name}. Edit the data to set its type.")
-            return redirect(reverse("data_list", kwargs={'uid': project.uid}))
+            try:
+                data = form.save()
+                messages.info(request, f"Uploaded: {data.name}. Edit the data to set its type.")
+                return redirect(reverse("data_list", kwargs={'uid': project.uid}))
+            except util.UploadLimitError as exc:
+                form.add_error(None, str(exc))
 
-    uploaded_files = Data.objects.filter(owner=owner, method=Data.UPLOAD)
-    # The current size of the existing data
-    current_size = uploaded_files.aggregate(Sum("size"))["size__sum"] or 0
     # Maximum data that may be uploaded.
     maximum_size = owner.profile.upload_size * 1024 * 1024
+    # The current size of the existing data
+    current_size = maximum_size - auth.upload_space(owner)
 
     context = dict(project=project, form=form,
                    maximum_size=maximum_size, activate='Upload data',
@@ -474,8 +480,9 @@ def recipe_run(request, uid):
         if form.is_valid():
             # Create the job from the recipe and incoming json data.
             job = auth.create_job(analysis=recipe, user=request.user, fill_with=form.cleaned_data)
-            # Spool via UWSGI or start it synchronously.
-            tasks.execute_job.spool(job_id=job.id)
+            # Spool via UWSGI or start it synchronously, the scheduler runs it later when the workers are busy.
+            if tasks.claim_job(job.id, limit=settings.JOB_WORKERS, per_user=settings.JOB_USER_WORKERS):
+                tasks.execute_job.spool(job_id=job.id)
             url = reverse("recipe_view", kwargs=dict(uid=recipe.uid)) + "#results"
             return redirect(url)
         else:
@@ -507,8 +514,9 @@ def job_rerun(request, uid):
     # Create a new job
     job = auth.create_job(analysis=recipe, user=request.user, json_data=json_data)
 
-    # Spool via UWSGI or run it synchronously.
-    tasks.execute_job.spool(job_id=job.id)
+    # Spool via UWSGI or run it synchronously, the scheduler runs it later when the workers are busy.
+    if tasks.claim_job(job.id, limit=settings.JOB_WORKERS, per_user=settings.JOB_USER_WORKERS):
+        tasks.execute_job.spool(job_id=job.id)
     if auth.is_readable(user=request.user, obj=recipe):
         url = reverse('recipe_view', kwargs=dict(uid=job.analysis.uid)) + "#results"
     else:
@@ -709,19 +717,24 @@ def job_view(request, uid):
 
     stdout = job.stdout_log
     stderr = job.stderr_log
+    stdout_offset = stderr_offset = 0
     if job.is_running():
-        # Pass the most current stderr and stdout
+        # Pass the end of the current stderr and stdout, polling continues from the offsets.
         stdout_path = os.path.join(job.path, settings.JOB_STDOUT)
         stderr_path = os.path.join(job.path, settings.JOB_STDERR)
-        stdout = open(stdout_path, 'r').read()
-        stderr = open(stderr_path, 'r').read()
+        stdout, stdout_offset, _ = util.read_log(stdout_path)
+        stderr, stderr_offset, _ = util.read_log(stderr_path)
 
-    paths = auth.listing(root=job.get_data_dir())
+    # The files of running jobs are still growing, a job that runs again gets a new end date.
+    version = None if job.is_running() else job.end_date
+    paths = auth.listing(root=job.get_data_dir(), version=version)
+    paths = Paginator(paths, per_page=settings.FILES_PER_PAGE).get_page(request.GET.get('page'))
 
     # Pass along any plugins this job has.
     plugin = job.json_data.get('settings', {}).get('plugin')
 
-    context = dict(job=job, project=project, stderr=stderr, stdout=stdout,uid=job.uid, show_all=True,
+    context = dict(job=job, project=project, stderr=stderr, stdout=stdout, stdout_offset=stdout_offset,
+                   stderr_offset=stderr_offset, uid=job.uid, show_all=True,
                    activate='View Result', paths=paths, serve_view="job_serve",
                    plugin=plugin)
 
@@ -821,6 +834,7 @@ def project_share(request, token):
     # Update existing No Access to Share
     elif access.access == Access.NO_ACCESS:
         Access.objects.filter(id=access.id).update(access=Access.SHARE_ACCESS)
+        auth.clear_access()
 
     messages.success(request, "Granted share access")
     return redirect(reverse('project_view', kwargs=dict(uid=project.uid)))
@@ -852,6 +866,7 @@ def import_files(request, path=""):
     # Walk through the /root/node/ and collect paths.
     # Directories are not walked through because show_all=False.
     paths = auth.listing(root=root, node=node, show_all=False)
+    paths = Paginator(paths, per_page=settings.FILES_PER_PAGE).get_page(request.GET.get('page'))
 
     context = dict(paths=paths, active="import", show_all=False)
 
@@ -18,5 +18,12 @@ CACHES = {
         #'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'unique-snowflake',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
     }
-}
\ No newline at end of file
+}
+
+# Keep the search index and its queue out of the working directories.
+INDEX_DIR = os.path.join(BASE_DIR, 'export', 'tested', 'search')
+
+# Keep the digest checkpoints out of the working directories.
+DIGEST_CHECKPOINT = os.path.join(BASE_DIR, 'export', 'tested', 'digest.json')
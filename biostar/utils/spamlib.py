@@ -18,6 +18,7 @@ seq 1 6 | parallel -j 1 wget -q -nc http://www.aueb.gr/users/ion/data/enron-spam
 '''
 import logging
 import sys, os
+import threading
 
 import plac
 from joblib import dump, load
@@ -29,23 +30,54 @@ from sklearn.pipeline import make_pipeline
 
 logger = logging.getLogger("engine")
 
+# Models loaded in this process, keyed by path: (mtime, model)
+MODELS = {}
+
+LOCK = threading.Lock()
+
+
 def load_model(model="spam.model"):
     nb = load(model)
     return nb
 
 
+def get_model(model="spam.model"):
+    """
+    Loads the model once per process, reloads it when the file changes.
+    """
+    mtime = os.path.getmtime(model)
+
+    with LOCK:
+        cached = MODELS.get(model)
+        if not cached or cached[0] != mtime:
+            logger.info(f"loading model: {model}")
+            cached = MODELS[model] = (mtime, load_model(model))
+
+    return cached[1]
+
+
 def classify_content(content, model):
     """
     Classify content
     """
+    return classify_batch([content], model=model)[0]
+
+
+def classify_batch(texts, model):
+    """
+    Classify many texts, they are vectorized together.
+    """
+    if not texts:
+        return []
+
     try:
-        nb = load_model(model)
-        y_pred = nb.predict([content])
+        nb = get_model(model)
+        y_pred = nb.predict(texts)
     except Exception as exc:
         logger.error(exc)
-        y_pred = [0]
+        y_pred = [0] * len(texts)
 
-    return y_pred[0]
+    return [int(y) for y in y_pred]
 
 
 def fit_model(X, y):